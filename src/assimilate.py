@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+
+import sys
+import argparse
+
+from large_cage.parameters import load_parameters
+from large_cage.parameters import check_parameters
+from large_cage.calibration import load_observed
+from large_cage.assimilation import ParticleFilter
+
+CAGES = ['Cage A', 'Cage B']
+
+
+def get_options():
+    description = 'Assimilate the observed eggs counts (particle filter)'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('eggs',
+                        help='File with empirical data')
+    parser.add_argument('--parameters',
+                        default=None,
+                        help='Parameters (YAML file) '
+                             '(default: use the default ones)')
+    parser.add_argument('--cage',
+                        choices=CAGES,
+                        action='append',
+                        default=None,
+                        help='Cage to assimilate; can be used multiple '
+                             'times (default: all cages)')
+    parser.add_argument('--particles',
+                        type=int,
+                        default=100,
+                        help='Simulations of each cage (default: %(default)d)')
+    parser.add_argument('--columns',
+                        nargs='+',
+                        default=['eggs', 'drives', 'WT', 'pop'],
+                        help='Output columns to estimate '
+                             '(default: %(default)s)')
+    parser.add_argument('--dispersion',
+                        type=float,
+                        default=5.,
+                        help='Dispersion of the observed eggs around the '
+                             'simulated ones (negative binomial size, '
+                             'default: %(default).1f)')
+    parser.add_argument('--offset',
+                        type=int,
+                        default=None,
+                        help='Day of the GD release '
+                             '(default: first day the drive is observed)')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.5,
+                        help='Resample once the effective sample size falls '
+                             'below this fraction of the particles '
+                             '(default: %(default).2f)')
+    parser.add_argument('--interval',
+                        type=float,
+                        default=0.9,
+                        help='Width of the reported intervals '
+                             '(default: %(default).2f)')
+    parser.add_argument('--forecast',
+                        default=None,
+                        help='Also run the particles after the last '
+                             'observation, and save the daily estimates to '
+                             'this file (tsv format, default: do not forecast)')
+    parser.add_argument('--forecast-end',
+                        type=float,
+                        default=None,
+                        help='Last day of the forecast (default: END_TIME)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of parallel processes '
+                             '(default: %(default)d)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Random seed (default: random)')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    p = load_parameters(options.parameters)
+    try:
+        check_parameters(p)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    import pandas as pd
+
+    edf, _ = load_observed(options.eggs)
+    cages = options.cage if options.cage is not None else CAGES
+
+    filtered = []
+    forecasts = []
+    for i, cage in enumerate(cages):
+        try:
+            pf = ParticleFilter(p, edf['day'].values, edf[cage].values,
+                                particles=options.particles,
+                                columns=options.columns,
+                                dispersion=options.dispersion,
+                                offset=options.offset,
+                                threshold=options.threshold,
+                                interval=options.interval,
+                                jobs=options.jobs,
+                                seed=(None if options.seed is None
+                                      else options.seed + i))
+            df = pf.run()
+        except ValueError as e:
+            sys.stderr.write(f'{e}\n')
+            sys.exit(1)
+        sys.stderr.write(f'{cage}: log-likelihood {pf.log_evidence:.2f}\n')
+        df.insert(0, 'cage', cage)
+        filtered.append(df)
+        if options.forecast is not None:
+            df = pf.forecast(options.forecast_end)
+            df.insert(0, 'cage', cage)
+            forecasts.append(df)
+
+    if options.forecast is not None:
+        pd.concat(forecasts).to_csv(options.forecast, sep='\t', index=False)
+    pd.concat(filtered).to_csv(sys.stdout, sep='\t', index=False)
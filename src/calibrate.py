@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+
+import sys
+import argparse
+
+from large_cage.parameters import load_parameters
+from large_cage.parameters import check_parameters
+from large_cage.calibration import ABCSMC
+from large_cage.calibration import load_observed
+
+
+def get_options():
+    description = 'Calibrate parameters against the observed eggs counts (ABC-SMC)'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('eggs',
+                        help='File with empirical data')
+    parser.add_argument('--parameters',
+                        default=None,
+                        help='Base parameters (YAML file) '
+                             '(default: use the default ones)')
+    parser.add_argument('--prior',
+                        nargs=3,
+                        action='append',
+                        metavar=('NAME', 'LOW', 'HIGH'),
+                        required=True,
+                        help='Uniform prior for a parameter; nested '
+                             'parameters can be indicated with dots '
+                             '(e.g. MATING_MOD.m.WWAA). '
+                             'Can be used multiple times')
+    parser.add_argument('--particles',
+                        type=int,
+                        default=100,
+                        help='Population size (default: %(default)d)')
+    parser.add_argument('--generations',
+                        type=int,
+                        default=5,
+                        help='Maximum number of populations '
+                             '(default: %(default)d)')
+    parser.add_argument('--quantile',
+                        type=float,
+                        default=0.5,
+                        help='Quantile of the previous distances used '
+                             'as the next tolerance (default: %(default).2f)')
+    parser.add_argument('--min-acceptance',
+                        type=float,
+                        default=0.01,
+                        help='Stop when the acceptance rate falls below '
+                             'this value (default: %(default).2f)')
+    parser.add_argument('--offset',
+                        type=int,
+                        default=None,
+                        help='Day of the GD release '
+                             '(default: first day the drive is observed)')
+    parser.add_argument('--repeats',
+                        type=int,
+                        default=1,
+                        help='Simulations averaged for each particle '
+                             '(default: %(default)d)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of parallel processes '
+                             '(default: %(default)d)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Random seed (default: random)')
+    parser.add_argument('--history',
+                        default=None,
+                        help='Save all populations to this file '
+                             '(tsv format, default: do not save)')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    p = load_parameters(options.parameters)
+    try:
+        check_parameters(p)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    edf, _ = load_observed(options.eggs)
+    priors = {name: (float(low), float(high))
+              for name, low, high in options.prior}
+
+    abc = ABCSMC(p, priors,
+                 edf['day'].values,
+                 edf[['Cage A', 'Cage B']].values,
+                 particles=options.particles,
+                 quantile=options.quantile,
+                 offset=options.offset,
+                 repeats=options.repeats,
+                 jobs=options.jobs,
+                 seed=options.seed)
+    try:
+        posterior = abc.run(generations=options.generations,
+                            min_acceptance=options.min_acceptance)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    if options.history is not None:
+        import pandas as pd
+
+        pd.concat(abc.history).to_csv(options.history, sep='\t', index=False)
+    posterior.to_csv(sys.stdout, sep='\t', index=False)
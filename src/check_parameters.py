@@ -2,52 +2,160 @@
 
 
 import os
-import sys
+import glob
 import numpy as np
 import argparse
-import pandas as pd
-from sklearn import metrics
+from multiprocessing import Pool
+
+from large_cage.calibration import load_observed
+
+# the only columns needed to score an output
+COLUMNS = ['round', 'time', 'eggs', 'drives', 'fitness']
 
 
 def get_options():
-    description = ''
+    description = 'Score simulations against the observed eggs counts'
     parser = argparse.ArgumentParser(description=description)
 
     parser.add_argument('eggs',
                         help='File with empirical data')
     parser.add_argument('output',
-                        help='Output file for an individual simulation')
+                        nargs='+',
+                        help='Output file for an individual simulation; '
+                             'directories (all .tsv files within) and glob '
+                             'patterns are also accepted, in which case '
+                             'a table ranked by R^2 is reported')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of parallel processes '
+                             '(default: %(default)d)')
 
     return parser.parse_args()
 
 
-def load_observed(fname):
-    edf = pd.read_csv(fname, sep='\t')
-
-    edf = edf.iloc[1:].copy()
-    edf = edf.rename(columns={'Unnamed: 1': 'day',
-                              'Eggs': 'Cage A',
-                              'Unnamed: 3': 'Cage B'})
-    edf = edf[['day', 'Cage A', 'Cage B']].astype(int)
-    # TODO: fix this
-    # clip last time point, simulations did not include it
-    edf = edf[edf['day'] <= 0].copy()
-    data = np.concatenate([edf['Cage A'].values,
-                           edf['Cage B'].values])
-    return edf, data
-
-
-def evaluate(values, data):
-    if values.shape[0] * 2 < data.shape[0]:
-        # simulation ended early
-        # no score can be computed
-        return np.nan
+def get_outputs(paths):
+    '''Expand directories and glob patterns
+
+    Args:
+        paths (iterable)
+            Files, directories or glob patterns
+
+    Returns:
+        fnames (list)
+            Output files
+    '''
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            fnames.extend(sorted(glob.glob(os.path.join(path, '*.tsv'))))
+        elif os.path.exists(path):
+            fnames.append(path)
+        else:
+            fnames.extend(sorted(glob.glob(path)))
+    return fnames
+
+
+def get_parameters(fname):
+    '''Mating and deposition probabilities from a file name
+
+    Args:
+        fname (str)
+            Output file, named "{mating}-{deposition}.tsv"
+
+    Returns:
+        mating (float)
+            Mating probability (NaN if it cannot be derived)
+        deposition (float)
+            Egg deposition probability (NaN if it cannot be derived)
+    '''
+    name = os.path.split(fname)[-1].split('.tsv')[0]
+    try:
+        mating, deposition = name.split('-')
+        return float(mating), float(deposition)
+    except ValueError:
+        return np.nan, np.nan
+
+
+def evaluate(rounds, time, eggs, days, data):
+    '''R^2 of the simulated eggs in each round
+
+    Args:
+        rounds (numpy.array)
+            Round of each time point
+        time (numpy.array)
+            Time of each time point, relative to the GD release
+        eggs (numpy.array)
+            Eggs at each time point
+        days (numpy.array)
+            Observation days, relative to the GD release
+        data (numpy.array)
+            Observed eggs, for each cage, concatenated
+
+    Returns:
+        r2 (numpy.array)
+            R^2 for each round, NaN if the simulation ended early
+    '''
+    observed = data.reshape(-1, days.shape[0]).T
+    ids, r = np.unique(rounds, return_inverse=True)
+    simulated = np.full((ids.shape[0], days.shape[0]), np.nan)
+    d = np.searchsorted(days, time)
+    observation = d < days.shape[0]
+    observation[observation] = days[d[observation]] == time[observation]
+    simulated[r[observation], d[observation]] = eggs[observation]
+
+    # all cages against the same simulated eggs
+    sse = ((observed[np.newaxis, :, :] -
+            simulated[:, :, np.newaxis]) ** 2).sum(axis=(1, 2))
+    sst = ((data - data.mean()) ** 2).sum()
+    return 1 - sse / sst
+
+
+def score(fname, days, data):
+    '''Score a simulation output
+
+    Args:
+        fname (str)
+            Output file
+        days (numpy.array)
+            Observation days, relative to the GD release
+        data (numpy.array)
+            Observed eggs, for each cage, concatenated
+
+    Returns:
+        fitness (float)
+            Average fitness before the GD release
+        r2 (float)
+            R^2 of the simulated eggs, averaged across rounds
+        rounds (int)
+            Number of rounds for which R^2 could be computed
+    '''
+    import pandas as pd
+
+    df = pd.read_csv(fname, sep='\t', usecols=COLUMNS)
+    rounds = df['round'].values
+    time = df['time'].values.astype(float)
+    drives = df['drives'].values > 0
+    # time point 0 is GD release
+    if drives.any():
+        time = time - time[drives].min()
+    else:
+        time = np.full(time.shape, np.nan)
 
-    y_hat = np.concatenate([values['eggs'].values,
-                            values['eggs'].values])
-    r2 = metrics.r2_score(data, y_hat)
+    # save average fitness value
+    before = time < 0
+    if before.any():
+        _, r = np.unique(rounds[before], return_inverse=True)
+        fitness = (np.bincount(r, df['fitness'].values[before]) /
+                   np.bincount(r)).mean()
+    else:
+        fitness = np.nan
 
-    return r2
+    r2 = evaluate(rounds, time, df['eggs'].values.astype(float),
+                  days, data)
+    scored = int(np.isfinite(r2).sum())
+    r2 = r2[np.isfinite(r2)].mean() if scored else np.nan
+    return fitness, r2, scored
 
 
 if __name__ == '__main__':
@@ -55,29 +163,32 @@ if __name__ == '__main__':
 
     # here load actual eggs data
     edf, real_data = load_observed(options.eggs)
+    days = edf['day'].values
 
-    # read output
-    df = pd.read_csv(options.output, sep='\t')
-    # time point 0 is GD release
-    df['time'] = df['time'] - df[df['drives'] > 0]['time'].min()
-    # save average fitness value
-    fitness = df[df['time'] < 0].groupby('round')['fitness'].mean().mean()
-    # select only the days for which we have data
-    df = df[df['time'].isin(edf['day'].values)]
-
-    if df.shape[0] == 0:
-        r2 = np.nan
+    fnames = get_outputs(options.output)
+    args = [(fname, days, real_data) for fname in fnames]
+    if options.jobs > 1:
+        with Pool(options.jobs) as pool:
+            scores = pool.starmap(score, args)
     else:
-        # compute R^2 for each round
-        r2 = df.groupby('round').apply(evaluate, data=real_data)
-        r2 = r2.mean()
-
-    # derive parameters values
-    mating, deposition = os.path.split(options.output)[-1].split('-')
-    deposition = deposition.split('.tsv')[0]
-
-    mating = float(mating)
-    deposition = float(deposition)
-    theoretical_fitness = mating * deposition
-
-    print(f'{mating}\t{deposition}\t{theoretical_fitness}\t{fitness}\t{r2}')
+        scores = [score(*x) for x in args]
+
+    rows = []
+    for fname, (fitness, r2, scored) in zip(fnames, scores):
+        # derive parameters values
+        mating, deposition = get_parameters(fname)
+        theoretical_fitness = mating * deposition
+        rows.append((fname, mating, deposition, theoretical_fitness,
+                     fitness, r2, scored))
+
+    if len(options.output) == 1 and fnames == options.output:
+        # single simulation
+        _, mating, deposition, theoretical_fitness, fitness, r2, _ = rows[0]
+        print(f'{mating}\t{deposition}\t{theoretical_fitness}\t{fitness}\t{r2}')
+    else:
+        # best scores first, missing ones last
+        rows.sort(key=lambda x: (np.isnan(x[5]), -np.nan_to_num(x[5])))
+        print('\t'.join(['output', 'mating', 'deposition',
+                         'theoretical_fitness', 'fitness', 'r2', 'rounds']))
+        for row in rows:
+            print('\t'.join(str(x) for x in row))
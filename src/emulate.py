@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+
+import os
+import sys
+import yaml
+import argparse
+
+from large_cage.sweep import load_sweep
+from large_cage.parameters import load_parameters
+from large_cage.emulator import Emulator
+from large_cage.emulator import summarise
+from large_cage.emulator import load_emulator
+from large_cage.emulator import flatten_parameters
+
+
+def get_options():
+    description = 'Train and query a surrogate model of the simulations'
+    parser = argparse.ArgumentParser(description=description)
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train = subparsers.add_parser('train',
+                                  help='Train an emulator on sweep outputs')
+    train.add_argument('model',
+                       help='Output file for the emulator')
+    train.add_argument('--sweep',
+                       default=None,
+                       help='Sweep specification (YAML file)')
+    train.add_argument('--outputs',
+                       default=None,
+                       help='Directory with the collated outputs of each '
+                            'sweep point ({point}.tsv)')
+    train.add_argument('--run',
+                       nargs=2,
+                       action='append',
+                       default=[],
+                       metavar=('PARAMETERS', 'OUTPUT'),
+                       help='Parameters (YAML file) and collated output of '
+                            'a scenario; can be used multiple times')
+    train.add_argument('--times',
+                       type=float,
+                       nargs='+',
+                       default=[100, 200, 300, 500, 1000],
+                       help='Days for which to emulate the drive frequency '
+                            '(default: %(default)s)')
+    train.add_argument('--threshold',
+                       type=float,
+                       default=0.5,
+                       help='Drive frequency for the time-to-threshold '
+                            'summary (default: %(default).2f)')
+    train.add_argument('--method',
+                       choices=['gp', 'gbt'],
+                       default='gp',
+                       help='Regression model (default: %(default)s)')
+
+    predict = subparsers.add_parser('predict',
+                                    help='Predict summaries for new parameters')
+    predict.add_argument('model',
+                         help='Emulator file')
+    predict.add_argument('--set',
+                         nargs=2,
+                         action='append',
+                         default=[],
+                         metavar=('NAME', 'VALUE'),
+                         help='Parameter value (unset parameters use '
+                              'the middle of the training range); '
+                              'can be used multiple times')
+    predict.add_argument('--table',
+                         default=None,
+                         help='Table of parameters to predict (tsv format), '
+                              'one column per parameter')
+
+    suggest = subparsers.add_parser('suggest',
+                                    help='Suggest the next points to simulate')
+    suggest.add_argument('model',
+                         help='Emulator file')
+    suggest.add_argument('-n',
+                         type=int,
+                         default=10,
+                         help='Number of points (default: %(default)d)')
+    suggest.add_argument('--candidates',
+                         type=int,
+                         default=1000,
+                         help='Candidate points (default: %(default)d)')
+    suggest.add_argument('--seed',
+                         type=int,
+                         default=None,
+                         help='Random seed (default: random)')
+    suggest.add_argument('--base',
+                         default=None,
+                         help='Write the suggestions as a sweep '
+                              'specification based on this parameters file '
+                              '(to stdout, default: write a table)')
+
+    return parser.parse_args()
+
+
+def train(options):
+    import pandas as pd
+
+    runs = []
+    if options.sweep is not None:
+        if options.outputs is None:
+            sys.stderr.write('Please indicate the directory with the outputs '
+                             'of the sweep with --outputs\n')
+            sys.exit(1)
+        for point_id, p in load_sweep(options.sweep):
+            fname = os.path.join(options.outputs, f'{point_id}.tsv')
+            if not os.path.exists(fname):
+                sys.stderr.write(f'Skipping {point_id}: no output found\n')
+                continue
+            runs.append((p, fname))
+    for params, fname in options.run:
+        runs.append((load_parameters(params), fname))
+    if len(runs) < 2:
+        sys.stderr.write('At least two scenarios are needed for training\n')
+        sys.exit(1)
+
+    X = []
+    Y = []
+    for p, fname in runs:
+        df = pd.read_csv(fname, sep='\t',
+                         usecols=['round', 'time', 'initial_release',
+                                  'eggs', 'drives'])
+        X.append(flatten_parameters(p))
+        Y.append(summarise(df, options.times,
+                           threshold=options.threshold,
+                           end_time=p['END_TIME']))
+    X = pd.DataFrame(X)
+    Y = pd.DataFrame(Y)
+
+    emulator = Emulator(method=options.method).fit(X, Y)
+    sys.stderr.write(f'Trained on {X.shape[0]} scenarios, '
+                     f'parameters: {" ".join(emulator.inputs)}\n')
+    emulator.save(options.model)
+
+
+def predict(options):
+    import pandas as pd
+
+    emulator = load_emulator(options.model)
+    if options.table is not None:
+        X = pd.read_csv(options.table, sep='\t')
+    else:
+        X = {k: (low + high) / 2
+             for k, low, high in zip(emulator.inputs,
+                                     emulator.lows,
+                                     emulator.highs)}
+        for k, v in options.set:
+            if k not in X:
+                sys.stderr.write(f'Unknown parameter {k}, the emulator '
+                                 f'was trained on: '
+                                 f'{" ".join(emulator.inputs)}\n')
+                sys.exit(1)
+            X[k] = float(v)
+        X = pd.DataFrame([X])
+    mean, std = emulator.predict(X)
+    std.columns = [f'{x}.std' for x in std.columns]
+    X[emulator.inputs].join(mean).join(std).to_csv(sys.stdout,
+                                                   sep='\t',
+                                                   index=False)
+
+
+def suggest(options):
+    emulator = load_emulator(options.model)
+    points = emulator.suggest(n=options.n,
+                              candidates=options.candidates,
+                              seed=options.seed)
+    if options.base is None:
+        points.to_csv(sys.stdout, sep='\t', index=False)
+        return
+    spec = {'base': options.base,
+            'sweep': [{'zip': {k: [int(x) if k in emulator.integers
+                                   else float(x)
+                                   for x in points[k]]
+                               for k in emulator.inputs}}]}
+    yaml.dump(spec, sys.stdout)
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    if options.command == 'train':
+        train(options)
+    elif options.command == 'predict':
+        predict(options)
+    else:
+        suggest(options)
@@ -1,2 +1,2 @@
 __author__ = 'Marco Galardini'
-__version__ = '0.1.0'
+__version__ = '0.3.0'
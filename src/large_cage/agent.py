@@ -4,9 +4,15 @@ import sys
 import random
 import itertools
 import numpy as np
-from scipy import stats
+from collections import Counter
+from collections import namedtuple
 from copy import deepcopy
 
+from large_cage import crn
+from large_cage.population import Population
+from large_cage.distributions import reset_buffers
+from large_cage.distributions import get_distribution
+
 
 # parameters 
 #
@@ -15,28 +21,316 @@ from copy import deepcopy
 params = {
  }
 
-distributions = {}
+def get_rvs(dist, params):
+    '''Draw a random variate from a distribution
 
+    Kept for backwards compatibility, see
+    `large_cage.distributions.get_distribution`
 
-def get_rvs(dist, params):
-    if dist not in distributions:
-        distributions[dist] = {}
+    Args:
+        dist (str)
+            Distribution name: one of ['norm', 'weibull']
+        params (tuple)
+            (loc, scale) for "norm", (loc, scale, c) for "weibull"
 
+    Returns:
+        rvs (float)
+            Random variate
+    '''
     if dist == 'norm':
         loc, scale = params
-        if params not in distributions[dist]:
-            distributions[dist][params] = stats.norm(loc=loc,
-                                                     scale=scale)
+        spec = {'loc': loc, 'scale': scale}
     elif dist == 'weibull':
         loc, scale, c = params
-        if params not in distributions[dist]:
-            distributions[dist][params] = stats.weibull_min(c=c,
-                                                            loc=loc,
-                                                            scale=scale)
+        spec = {'loc': loc, 'scale': scale, 'c': c}
     else:
         raise ValueError(f'{dist} not implemented yet')
 
-    return distributions[dist][params].rvs()
+    return get_distribution(spec, default=dist).rvs()
+
+
+# shared phenotype classes
+# one table for each parameters dictionary
+# (see get_phenotype)
+phenotypes = {}
+max_phenotype_tables = 16
+
+# dead individuals, reused for new ones
+# (see recycle)
+free_individuals = []
+max_free_individuals = 2 ** 17
+
+
+class Phenotype():
+    '''Phenotype class shared by all individuals with the same
+    sex, genotype and nuclease origin
+
+    All the parameters that only depend on these properties
+    (distributions, modifiers, probabilities) are resolved once,
+    so that individuals only need to hold a reference to their class
+    and their own drawn values.
+
+    Phenotype classes should not be created directly, but retrieved
+    through the `get_phenotype` function.
+
+    Example: het. drive female (nuclease received from mother)
+    >>> ph = get_phenotype('f', ['D', 'W'], ['W', 'W'],
+                           nucl_from_mother=True,
+                           p=p)
+    >>> ph.genotype
+    DWWW
+    '''
+    def __init__(self, sex, genotype1, genotype2,
+                 nucl_from_father=False, nucl_from_mother=False,
+                 p=None):
+        '''Resolve the parameters for a phenotype class
+
+        Args:
+            sex (str)
+                Sex: one of ['f', 'm']
+            genotype1 (iterable)
+                All unique alleles at the dsx locus
+            genotype2 (iterable)
+                All unique alleles at the antidote locus
+            nucl_from_father (bool)
+                Wether the father passes the nuclease to the egg
+            nucl_from_mother (bool)
+                Wether the mother passes the nuclease to the egg
+            p (dict)
+                Parameters
+        '''
+        if p is None:
+            p = params
+        self.p = p
+
+        self.sex = sex
+        self.nucl_from_father = nucl_from_father
+        self.nucl_from_mother = nucl_from_mother
+
+        self.genotype1 = frozenset(genotype1)
+        self.genotype2 = frozenset(genotype2)
+        self.hom1 = len(self.genotype1) == 1
+        self.hom2 = len(self.genotype2) == 1
+        self.genotype = ''.join(sorted(genotype1)) + ''.join(sorted(genotype2))
+
+        drive = p['DRIVE'] in self.genotype1
+        self.drive = drive
+        self.anti_drive = p['ANTI_DRIVE'] in self.genotype2
+        self.resistance = p['RESISTANCE'] in self.genotype1
+        self.wild_type = (self.genotype1 == {p['WILD_TYPE'], } and
+                          self.genotype2 == {p['WILD_TYPE'], })
+        self.transgenic = (self.genotype1.difference({p['WILD_TYPE'], }) != set() or
+                           self.genotype2.difference({p['WILD_TYPE'], }) != set())
+        self.non_functional = self.genotype1 in [set(x)
+                                                 for x in p['NON_FUNCTIONAL']]
+
+        if not drive:
+            suffix = 'WT'
+        elif nucl_from_father and nucl_from_mother:
+            suffix = 'NUCL_FROM_BOTH'
+        elif nucl_from_father:
+            suffix = 'NUCL_FROM_FATHER'
+        elif nucl_from_mother:
+            suffix = 'NUCL_FROM_MOTHER'
+        else:
+            raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
+
+        # lifespan after full maturation
+        if sex == 'm':
+            survival = p['SURVIVAL_MALE']
+        else:
+            survival = p['SURVIVAL_FEMALE']
+        self.death = get_distribution(survival, default='weibull')
+
+        # intersex phenotype
+        if drive and nucl_from_father and nucl_from_mother:
+            self.intersex = None
+        elif drive and nucl_from_father and sex == 'f':
+            self.intersex = get_distribution(p['INTERSEX_NUCL_FROM_FATHER'])
+        elif drive and nucl_from_mother and sex == 'f':
+            self.intersex = get_distribution(p['INTERSEX_NUCL_FROM_MOTHER'])
+        else:
+            self.intersex = None
+
+        # mating probability
+        if sex == 'm':
+            mating_probability = p['MATING_PROBABILITY_MALE']
+        else:
+            mating_probability = p['MATING_PROBABILITY']
+        self.mating_probability = mating_probability * p['MATING_MOD'][sex
+                ].get(self.genotype, 1)
+        self.can_mate = not (sex == 'f' and self.non_functional)
+
+        # egg production
+        # (sterile females never mate)
+        if sex == 'f' and not self.non_functional:
+            self.eggs = get_distribution(p[f'EGGS_{suffix}'])
+        else:
+            self.eggs = None
+        if self.anti_drive:
+            if self.hom2:
+                self.antidrive_effect = p['HOM_ANTIDRIVE_EFFECT']
+            else:
+                self.antidrive_effect = p['HET_ANTIDRIVE_EFFECT']
+        else:
+            self.antidrive_effect = None
+
+        # development
+        self.hatching = get_distribution(p[f'HATCHING_{suffix}'])
+        self.larval = get_distribution(p[f'LARVAL_{suffix}'])
+        if sex == 'f' and suffix != 'NUCL_FROM_BOTH':
+            self.pupal = get_distribution(p[f'PUPAL_F_{suffix}'])
+        else:
+            # assumed for females
+            self.pupal = get_distribution(p[f'PUPAL_M_{suffix}'])
+
+        # genotype-specific modifiers
+        self.egg_mod = p['EGGS_MOD'][sex].get(self.genotype, 1.)
+        self.hatching_mod = p['HATCHING_MOD'][sex].get(self.genotype, 1.)
+        self.deposition_mod = p['DEPOSITION_MOD'][sex].get(self.genotype, 1.)
+
+        # gametes formation
+        if sex == 'm':
+            self.drive_efficiency = get_distribution(p['DRIVE_EFFICIENCY_MALE'])
+        else:
+            self.drive_efficiency = get_distribution(p['DRIVE_EFFICIENCY_FEMALE'])
+        self.drive_efficiency_mod = p['DRIVE_EFFICIENCY_MOD'][sex
+                ].get(self.genotype, 1)
+        self.antidote_inheritance = p['ANTIDOTE_INHERITANCE'][sex
+                ].get(self.genotype, 1)
+        self.resistance_efficiency = p['RESISTANCE_EFFICIENCY'][sex]
+        self.alleles1 = tuple(sorted(self.genotype1))
+        self.alleles2 = tuple(sorted(self.genotype2))
+        if drive and not self.hom1:
+            self.other1 = sorted(self.genotype1.difference((p['DRIVE'], )))[0]
+        else:
+            self.other1 = None
+        if self.anti_drive and not self.hom2:
+            # NOTE: kept as in the original model
+            # the "other" allele is taken from locus 1
+            self.other2 = sorted(self.genotype1.difference((p['ANTI_DRIVE'], )))[0]
+        else:
+            self.other2 = None
+
+        # offspring of females of this class with each male class
+        # (see `get_offspring`)
+        self.offspring = {}
+
+    def gametes1(self):
+        '''Distribution of the gametes at locus 1 (dsx)
+
+        Same probabilities as `Individual.form_gamete1`; the homing
+        probability is the mean of the drive efficiency clipped to [0, 1]
+
+        Returns:
+            gametes (dict)
+                Allele -> probability
+        '''
+        p = self.p
+        if self.hom1:
+            return {self.alleles1[0]: 1.}
+        if not self.drive:
+            return {self.alleles1[0]: 0.5, self.alleles1[1]: 0.5}
+        gametes = Counter()
+        if self.anti_drive:
+            blocked = min(max(1 - self.drive_efficiency_mod, 0.), 1.)
+            gametes[p['DRIVE']] += blocked
+            gametes[self.other1] += 1 - blocked
+            return dict(gametes)
+        homing = self.drive_efficiency.clipped_mean(0., 1.)
+        resistance = (1 - homing) * min(max(self.resistance_efficiency,
+                                            0.), 1.)
+        gametes[p['DRIVE']] += homing
+        gametes[p['RESISTANCE']] += resistance
+        gametes[self.other1] += 1 - homing - resistance
+        return dict(gametes)
+
+    def gametes2(self):
+        '''Distribution of the gametes at locus 2 (antidote)
+
+        Same probabilities as `Individual.form_gamete2`
+
+        Returns:
+            gametes (dict)
+                Allele -> probability
+        '''
+        p = self.p
+        if self.hom2:
+            return {self.alleles2[0]: 1.}
+        if self.anti_drive:
+            inherited = min(max(self.antidote_inheritance, 0.), 1.)
+            gametes = Counter()
+            gametes[p['ANTI_DRIVE']] += inherited
+            gametes[self.other2] += 1 - inherited
+            return dict(gametes)
+        return {self.alleles2[0]: 0.5, self.alleles2[1]: 0.5}
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # phenotype classes are shared across individuals
+        return self
+
+
+def get_phenotype(sex, genotype1, genotype2,
+                  nucl_from_father=False, nucl_from_mother=False,
+                  p=None):
+    '''Get the shared phenotype class for an individual
+
+    Phenotype classes are compiled once for each parameters dictionary;
+    the parameters dictionary should therefore not be changed after the
+    first individual has been created
+
+    Args:
+        sex (str)
+            Sex: one of ['f', 'm']
+        genotype1 (iterable)
+            All unique alleles at the dsx locus
+        genotype2 (iterable)
+            All unique alleles at the antidote locus
+        nucl_from_father (bool)
+            Wether the father passes the nuclease to the egg
+        nucl_from_mother (bool)
+            Wether the mother passes the nuclease to the egg
+        p (dict)
+            Parameters
+
+    Returns:
+        phenotype (Phenotype)
+            The phenotype class
+    '''
+    if p is None:
+        p = params
+    try:
+        q, table = phenotypes[id(p)]
+        if q is not p:
+            raise KeyError(id(p))
+    except KeyError:
+        table = {}
+        # only keep the most recent parameter sets
+        # (individuals keep a reference to their own class)
+        while len(phenotypes) >= max_phenotype_tables:
+            phenotypes.pop(next(iter(phenotypes)))
+        # keep a reference to the parameters
+        # so that their id is not reused
+        phenotypes[id(p)] = (p, table)
+
+    key = (sex, tuple(genotype1), tuple(genotype2),
+           nucl_from_father, nucl_from_mother)
+    try:
+        return table[key]
+    except KeyError:
+        pass
+    # same class for different ordering of the alleles
+    canonical = (sex, tuple(sorted(genotype1)), tuple(sorted(genotype2)),
+                 nucl_from_father, nucl_from_mother)
+    if canonical not in table:
+        table[canonical] = Phenotype(sex, genotype1, genotype2,
+                                     nucl_from_father, nucl_from_mother,
+                                     p=p)
+    table[key] = table[canonical]
+    return table[key]
 
 
 class Individual():
@@ -90,9 +384,23 @@ class Individual():
     >>> i.form_gamete2()
     W
     '''
+    # all per-individual state: sex and genotypes
+    # are stored once, in the shared phenotype
+    __slots__ = ('phenotype', 'lineage', 'age',
+                 'time_to_hatch', 'time_to_pupa', 'time_to_maturation',
+                 'death', 'stage', 'mated', 'intersex', 'mating',
+                 'deposing_eggs', 'eggs', 'hatching', 'larva', 'pupa')
+
+    def __new__(cls, *args, **kwargs):
+        # reuse a dead individual if possible
+        # (all attributes are set again)
+        if free_individuals and cls is Individual:
+            return free_individuals.pop()
+        return super().__new__(cls)
+
     def __init__(self, sex, genotype1, genotype2,
                  nucl_from_father=False, nucl_from_mother=False,
-                 hatching_mod=1, parameters=None):
+                 hatching_mod=1, parameters=None, lineage=None):
         '''Create a new individual for the simulation
         Starts from the egg stage
 
@@ -111,40 +419,29 @@ class Individual():
                 Modifier for the hatching probability
             parameters (dict)
                 parameters dictionary
+            lineage (int)
+                Lineage key, used to draw common random numbers
+                (see `large_cage.crn`); ignored if they are disabled
         '''
-        if parameters is None:
-            self.p = {}
-        else:
-            self.p = parameters
-
-        self.sex = sex
-        self.nucl_from_father = nucl_from_father
-        self.nucl_from_mother = nucl_from_mother
-
-        if len(set(genotype1)) == 1:
-            self.hom1 = True
-        else:
-            self.hom1 = False
-        self.genotype1 = set(genotype1)
-        if len(set(genotype2)) == 1:
-            self.hom2 = True
-        else:
-            self.hom2 = False
-        self.genotype2 = set(genotype2)
+        # shared phenotype class
+        # (sex, genotype, nuclease origin)
+        self.phenotype = ph = get_phenotype(sex, genotype1, genotype2,
+                                            nucl_from_father,
+                                            nucl_from_mother,
+                                            p=parameters)
+        p = ph.p
+        self.lineage = lineage
+        draws = crn.draws(lineage)
 
         self.age = 0.
-        self.time_to_hatch = random.uniform(self.p['TIME_TO_HATCH'][0], self.p['TIME_TO_HATCH'][1])
-        self.time_to_pupa = random.uniform(self.p['TIME_TO_PUPA'][0], self.p['TIME_TO_PUPA'][1])
-        self.time_to_maturation = random.uniform(self.p['TIME_TO_MATURATION'][0], self.p['TIME_TO_MATURATION'][1])
+        low, high = p['TIME_TO_HATCH']
+        self.time_to_hatch = low + (high - low) * draws.random('hatch')
+        low, high = p['TIME_TO_PUPA']
+        self.time_to_pupa = low + (high - low) * draws.random('pupa')
+        low, high = p['TIME_TO_MATURATION']
+        self.time_to_maturation = low + (high - low) * draws.random('maturation')
         # lifespan after full maturation
-        if self.sex == 'm':
-            self.death = get_rvs('weibull', (self.p['SURVIVAL_MALE']['loc'],
-                                             self.p['SURVIVAL_MALE']['scale'],
-                                             self.p['SURVIVAL_MALE']['c']))
-        else:
-            self.death = get_rvs('weibull', (self.p['SURVIVAL_FEMALE']['loc'],
-                                             self.p['SURVIVAL_FEMALE']['scale'],
-                                             self.p['SURVIVAL_FEMALE']['c']))
+        self.death = draws.variate(ph.death, 'death')
 
         # egg -> larva -> pupa -> adult
         self.stage = 'egg'
@@ -153,122 +450,81 @@ class Individual():
         self.mated = False
 
         # is this individual intersex
-        self.intersex = self._is_intersex()
+        self.intersex = self._is_intersex(draws)
 
         # initial mating probability 
-        self.mating = self.get_mating()
+        self.mating = self.get_mating(draws)
 
         # will deposit eggs?
         # with own genotype modifier
         # when mating will recompute with interacting genotypes
         # we keep this to keep track of population fitness
-        self.deposing_eggs = self.deposes_eggs(self.get_deposition_mod())
+        self.deposing_eggs = self.deposes_eggs(ph.deposition_mod, draws=draws)
 
         # egg production
-        if self.sex == 'f' and ''.join(sorted(self.genotype1)) not in [set(x)
-                                                                       for x in self.p['NON_FUNCTIONAL']]:
-            if self.p['DRIVE'] not in self.genotype1:
-                self.eggs = int(get_rvs('norm', (self.p['EGGS_WT']['loc'],
-                                                 self.p['EGGS_WT']['scale'])))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father and nucl_from_mother:
-                self.eggs = int(get_rvs('norm', (self.p['EGGS_NUCL_FROM_BOTH']['loc'],
-                                                 self.p['EGGS_NUCL_FROM_BOTH']['scale'])))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father:
-                self.eggs = int(get_rvs('norm', (self.p['EGGS_NUCL_FROM_FATHER']['loc'],
-                                                 self.p['EGGS_NUCL_FROM_FATHER']['scale'])))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_mother:
-                self.eggs = int(get_rvs('norm', (self.p['EGGS_NUCL_FROM_MOTHER']['loc'],
-                                                 self.p['EGGS_NUCL_FROM_MOTHER']['scale'])))
-            else:
-                raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
+        if ph.eggs is not None:
+            self.eggs = int(draws.variate(ph.eggs, 'eggs'))
         else:
             self.eggs = 0
 
-        if self.p['ANTI_DRIVE'] in self.genotype2:
-            if self.hom2:
-                self.eggs = int(round(self.eggs * self.p['HOM_ANTIDRIVE_EFFECT']))
-            else:
-                self.eggs = int(round(self.eggs * self.p['HET_ANTIDRIVE_EFFECT']))
+        if ph.antidrive_effect is not None:
+            self.eggs = int(round(self.eggs * ph.antidrive_effect))
 
         # hatching probability
-        if self.p['DRIVE'] not in self.genotype1:
-            hatching = get_rvs('norm', (self.p['HATCHING_WT']['loc'],
-                                        self.p['HATCHING_WT']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_father and nucl_from_mother:
-            hatching = get_rvs('norm', (self.p['HATCHING_NUCL_FROM_BOTH']['loc'],
-                                        self.p['HATCHING_NUCL_FROM_BOTH']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_father:
-            hatching = get_rvs('norm', (self.p['HATCHING_NUCL_FROM_FATHER']['loc'],
-                                        self.p['HATCHING_NUCL_FROM_FATHER']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_mother:
-            hatching = get_rvs('norm', (self.p['HATCHING_NUCL_FROM_MOTHER']['loc'],
-                                        self.p['HATCHING_NUCL_FROM_MOTHER']['scale']))
-        else:
-            raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
+        hatching = draws.variate(ph.hatching, 'hatching')
         # apply modifier for hatching probability
         hatching = hatching * hatching_mod
-        if random.random() < hatching:
+        if draws.random('hatched') < hatching:
             self.hatching = True
         else:
             self.hatching = False
 
         # larval mortality
-        if self.p['DRIVE'] not in self.genotype1:
-            larval = get_rvs('norm', (self.p['LARVAL_WT']['loc'],
-                                      self.p['LARVAL_WT']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_father and nucl_from_mother:
-            larval = get_rvs('norm', (self.p['LARVAL_NUCL_FROM_BOTH']['loc'],
-                                      self.p['LARVAL_NUCL_FROM_BOTH']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_father:
-            larval = get_rvs('norm', (self.p['LARVAL_NUCL_FROM_FATHER']['loc'],
-                                      self.p['LARVAL_NUCL_FROM_FATHER']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and nucl_from_mother:
-            larval = get_rvs('norm', (self.p['LARVAL_NUCL_FROM_MOTHER']['loc'],
-                                      self.p['LARVAL_NUCL_FROM_MOTHER']['scale']))
-        else:
-            raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
-        if random.random() < larval:
+        larval = draws.variate(ph.larval, 'larval')
+        if draws.random('larva_died') < larval:
             self.larva = False
         else:
             self.larva = True
 
         # pupal mortality
-        if sex == 'm':
-            if self.p['DRIVE'] not in self.genotype1:
-                pupal = get_rvs('norm', (self.p['PUPAL_M_WT']['loc'],
-                                         self.p['PUPAL_M_WT']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father and nucl_from_mother:
-                pupal = get_rvs('norm', (self.p['PUPAL_M_NUCL_FROM_BOTH']['loc'],
-                                         self.p['PUPAL_M_NUCL_FROM_BOTH']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father:
-                pupal = get_rvs('norm', (self.p['PUPAL_M_NUCL_FROM_FATHER']['loc'],
-                                         self.p['PUPAL_M_NUCL_FROM_FATHER']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_mother:
-                pupal = get_rvs('norm', (self.p['PUPAL_M_NUCL_FROM_MOTHER']['loc'],
-                                         self.p['PUPAL_M_NUCL_FROM_MOTHER']['scale']))
-            else:
-                raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
-        else:
-            if self.p['DRIVE'] not in self.genotype1:
-                pupal = get_rvs('norm', (self.p['PUPAL_F_WT']['loc'],
-                                         self.p['PUPAL_F_WT']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father and nucl_from_mother:
-                # assumed
-                pupal = get_rvs('norm', (self.p['PUPAL_M_NUCL_FROM_BOTH']['loc'],
-                                         self.p['PUPAL_M_NUCL_FROM_BOTH']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_father:
-                pupal = get_rvs('norm', (self.p['PUPAL_F_NUCL_FROM_FATHER']['loc'],
-                                         self.p['PUPAL_F_NUCL_FROM_FATHER']['scale']))
-            elif self.p['DRIVE'] in self.genotype1 and nucl_from_mother:
-                pupal = get_rvs('norm', (self.p['PUPAL_F_NUCL_FROM_MOTHER']['loc'],
-                                         self.p['PUPAL_F_NUCL_FROM_MOTHER']['scale']))
-            else:
-                raise RuntimeError(self.genotype1, nucl_from_father, nucl_from_mother)
-        if random.random() < pupal:
+        pupal = draws.variate(ph.pupal, 'pupal')
+        if draws.random('pupa_died') < pupal:
             self.pupa = False
         else:
             self.pupa = True
 
+    @property
+    def p(self):
+        return self.phenotype.p
+
+    @property
+    def sex(self):
+        return self.phenotype.sex
+
+    @property
+    def genotype1(self):
+        return self.phenotype.genotype1
+
+    @property
+    def genotype2(self):
+        return self.phenotype.genotype2
+
+    @property
+    def hom1(self):
+        return self.phenotype.hom1
+
+    @property
+    def hom2(self):
+        return self.phenotype.hom2
+
+    @property
+    def nucl_from_father(self):
+        return self.phenotype.nucl_from_father
+
+    @property
+    def nucl_from_mother(self):
+        return self.phenotype.nucl_from_mother
+
     def get_genotype(self):
         '''Get the full genotype at both loci
 
@@ -284,41 +540,30 @@ class Individual():
         >>> i.get_genotype() # het. drive, hom. antidote
         DWAA
         '''
-        gt = ''
-        for genotype in (self.genotype1, self.genotype2):
-            if len(genotype) == 1:
-                gt += list(genotype)[0]
-                gt += list(genotype)[0]
-            else:
-                gt += ''.join(sorted(genotype))
-        return gt
+        return self.phenotype.genotype
 
-    def _is_intersex(self):
-        if self.p['DRIVE'] in self.genotype1 and (self.nucl_from_father and self.nucl_from_mother):
-            intersex = 0
-        elif self.p['DRIVE'] in self.genotype1 and self.nucl_from_father and self.sex == 'f':
-            intersex = get_rvs('norm', (self.p['INTERSEX_NUCL_FROM_FATHER']['loc'],
-                                        self.p['INTERSEX_NUCL_FROM_FATHER']['scale']))
-        elif self.p['DRIVE'] in self.genotype1 and self.nucl_from_mother and self.sex == 'f':
-            intersex = get_rvs('norm', (self.p['INTERSEX_NUCL_FROM_MOTHER']['loc'],
-                                        self.p['INTERSEX_NUCL_FROM_MOTHER']['scale']))
+    def _is_intersex(self, draws=None):
+        if draws is None:
+            draws = crn.draws(self.lineage)
+        if self.phenotype.intersex is not None:
+            intersex = draws.variate(self.phenotype.intersex, 'intersex')
         else:
             intersex = 0
-        if random.random() <= intersex:
+        if draws.random('is_intersex') <= intersex:
             return True
         return False
 
     def _mating_probability(self):
-        if self.sex == 'm':
-            mating_probability = self.p['MATING_PROBABILITY_MALE']
-        else:
-            mating_probability = self.p['MATING_PROBABILITY']
-        return mating_probability * self.p['MATING_MOD'][self.sex
-                ].get(self.get_genotype(), 1)
+        return self.phenotype.mating_probability
 
-    def get_mating(self):
+    def get_mating(self, draws=None):
         '''Generate the probability that this individual will mate
 
+        Args:
+            draws (large_cage.crn.Draws)
+                Random numbers for this individual
+                (default: from its lineage)
+
         Returns
             mating (bool)
                Wether the individual will mate
@@ -327,22 +572,28 @@ class Individual():
         '''
         if self.intersex:
             return False
-        if self.sex == 'f' and self.genotype1 in [set(x) for x in
-                                                  self.p['NON_FUNCTIONAL']]:
+        if not self.phenotype.can_mate:
             return False
         else:
+            if draws is None:
+                draws = crn.draws(self.lineage)
             prob = self._mating_probability()
-            if random.random() < prob:
+            if draws.random('mating') < prob:
                 return True
             else:
                 return False
 
-    def deposes_eggs(self, modifier):
+    def deposes_eggs(self, modifier, time=None, draws=None):
         '''Generate the probability that this individual will depose eggs
 
         Args:
             modifier (float)
                Modifier for the eggs deposition modifier
+            time (float)
+               Time of the mating event (if any)
+            draws (large_cage.crn.Draws)
+               Random numbers for this individual
+               (default: from its lineage)
 
         Returns
             deposes (bool)
@@ -350,9 +601,11 @@ class Individual():
 
         The decision is based on sex and modifier
         '''
-        if self.sex == 'm':
+        if self.phenotype.sex == 'm':
             return None
-        elif random.random() <= self.p['EGG_DEPOSITION_PROBABILITY'] * modifier:
+        if draws is None:
+            draws = crn.draws(self.lineage)
+        if draws.random('deposition', time) <= self.phenotype.p['EGG_DEPOSITION_PROBABILITY'] * modifier:
             return True
         return False
 
@@ -408,18 +661,23 @@ class Individual():
         else:
             return True
 
-    def _mendelian(self, genotype):
-        if random.random() < 0.5:
+    def _mendelian(self, genotype, draws, event):
+        if draws.random(event) < 0.5:
             return sorted(genotype)[0]
         else:
             return sorted(genotype)[1]
 
-    def form_gamete1(self, ):
+    def form_gamete1(self, draws=None):
         '''Form a gamete for locus 1 (dsx)
 
         If het. DRIVE homing may happen;
         the genotype at locus 2 may block homing
 
+        Args:
+            draws (large_cage.crn.Draws)
+                Random numbers for this gamete
+                (default: global random numbers)
+
         Returns:
             genotype (str)
                 Genotype at locus 1 for this gamete
@@ -428,44 +686,40 @@ class Individual():
         >>> i.form_gamete1()
         W
         '''
-        if self.hom1:
-            return tuple(self.genotype1)[0]
-        if self.p['DRIVE'] not in self.genotype1:
-            return self._mendelian(self.genotype1)
+        ph = self.phenotype
+        if ph.hom1:
+            return ph.alleles1[0]
+        if draws is None:
+            draws = crn.draws(None)
+        if not ph.drive:
+            return self._mendelian(ph.alleles1, draws, 'mendelian1')
         else:
             # anti-drive present?
-            if self.p['ANTI_DRIVE'] in self.genotype2:
-                if random.random() <= 1 - self.p['DRIVE_EFFICIENCY_MOD'][self.sex
-                        ].get(self.get_genotype(), 1):
-                    return self.p['DRIVE']
+            if ph.anti_drive:
+                if draws.random('blocked') <= 1 - ph.drive_efficiency_mod:
+                    return ph.p['DRIVE']
                 else:
                     # return the other allele
-                    try:
-                        return sorted(set(self.genotype1).difference((self.p['DRIVE'],)))[0]
-                    except Exception as e:
-                        raise RuntimeError(self.genotype1, self.genotype2, str(e))
+                    return ph.other1
             # supermendelian
-            if self.sex == 'm':
-                if random.random() <= get_rvs('norm', (self.p['DRIVE_EFFICIENCY_MALE']['loc'],
-                                                       self.p['DRIVE_EFFICIENCY_MALE']['scale'])):
-                    return self.p['DRIVE']
-            else:
-                if random.random() <= get_rvs('norm', (self.p['DRIVE_EFFICIENCY_FEMALE']['loc'],
-                                                       self.p['DRIVE_EFFICIENCY_FEMALE']['scale'])):
-                    return self.p['DRIVE']
+            if draws.random('homing') <= draws.variate(ph.drive_efficiency,
+                                                       'drive_efficiency'):
+                return ph.p['DRIVE']
             # resistance
             # TODO: could have functional resistance here too?
-            if random.random() < self.p['RESISTANCE_EFFICIENCY'][self.sex]:
-                return self.p['RESISTANCE']
+            if draws.random('resistance') < ph.resistance_efficiency:
+                return ph.p['RESISTANCE']
             # return the other allele
-            try:
-                return sorted(set(self.genotype1).difference((self.p['DRIVE'])))[0]
-            except Exception as e:
-                raise RuntimeError(self.genotype1, self.genotype2, str(e))
+            return ph.other1
 
-    def form_gamete2(self):
+    def form_gamete2(self, draws=None):
         '''Form a gamete for locus 2 (antidote)
 
+        Args:
+            draws (large_cage.crn.Draws)
+                Random numbers for this gamete
+                (default: global random numbers)
+
         Returns:
             genotype (str)
                 Genotype at locus 2 for this gamete
@@ -474,22 +728,21 @@ class Individual():
         >>> i.form_gamete2()
         A
         '''
-        if self.hom2:
-            return tuple(self.genotype2)[0]
+        ph = self.phenotype
+        if ph.hom2:
+            return ph.alleles2[0]
         else:
+            if draws is None:
+                draws = crn.draws(None)
             # anti-drive present?
-            if self.p['ANTI_DRIVE'] in self.genotype2:
-                if random.random() <= self.p['ANTIDOTE_INHERITANCE'][self.sex
-                        ].get(self.get_genotype(), 1):
-                    return self.p['ANTI_DRIVE']
+            if ph.anti_drive:
+                if draws.random('antidote') <= ph.antidote_inheritance:
+                    return ph.p['ANTI_DRIVE']
                 else:
                     # return the other allele
-                    try:
-                        return sorted(set(self.genotype1).difference((self.p['ANTI_DRIVE'],)))[0]
-                    except Exception as e:
-                        raise RuntimeError(self.genotype1, self.genotype2, str(e))
+                    return ph.other2
             # simple mendelian
-            return self._mendelian(self.genotype2)
+            return self._mendelian(ph.alleles2, draws, 'mendelian2')
 
     def get_egg_mod(self):
         '''Get the genotype-specific modifier for the number of eggs
@@ -502,7 +755,7 @@ class Individual():
         >>> i.get_egg_mod()
         0.95
         '''
-        return self.p['EGGS_MOD'][self.sex].get(self.get_genotype(), 1.)
+        return self.phenotype.egg_mod
 
     def get_hatching_mod(self):
         '''Get the genotype-specific modifier for the hatching rate
@@ -515,7 +768,7 @@ class Individual():
         >>> i.get_hatching_mod()
         0.95
         '''
-        return self.p['HATCHING_MOD'][self.sex].get(self.get_genotype(), 1.)
+        return self.phenotype.hatching_mod
 
     def get_deposition_mod(self):
         '''Get the genotype-specific modifier for the deposition prob
@@ -528,12 +781,29 @@ class Individual():
         >>> i.get_deposition_mod()
         0.95
         '''
-        return self.p['DEPOSITION_MOD'][self.sex].get(self.get_genotype(), 1.)
+        return self.phenotype.deposition_mod
+
+
+def recycle(individuals):
+    '''Make dead individuals available for reuse
+
+    New individuals are then created from the recycled ones,
+    rather than allocated again; the recycled individuals
+    must not be used anywhere else
+
+    Args:
+        individuals (list)
+            Dead individuals
+    '''
+    room = max_free_individuals - len(free_individuals)
+    if room > 0:
+        free_individuals.extend(individuals[:room])
 
 
 def mate_all(population, p=None,
              multiple_mating_female=None,
-             multiple_mating_male=None):
+             multiple_mating_male=None,
+             time=None, aggregate=None):
     '''Randomly mate all adults that can mate
 
     Args:
@@ -545,10 +815,18 @@ def mate_all(population, p=None,
             Wether females can mate multiple times in their lifetime
         multiple_mating_male (bool)
             Wether males can mate multiple times in their lifetime
+        time (float)
+            Time of the mating event, used to key
+            common random numbers (see `large_cage.crn`)
+        aggregate (bool)
+            Mate all pairs of the same genotype classes at once
+            (see `mate_classes`) rather than each pair (see `mate`);
+            by default pairs are aggregated unless common random
+            numbers are used, as they are keyed by the parents of each egg
 
     Returns:
-        eggs (set)
-            An iterable of offsprings (Individual objects)
+        eggs (Population)
+            Offsprings (Individual objects)
     '''
     if p is None:
         p = params
@@ -556,7 +834,7 @@ def mate_all(population, p=None,
         multiple_mating_female=p['MULTIPLE_MATING_FEMALE']
     if multiple_mating_male is None:
         multiple_mating_male=p['MULTIPLE_MATING_MALE']
-    eggs = set()
+    eggs = Population()
     males = [x for x in population
                 if x.sex == 'm'
                 and x.stage == 'adult'
@@ -569,16 +847,28 @@ def mate_all(population, p=None,
                 and x.mating
                 and ((not multiple_mating_female and not x.mated) or
                      multiple_mating_female)]
-    random.shuffle(males)
-    random.shuffle(females)
+    if crn.streams is not None:
+        crn.streams.shuffle(males, 'pairing', time)
+        crn.streams.shuffle(females, 'pairing', time)
+    else:
+        random.shuffle(males)
+        random.shuffle(females)
+    if aggregate is None:
+        aggregate = crn.streams is None
+    if aggregate:
+        eggs.extend(mate_classes(males, females, p=p,
+                                 multiple_mating_female=multiple_mating_female,
+                                 multiple_mating_male=multiple_mating_male))
+        return eggs
     for m, f in zip(males, females):
-        eggs = eggs.union(mate(m, f, p=p))
+        eggs.extend(mate(m, f, p=p, time=time))
     return eggs
 
 
 def mate(m, f, p=None,
          multiple_mating_female=None,
-         multiple_mating_male=None):
+         multiple_mating_male=None,
+         time=None):
     '''Mate a female with a male, if conditions are right
 
     Args:
@@ -592,6 +882,9 @@ def mate(m, f, p=None,
             Wether females can mate multiple times in their lifetime
         multiple_mating_male (bool)
             Wether males can mate multiple times in their lifetime
+        time (float)
+            Time of the mating event; with common random numbers
+            the lineage of the eggs derives from the parents and time
 
     Returns:
         eggs (set)
@@ -606,7 +899,7 @@ def mate(m, f, p=None,
     if f.sex == m.sex:
         raise RuntimeError('Cannot mate')
 
-    eggs = set()
+    eggs = []
 
     if not multiple_mating_female:
         f.mated = True
@@ -623,7 +916,7 @@ def mate(m, f, p=None,
     # also can the female depose eggs?
     if not f.mating or not m.mating:
         return eggs
-    if not f.deposes_eggs(deposition_mod):
+    if not f.deposes_eggs(deposition_mod, time=time):
         return eggs
 
     actual_eggs = round(f.eggs * egg_mod)
@@ -637,22 +930,30 @@ def mate(m, f, p=None,
             nucl_from_mother = True
         if p['DRIVE'] in m.genotype1:
             nucl_from_father = True
+        if crn.streams is not None and f.lineage is not None and m.lineage is not None:
+            lineage = crn.streams.lineage(f.lineage, m.lineage, time, egg)
+        else:
+            lineage = None
+        draws = crn.draws(lineage)
+        fdraws = crn.draws(lineage, 'mother')
+        mdraws = crn.draws(lineage, 'father')
         # maternal gamete (locus1)
-        fg1 = f.form_gamete1()
+        fg1 = f.form_gamete1(fdraws)
         # paternal gamete (locus1)
-        mg1 = m.form_gamete1()
+        mg1 = m.form_gamete1(mdraws)
         # maternal gamete (locus2)
-        fg2 = f.form_gamete2()
+        fg2 = f.form_gamete2(fdraws)
         # paternal gamete (locus2)
-        mg2 = m.form_gamete2()
+        mg2 = m.form_gamete2(mdraws)
         # sex
-        if random.random() < 0.5:
+        if draws.random('sex') < 0.5:
             sex = 'm'
         else:
             sex = 'f'
-        eggs.add(Individual(sex, (fg1, mg1), (fg2, mg2),
-                            nucl_from_father, nucl_from_mother,
-                            hatching_mod, parameters=p))
+        eggs.append(Individual(sex, (fg1, mg1), (fg2, mg2),
+                               nucl_from_father, nucl_from_mother,
+                               hatching_mod, parameters=p,
+                               lineage=lineage))
 
     # regenerate mating probability for next cycle
     # m.mating = m.get_mating()
@@ -661,6 +962,121 @@ def mate(m, f, p=None,
     return eggs
 
 
+def get_offspring(m, f):
+    '''Distribution of the offspring of a pair of phenotype classes
+
+    Gametes at both loci (see `Phenotype.gametes1` and
+    `Phenotype.gametes2`) and sex are drawn independently for each egg,
+    so that the offspring of each pair of classes follow the same
+    distribution; it is computed once, and kept in the female class
+
+    Args:
+        m (Phenotype)
+            Class of the male
+        f (Phenotype)
+            Class of the female
+
+    Returns:
+        classes (list)
+            (sex, genotype1, genotype2) of each offspring class
+        probabilities (numpy.array)
+            Probability of each offspring class
+    '''
+    try:
+        return f.offspring[m]
+    except KeyError:
+        pass
+    probabilities = Counter()
+    for (fg1, pf1), (mg1, pm1), (fg2, pf2), (mg2, pm2) in itertools.product(
+            f.gametes1().items(), m.gametes1().items(),
+            f.gametes2().items(), m.gametes2().items()):
+        probability = pf1 * pm1 * pf2 * pm2 * 0.5
+        if probability <= 0:
+            continue
+        for sex in ('m', 'f'):
+            probabilities[(sex, tuple(sorted((fg1, mg1))),
+                           tuple(sorted((fg2, mg2))))] += probability
+    classes = list(probabilities)
+    weights = np.array([probabilities[x] for x in classes])
+    f.offspring[m] = (classes, weights / weights.sum())
+    return f.offspring[m]
+
+
+def mate_classes(males, females, p=None,
+                 multiple_mating_female=None,
+                 multiple_mating_male=None):
+    '''Mate pairs of adults, aggregated by their phenotype classes
+
+    Equivalent to calling `mate` on each pair (without common random
+    numbers): pairs are counted for each pair of classes, the females
+    deposing eggs are drawn at once for each of them, and the genotypes
+    of all their eggs are drawn from a single multinomial (see
+    `get_offspring`), so that the cost of mating depends on the number
+    of classes rather than on the number of pairs and eggs; only the
+    eggs themselves are created one at a time
+
+    Args:
+        males (iterable)
+            Males, paired with the females in order
+        females (iterable)
+            Females
+        p (dict)
+            Parameters
+        multiple_mating_female (bool)
+            Wether females can mate multiple times in their lifetime
+        multiple_mating_male (bool)
+            Wether males can mate multiple times in their lifetime
+
+    Returns:
+        eggs (list)
+            Offsprings (Individual objects)
+    '''
+    if p is None:
+        p = params
+    if multiple_mating_female is None:
+        multiple_mating_female=p['MULTIPLE_MATING_FEMALE']
+    if multiple_mating_male is None:
+        multiple_mating_male=p['MULTIPLE_MATING_MALE']
+
+    # eggs produced by the females of each pair of classes
+    pairs = {}
+    for m, f in zip(males, females):
+        if not multiple_mating_female:
+            f.mated = True
+        if not multiple_mating_male:
+            m.mated = True
+        if not f.mating or not m.mating:
+            continue
+        key = (m.phenotype, f.phenotype)
+        try:
+            pairs[key].append(f.eggs)
+        except KeyError:
+            pairs[key] = [f.eggs]
+
+    eggs = []
+    for (m, f), produced in pairs.items():
+        produced = np.array(produced, dtype=float)
+        # as in `Individual.deposes_eggs`
+        deposition = (p['EGG_DEPOSITION_PROBABILITY'] *
+                      (m.deposition_mod * f.deposition_mod))
+        deposing = np.random.random(produced.shape[0]) <= deposition
+        # as in `mate`, rounding each female's eggs
+        actual_eggs = np.round(produced[deposing] *
+                               (m.egg_mod * f.egg_mod))
+        n = int(np.maximum(actual_eggs, 0).sum())
+        if n == 0:
+            continue
+        hatching_mod = m.hatching_mod * f.hatching_mod
+        classes, probabilities = get_offspring(m, f)
+        counts = np.random.multinomial(n, probabilities)
+        for (sex, genotype1, genotype2), k in zip(classes, counts.tolist()):
+            for _ in range(k):
+                eggs.append(Individual(sex, genotype1, genotype2,
+                                       m.drive, f.drive,
+                                       hatching_mod, parameters=p))
+    return eggs
+
+
 def get_all_genotypes(p=None):
     '''A generator of all possible genotypes
 
@@ -685,6 +1101,31 @@ def get_all_genotypes(p=None):
             yield ''.join(g1) + ''.join(g2)
 
 
+def get_header(p=None):
+    '''Columns of the simulation output
+
+    Args:
+        p (dict)
+            Parameters
+
+    Returns:
+        columns (list)
+            Column names, see `format_record`
+    '''
+    if p is None:
+        p = params
+    return (['round', 'time', 'initial_release',
+             'pop', 'fpop', 'eggs', 'feggs', 'output', 'foutput',
+             'fitness'] +
+            ['WT', 'transgenes', 'drives', 'anti', 'resistance'] +
+            [gt for gt in get_all_genotypes(p)] +
+            ['%s.eggs' % gt for gt in get_all_genotypes(p)] +
+            ['WT.output', 'transgenes.output',
+             'drives.output', 'anti.output',
+             'resistance.output'] +
+            ['%s.output' % gt for gt in get_all_genotypes(p)])
+
+
 def print_header(p=None):
     '''Print to stdout the header for the simulation output
 
@@ -694,17 +1135,76 @@ def print_header(p=None):
     '''
     if p is None:
         p = params
-    print('\t'.join(['round', 'time', 'initial_release',
-                     'pop', 'fpop', 'eggs', 'feggs', 'output', 'foutput',
-                     'fitness'] +
-                    ['WT', 'transgenes', 'drives', 'anti', 'resistance'] +
-                    [gt for gt in get_all_genotypes(p)] +
-                    ['%s.eggs' % gt for gt in get_all_genotypes(p)] +
-                    ['WT.output', 'transgenes.output',
-                     'drives.output', 'anti.output',
-                     'resistance.output'] +
-                    ['%s.output' % gt for gt in get_all_genotypes(p)] 
-                    ))
+    print('\t'.join(get_header(p)))
+
+
+# selected output columns, see `get_observables`
+Observables = namedtuple('Observables', ['columns', 'censuses', 'specs'])
+
+# census fields of the summary columns
+_summary_fields = {'WT': 2, 'transgenes': 3, 'drives': 4,
+                   'anti': 5, 'resistance': 6}
+
+
+def get_observables(columns, p=None):
+    '''Select the output columns to compute
+
+    Only the censuses needed by the selected columns are computed
+    (see `get_record`), and only the selected columns are formatted
+    (see `format_record`)
+
+    Example: eggs and fitness only
+    >>> observables = get_observables(['round', 'time', 'eggs', 'fitness'])
+    >>> sim = get_simulation(p, observables=observables)
+
+    Args:
+        columns (iterable)
+            Output columns, see `get_header`
+        p (dict)
+            Parameters
+
+    Returns:
+        observables (Observables)
+            The columns, the censuses needed by them (among "population",
+            "fitness", "eggs" and "output") and how each column is computed
+
+    Raises:
+        ValueError
+            If a column is not part of the output
+    '''
+    if p is None:
+        p = params
+    columns = tuple(columns)
+    unknown = set(columns) - set(get_header(p))
+    if unknown:
+        raise ValueError('Unknown output columns: ' +
+                         ', '.join(sorted(unknown)))
+    genotypes = {gt: i for i, gt in enumerate(get_all_genotypes(p))}
+    censuses = set()
+    specs = []
+    for column in columns:
+        name, _, part = column.partition('.')
+        if column in ('round', 'time', 'initial_release'):
+            specs.append(('field', column, None))
+        elif column == 'fitness':
+            censuses.update(('population', 'fitness'))
+            specs.append(('fitness', 'population', None))
+        elif column in ('pop', 'fpop', 'eggs', 'feggs',
+                        'output', 'foutput'):
+            part = {'pop': 'population', 'fpop': 'population',
+                    'eggs': 'eggs', 'feggs': 'eggs',
+                    'output': 'output', 'foutput': 'output'}[column]
+            censuses.add(part)
+            specs.append(('count', part, int(column.startswith('f'))))
+        else:
+            part = part if part else 'population'
+            censuses.add(part)
+            if name in _summary_fields:
+                specs.append(('proportion', part, _summary_fields[name]))
+            else:
+                # genotypes follow the summary fields
+                specs.append(('proportion', part, 7 + genotypes[name]))
+    return Observables(columns, frozenset(censuses), tuple(specs))
 
 
 def get_drive_frequency(population, p=None):
@@ -733,10 +1233,59 @@ def get_drive_frequency(population, p=None):
     return prop
 
 
-def print_status(time, population, output,
-                 initial_population,
-                 eggs, repetition, p=None):
-    '''Print information about the genotype frequencies to stdout
+# population census, see `get_census`
+Census = namedtuple('Census', ['total', 'females',
+                               'wild_type', 'transgenes',
+                               'drives', 'anti', 'resistance',
+                               'genotypes'])
+
+
+def get_census(individuals, p=None):
+    '''Count individuals by sex and genotype
+
+    Individuals are grouped by their phenotype class in a single pass
+
+    Args:
+        individuals (iterable)
+            Individuals to count
+        p (dict)
+            Parameters
+
+    Returns:
+        census (Census)
+            Counts of all, female, wild-type, transgenic, drive, antidote
+            and resistance individuals; genotypes is an array of counts
+            following the order of `get_all_genotypes`
+    '''
+    if p is None:
+        p = params
+    index = {gt: i for i, gt in enumerate(get_all_genotypes(p))}
+    genotypes = np.zeros(len(index), dtype=int)
+    total = females = wild_type = transgenes = drives = anti = resistance = 0
+    for ph, n in Counter(x.phenotype for x in individuals).items():
+        total += n
+        if ph.sex == 'f':
+            females += n
+        if ph.wild_type:
+            wild_type += n
+        if ph.transgenic:
+            transgenes += n
+        if ph.drive:
+            drives += n
+        if ph.anti_drive:
+            anti += n
+        if ph.resistance:
+            resistance += n
+        if ph.genotype in index:
+            genotypes[index[ph.genotype]] += n
+    return Census(total, females, wild_type, transgenes,
+                  drives, anti, resistance, genotypes)
+
+
+def get_record(time, population, output,
+               initial_population,
+               eggs, repetition, p=None, observables=None):
+    '''Summarise the state of the simulation
 
     Args:
         time (float)
@@ -753,86 +1302,200 @@ def print_status(time, population, output,
             Round of simulation
         p (dict)
             Parameters
+        observables (Observables)
+            Only compute the censuses needed by these columns
+            (see `get_observables`), the others being None;
+            default: all columns
+
+    Returns:
+        record (dict)
+            round, time, initial_release, fitness (proportion of females
+            that can mate, NaN if there are no females) and the census
+            (see `get_census`) of population, eggs and output; with
+            observables, also the observables themselves
     '''
     if p is None:
         p = params
-    fpop = [x for x in population if x.sex == 'f']
-    pop = len(population)
-    results = [str(repetition), str(time), str(initial_population),
-               str(len(population)), str(len(fpop)),
-               str(len(eggs)), str(len([x for x in eggs if x.sex == 'f'])),
-               str(len(output)), str(len([x for x in output if x.sex == 'f']))]
-    if pop != 0:
-        if len(fpop) == 0:
-            results.append('%.5f' % 0.)
-        else:
-            results.append('%.5f' % (len([x for x in fpop
-                                if x.mating and x.deposing_eggs]) / len(fpop)))
-        results.append('%.5f' % (len([x for x in population
-                            if x.genotype1 == {p['WILD_TYPE'], }
-                            and x.genotype2 == {p['WILD_TYPE'], }]) / pop))
-        results.append('%.5f' % (len([x for x in population
-                            if x.genotype1.difference({p['WILD_TYPE'], }) != set()
-                            or x.genotype2.difference({p['WILD_TYPE'], }) != set()]) / pop))
-        results.append('%.5f' % (len([x for x in population
-                            if p['DRIVE'] in x.genotype1]) / pop))
-        results.append('%.5f' % (len([x for x in population
-                            if p['ANTI_DRIVE'] in x.genotype2]) / pop))
-        results.append('%.5f' % (len([x for x in population
-                            if p['RESISTANCE'] in x.genotype1]) / pop))
-        for gt in get_all_genotypes(p):
-            results.append('%.5f' % (len([x for x in population
-                                if x.get_genotype() == gt]) / pop))
+    if observables is None:
+        censuses = ('population', 'fitness', 'eggs', 'output')
     else:
-        for _ in range(6):
-            results.append('')
-        for gt in get_all_genotypes(p):
-            results.append('')
-    if len(eggs) != 0:
-        for gt in get_all_genotypes(p):
-            results.append('%.5f' % (len([x for x in eggs
-                                if x.get_genotype() == gt]) / len(eggs)))
+        censuses = observables.censuses
+    fitness = np.nan
+    if 'fitness' in censuses:
+        fertile = 0
+        for x in population:
+            if x.phenotype.sex == 'f' and x.mating and x.deposing_eggs:
+                fertile += 1
+    if 'population' in censuses:
+        population = get_census(population, p)
+        if 'fitness' in censuses and population.females > 0:
+            fitness = fertile / population.females
     else:
-        for gt in get_all_genotypes(p):
+        population = None
+    record = {'round': repetition,
+              'time': time,
+              'initial_release': initial_population,
+              'fitness': fitness,
+              'population': population,
+              'eggs': (get_census(eggs, p)
+                       if 'eggs' in censuses else None),
+              'output': (get_census(output, p)
+                         if 'output' in censuses else None)}
+    if observables is not None:
+        record['observables'] = observables
+    return record
+
+
+def _proportions(census, summary=True):
+    if census.total == 0:
+        return [''] * ((5 if summary else 0) + census.genotypes.shape[0])
+    results = []
+    if summary:
+        for n in census[2:7]:
+            results.append('%.5f' % (n / census.total))
+    for n in census.genotypes:
+        results.append('%.5f' % (n / census.total))
+    return results
+
+
+def _format_observables(record, observables):
+    results = []
+    for kind, part, i in observables.specs:
+        if kind == 'field':
+            results.append(str(record[part]))
+            continue
+        census = record[part]
+        if kind == 'count':
+            results.append(str(census[i]))
+        elif census.total == 0:
             results.append('')
-    if len(output) != 0:
-        results.append('%.5f' % (len([x for x in output
-                            if x.genotype1 == {p['WILD_TYPE'], }
-                            and x.genotype2 == {p['WILD_TYPE'], }]) / len(output)))
-        results.append('%.5f' % (len([x for x in output
-                            if x.genotype1.difference({p['WILD_TYPE'], }) != set()
-                            or x.genotype2.difference({p['WILD_TYPE'], }) != set()]) / len(output)))
-        results.append('%.5f' % (len([x for x in output
-                            if p['DRIVE'] in x.genotype1]) / len(output)))
-        results.append('%.5f' % (len([x for x in output
-                            if p['ANTI_DRIVE'] in x.genotype2]) / len(output)))
-        results.append('%.5f' % (len([x for x in output
-                            if p['RESISTANCE'] in x.genotype1]) / len(output)))
-        for gt in get_all_genotypes(p):
-            results.append('%.5f' % (len([x for x in output
-                                if x.get_genotype() == gt]) / len(output)))
+        elif kind == 'fitness':
+            results.append('%.5f' % (record['fitness']
+                                     if census.females else 0.))
+        else:
+            n = census[i] if i < 7 else census.genotypes[i - 7]
+            results.append('%.5f' % (n / census.total))
+    return '\t'.join(results)
+
+
+def get_values(record, observables):
+    '''Values of the selected columns for a record
+
+    Args:
+        record (dict)
+            As returned by `get_record`
+        observables (Observables)
+            Selected columns, see `get_observables`
+
+    Returns:
+        values (list of float)
+            One value for each column, NaN for frequencies and fitness
+            of an empty census (empty in the output)
+    '''
+    values = []
+    for kind, part, i in observables.specs:
+        if kind == 'field':
+            values.append(float(record[part]))
+            continue
+        census = record[part]
+        if kind == 'count':
+            values.append(float(census[i]))
+        elif census.total == 0:
+            values.append(np.nan)
+        elif kind == 'fitness':
+            values.append(float(record['fitness']) if census.females else 0.)
+        else:
+            n = census[i] if i < 7 else census.genotypes[i - 7]
+            values.append(n / census.total)
+    return values
+
+
+def format_record(record):
+    '''Format a record as a line of the tab-delimited output
+
+    See `print_header` for the columns; records computed for a
+    selection of columns (see `get_observables`) only output those
+
+    Args:
+        record (dict)
+            As returned by `get_record`
+
+    Returns:
+        line (str)
+            Tab-delimited line (without newline)
+    '''
+    if record.get('observables') is not None:
+        return _format_observables(record, record['observables'])
+    population = record['population']
+    eggs = record['eggs']
+    output = record['output']
+    results = [str(record['round']), str(record['time']),
+               str(record['initial_release']),
+               str(population.total), str(population.females),
+               str(eggs.total), str(eggs.females),
+               str(output.total), str(output.females)]
+    if population.total != 0:
+        if population.females == 0:
+            results.append('%.5f' % 0.)
+        else:
+            results.append('%.5f' % record['fitness'])
     else:
         results.append('')
-        results.append('')
-        results.append('')
-        results.append('')
-        results.append('')
-        for gt in get_all_genotypes(p):
-            results.append('')
+    results += _proportions(population)
+    results += _proportions(eggs, summary=False)
+    results += _proportions(output)
+    return '\t'.join(results)
 
-    print('\t'.join(results))
 
+def print_status(time, population, output,
+                 initial_population,
+                 eggs, repetition, p=None):
+    '''Print information about the genotype frequencies to stdout
+
+    Args:
+        time (float)
+            Simulation time, in days
+        population (iterable)
+            All individuals in the population
+        output (iterable)
+            All larvae + pupae currently available
+        initial_population (bool)
+            Wether we are introducing the start population
+        eggs (iterable)
+            All eggs produced at this time point
+        repetition (int)
+            Round of simulation
+        p (dict)
+            Parameters
+    '''
+    print(format_record(get_record(time, population, output,
+                                   initial_population,
+                                   eggs, repetition, p)))
 
-def run_simulation(start_populations,
-                   repetition=0, end_time=365,
-                   time_step=None, release=None,
-                   special_releases=None,
-                   report_times=None, release_days=None,
-                   additional_releases=None,
-                   eggs_filter=None,
-                   use_adults_if_needed=False,
-                   p=None):
-    '''Run a full large-cage simulation given a series of start populations
+
+def _shuffle(individuals, event, time):
+    # with common random numbers the order only depends on the lineages
+    if crn.streams is not None:
+        crn.streams.shuffle(individuals, event, time)
+    else:
+        random.shuffle(individuals)
+
+
+class Simulation():
+    '''Full large-cage simulation given a series of start populations
+
+    The simulation is advanced one time step at a time through the
+    `step` method; iterating over it yields a record (see `get_record`)
+    for each report time, with the following event flags added:
+    - drive_observed: the drive has been observed for the first time
+    - threshold_passed: the drive frequency threshold for the
+      additional releases has been passed
+    - late_release: additional adults have been released
+
+    Example: stop as soon as the drive is lost
+    >>> for record in Simulation(start_populations, p=p):
+            if record['population'].drives == 0 and record['time'] > 100:
+                break
 
     Args:
         start_populations (iterable of iterables)
@@ -870,167 +1533,508 @@ def run_simulation(start_populations,
         use_adults_if_needed (bool)
             If there are no pupae in the egg nursery, use adults
             (can be necessary if there is a single release)
+        observables (Observables)
+            Only compute these output columns, see `get_observables`
+            (default: all of them)
+        record_times (iterable of float)
+            Only yield records for these days (default: all report times);
+            unlike report_times, the drive frequencies are still tracked
+            every day, and the simulation ends after the last of them
         p (dict)
             Parameters
     '''
-    if p is None:
-        p = params
-    if time_step is None:
-        time_step=p['TIME_STEP']
-    if release is None:
-        release=p['RELEASE']
-    if release_days is None:
-        release_days=p['RELEASE_DAYS']
-    if report_times is None:
-        report_times = []
-    if special_releases is None:
-        special_releases = {}
-    if eggs_filter is not None:
-        eggs_filter_norm = stats.norm(loc=eggs_filter[0],
-                                      scale=eggs_filter[1])
-
-    total_time = -time_step
-
-    eggs_nursery = set()
-    eggs_hatched = False
-
-    wt_triggered = False
-
-    latest_eggs = set()
-    # eggs are harvested in the next feeding cycle
-    previous_eggs = set()
-
-    # reverse the order of initial populations
-    # so that we can use the "pop" function
-    start_populations = start_populations[::-1]
-    population = start_populations.pop()
-
-    # counter for additional releases
-    additional_releases_counter = 0
-
-    # keep track of drive frequencies
-    drive_frequencies = []
-    drive_ever_released = False
-    drive_threshold_passed = False
-
-    while len(population) > 0 and total_time < end_time:
-        restocking = False
-        total_time += time_step
-        total_time = round(total_time, 1)
-        if total_time == 0:
-            initial_population = True
-
-        # age
-        dead = set()
-        for i in population:
-            i.change_age(time_step)
-            if not i.is_alive():
-                dead.add(i)
-        for i in dead:
-            population.remove(i)
+    def __init__(self, start_populations,
+                 repetition=0, end_time=365,
+                 time_step=None, release=None,
+                 special_releases=None,
+                 report_times=None, release_days=None,
+                 additional_releases=None,
+                 eggs_filter=None,
+                 use_adults_if_needed=False,
+                 observables=None,
+                 record_times=None,
+                 p=None):
+        if p is None:
+            p = params
+        if time_step is None:
+            time_step=p['TIME_STEP']
+        if release is None:
+            release=p['RELEASE']
+        if release_days is None:
+            release_days=p['RELEASE_DAYS']
+        if report_times is None:
+            report_times = []
+        if special_releases is None:
+            special_releases = {}
+        self.eggs_filter_norm = None
+        if eggs_filter is not None:
+            self.eggs_filter_norm = get_distribution({'loc': eggs_filter[0],
+                                                      'scale': eggs_filter[1]})
+
+        self.p = p
+        self.repetition = repetition
+        self.end_time = end_time
+        self.time_step = time_step
+        self.release = release
+        self.special_releases = special_releases
+        self.report_times = report_times
+        self.release_days = release_days
+        self.additional_releases = additional_releases
+        self.use_adults_if_needed = use_adults_if_needed
+        self.observables = observables
+        self.record_times = None
+        if record_times is not None:
+            self.record_times = {round(float(x), 2) for x in record_times}
+            self.end_time = min(self.end_time, max(self.record_times,
+                                                   default=-1))
+
+        self.total_time = -time_step
+
+        self.eggs_nursery = Population()
+
+        self.latest_eggs = Population()
+        # eggs are harvested in the next feeding cycle
+        self.previous_eggs = Population()
+
+        # reverse the order of initial populations
+        # so that we can use the "pop" function
+        self.start_populations = list(start_populations)[::-1]
+        self.population = Population(self.start_populations.pop())
+
+        # counter for additional releases
+        self.additional_releases_counter = 0
+
+        # keep track of drive frequencies
+        self.drive_frequencies = []
+        self.drive_ever_released = False
+        self.drive_threshold_passed = False
+
+        # current state
+        self.restocking = False
+        self.output = []
+
+        # events at the current time step
+        self.drive_observed = False
+        self.threshold_passed = False
+        self.late_release = False
+
+    def running(self):
+        '''Can the simulation move forward?
+
+        Returns:
+            running (bool)
+                False if the population is extinct or the end
+                time has been reached
+        '''
+        return len(self.population) > 0 and self.total_time < self.end_time
+
+    def step(self):
+        '''Move the simulation forward by one time step
+
+        Returns:
+            report (bool)
+                Wether this is a report time
+        '''
+        p = self.p
+        time_step = self.time_step
+        additional_releases = self.additional_releases
+
+        self.restocking = False
+        self.drive_observed = False
+        self.threshold_passed = False
+        self.late_release = False
+        self.total_time += time_step
+        self.total_time = round(self.total_time, 1)
+        total_time = self.total_time
+
+        # age (removing dead individuals)
+        recycle(self.population.age(time_step))
         # also in egg nursery
-        dead = set()
-        for e in eggs_nursery:
-            e.change_age(time_step)
-            if not e.is_alive():
-                dead.add(e)
-        for e in dead:
-            eggs_nursery.remove(e)
+        recycle(self.eggs_nursery.age(time_step))
         # also in previous egg batch
-        dead = set()
-        for e in previous_eggs:
-            e.change_age(time_step)
-            if not e.is_alive():
-                dead.add(e)
-        for e in dead:
-            previous_eggs.remove(e)
+        # (not recycled, as they might still be counted as latest eggs)
+        self.previous_eggs.age(time_step)
 
         # day of the week
         day = round(total_time, 1) % 7
 
-        eggs = set()
-
         #  Select the larvae from previous harvests
-        if len(eggs_nursery) > 0:
-            larvae = [x for x in eggs_nursery if x.stage == 'larva']
-            pupae = [x for x in eggs_nursery if x.stage == 'pupa']
-            if len(pupae) == 0 and use_adults_if_needed:
+        if len(self.eggs_nursery) > 0:
+            larvae = self.eggs_nursery.select(lambda x: x.stage == 'larva')
+            pupae = self.eggs_nursery.select(lambda x: x.stage == 'pupa')
+            if len(pupae) == 0 and self.use_adults_if_needed:
                 # could happen if there is a single release day
-                pupae = [x for x in eggs_nursery if x.stage == 'adult']
+                pupae = self.eggs_nursery.select(lambda x: x.stage == 'adult')
         else:
             larvae = []
             pupae = []
 
         # feeding/harvesting/release day
-        if day % 1 == 0 and int(day) in release_days:
-            restocking = True
+        if day % 1 == 0 and int(day) in self.release_days:
+            self.restocking = True
             # collect the previous round of eggs
-            if len(previous_eggs) > 0:
-                eggs_nursery = eggs_nursery.union(previous_eggs)
-            previous_eggs = set()
-            latest_eggs = set()
+            self.eggs_nursery.take(self.previous_eggs)
+            self.latest_eggs = Population()
 
             # add further start populations
-            if len(start_populations) > 0 and total_time > 1:
-                for indv in start_populations.pop():
-                    population.add(indv)
+            if len(self.start_populations) > 0 and total_time > 1:
+                self.population.extend(self.start_populations.pop())
 
             # additional releases (to be done before mating)
             if additional_releases is not None:
-                if (additional_releases[3] is None and total_time >= additional_releases[1]) or (additional_releases[3] is not None and drive_threshold_passed):
-                    additional_releases_counter += 1
-                    if additional_releases[2] == -1 or additional_releases_counter <= additional_releases[2]:
-                        for adult in additional_releases[0]:
-                            population.add(deepcopy(adult))
+                if (additional_releases[3] is None and total_time >= additional_releases[1]) or (additional_releases[3] is not None and self.drive_threshold_passed):
+                    self.additional_releases_counter += 1
+                    if additional_releases[2] == -1 or self.additional_releases_counter <= additional_releases[2]:
+                        self.late_release = True
+                        adults = deepcopy(list(additional_releases[0]))
+                        for adult in adults:
+                            if adult.lineage is not None:
+                                # released copies are different individuals
+                                adult.lineage = crn.lineage(adult.lineage,
+                                                            total_time)
+                        self.population.extend(adults)
 
             # mate adults (we are after feeding)
-            eggs = mate_all(population, p=p)
+            eggs = mate_all(self.population, p=p, time=total_time)
             # trim eggs if parameter is set
-            if eggs_filter is not None:
+            if self.eggs_filter_norm is not None:
                 eggs = list(eggs)
-                random.shuffle(eggs)
-                eggs_to_keep = int(eggs_filter_norm.rvs())
+                _shuffle(eggs, 'eggs_filter', total_time)
+                draws = crn.draws(crn.lineage('eggs_filter',
+                                              self.repetition))
+                eggs_to_keep = int(draws.variate(self.eggs_filter_norm,
+                                                 'eggs_to_keep', total_time))
                 if eggs_to_keep < 0:
                     eggs_to_keep = 0
                 elif eggs_to_keep > len(eggs):
                     eggs_to_keep = len(eggs)
-                eggs = set(eggs[:eggs_to_keep])
+                recycle(eggs[eggs_to_keep:])
+                eggs = Population(eggs[:eggs_to_keep])
 
             # save current egg status
-            latest_eggs = latest_eggs.union(deepcopy(eggs))
-            previous_eggs = previous_eggs.union(deepcopy(eggs))
+            # (the latest eggs are only counted, and can be shared)
+            self.latest_eggs = eggs
+            self.previous_eggs.extend(eggs)
 
             if len(pupae) > 0:
                 # pick 400 random new pupae to introduce
-                random.shuffle(pupae)
-                if not round(total_time, 2) % 1 and int(total_time) in special_releases:
-                    special = special_releases[int(total_time)]
+                _shuffle(pupae, 'release', total_time)
+                if not round(total_time, 2) % 1 and int(total_time) in self.special_releases:
+                    special = self.special_releases[int(total_time)]
                     release_pupae = pupae[:special]
                 else:
-                    release_pupae = pupae[:release]
-                population = population.union(release_pupae)
-                # remove eggs from nursery
-                for ep in release_pupae:
-                    eggs_nursery.remove(ep)
-                eggs_hatched = True
-
-        if ((len(report_times) == 0 and not round(total_time, 2) % 1) or
-            round(total_time, 2) in report_times):
-            if not drive_threshold_passed:
+                    release_pupae = pupae[:self.release]
+                # move them from the nursery
+                self.eggs_nursery.transfer(release_pupae, self.population)
+
+        self.output = larvae + pupae
+
+        if ((len(self.report_times) == 0 and not round(total_time, 2) % 1) or
+            round(total_time, 2) in self.report_times):
+            if not self.drive_threshold_passed:
                 # keep track of drive frequencies
-                drive_freq = get_drive_frequency(population, p)
-                if not drive_ever_released and drive_freq > 0:
-                    drive_ever_released = True
+                drive_freq = get_drive_frequency(self.population, p)
+                if not self.drive_ever_released and drive_freq > 0:
+                    self.drive_ever_released = True
+                    self.drive_observed = True
                     sys.stderr.write(f'{total_time} drive observed\n')
-                drive_frequencies.append(drive_freq)
-                drive_frequencies = drive_frequencies[-7:]
+                self.drive_frequencies.append(drive_freq)
+                self.drive_frequencies = self.drive_frequencies[-7:]
                 # if set, check if drive frequency threshold has been passed
-                if additional_releases is not None and additional_releases[3] is not None and drive_ever_released:
-                    if len([x for x in drive_frequencies
-                            if x > additional_releases[3]]) == len(drive_frequencies):
-                                drive_threshold_passed = True
+                if additional_releases is not None and additional_releases[3] is not None and self.drive_ever_released:
+                    if len([x for x in self.drive_frequencies
+                            if x > additional_releases[3]]) == len(self.drive_frequencies):
+                                self.drive_threshold_passed = True
+                                self.threshold_passed = True
                                 sys.stderr.write(f'{total_time} will start antidote releases\n')
+            return True
+        return False
+
+    def record(self):
+        '''Summarise the current state of the simulation
+
+        Returns:
+            record (dict)
+                See `get_record`, with the event flags added
+        '''
+        record = get_record(self.total_time, self.population, self.output,
+                            self.restocking, self.latest_eggs,
+                            self.repetition, self.p,
+                            observables=self.observables)
+        record['drive_observed'] = self.drive_observed
+        record['threshold_passed'] = self.threshold_passed
+        record['late_release'] = self.late_release
+        return record
+
+    def clone(self):
+        '''Independent copy of the current state of the simulation
+
+        The parameters (and thus the phenotype classes) and the eggs
+        filter are shared with the copy; all individuals are copied.
+        The copy continues with the following random numbers, and thus
+        diverges from the original, unless common random numbers
+        are used (see `large_cage.crn`)
+
+        Returns:
+            simulation (Simulation)
+                The copy
+        '''
+        memo = {id(self.p): self.p,
+                id(self.eggs_filter_norm): self.eggs_filter_norm}
+        return deepcopy(self, memo)
+
+    def __iter__(self):
+        while self.running():
+            if self.step() and (self.record_times is None or
+                                round(self.total_time, 2) in
+                                self.record_times):
+                yield self.record()
+
+
+def iter_simulation(start_populations, **kwargs):
+    '''Run a full large-cage simulation, yielding a record
+    for each report time
+
+    Args:
+        start_populations (iterable of iterables)
+            Populations to introduce, see `Simulation`
+        **kwargs
+            Further arguments, see `Simulation`
+
+    Yields:
+        record (dict)
+            See `Simulation.record`
+    '''
+    return iter(Simulation(start_populations, **kwargs))
 
-            print_status(total_time, population, larvae + pupae,
-                         restocking,
-                         latest_eggs, repetition, p)
+
+def run_simulation(start_populations,
+                   repetition=0, end_time=365,
+                   time_step=None, release=None,
+                   special_releases=None,
+                   report_times=None, release_days=None,
+                   additional_releases=None,
+                   eggs_filter=None,
+                   use_adults_if_needed=False,
+                   report=None,
+                   p=None):
+    '''Run a full large-cage simulation given a series of start populations
+
+    Args:
+        start_populations (iterable of iterables)
+            Populations to introduce, see `Simulation`
+        report (function)
+            Called at each report time, with the same arguments
+            as `print_status` (the default); if it returns True
+            the simulation is stopped
+
+    See `Simulation` for all other arguments
+    '''
+    if p is None:
+        p = params
+    if report is None:
+        report = print_status
+    sim = Simulation(start_populations,
+                     repetition=repetition, end_time=end_time,
+                     time_step=time_step, release=release,
+                     special_releases=special_releases,
+                     report_times=report_times, release_days=release_days,
+                     additional_releases=additional_releases,
+                     eggs_filter=eggs_filter,
+                     use_adults_if_needed=use_adults_if_needed,
+                     p=p)
+    while sim.running():
+        if sim.step():
+            if report(sim.total_time, sim.population, sim.output,
+                      sim.restocking,
+                      sim.latest_eggs, repetition, p):
+                break
+
+
+def _new_antidote(p, lineage=None):
+    if not p['HOM_ANTIDOTE']:
+        # het. male antidotes
+        x = Individual('m', ['W', 'W'], ['A', 'W'],
+                       parameters=p, lineage=lineage)
+    else:
+        # hom. male antidotes
+        x = Individual('m', ['W', 'W'], ['A', 'A'],
+                       parameters=p, lineage=lineage)
+    x.stage = 'adult'
+    return x
+
+
+def get_start_populations(p=None, repetition=0):
+    '''Generate the initial introductions
+
+    Args:
+        p (dict)
+            Parameters
+        repetition (int)
+            Round of simulation (keys the common random numbers)
+
+    Returns:
+        start_populations (list of Population)
+            Adults introduced at each release
+    '''
+    if p is None:
+        p = params
+    WILDS = [int(x) for x in p['RELEASE_WT']]
+    DRIVES = [int(x) for x in p['RELEASE_DRIVE']]
+    ANTIDOTES = [int(x) for x in p['RELEASE_ANTI']]
+
+    start_populations = []
+    for j, (wild, drive, anti) in enumerate(zip(WILDS, DRIVES, ANTIDOTES)):
+        population = Population()
+
+        # lineages (if common random numbers are enabled)
+        # are keyed by release and position
+        for i in range(drive):
+            # het. male drives
+            x = Individual('m', ['W', 'D'], ['W', 'W'],
+                           nucl_from_father=True,
+                           parameters=p,
+                           lineage=crn.lineage('drive', repetition, j, i))
+            x.stage = 'adult'
+            population.add(x)
+        for i in range(anti):
+            population.add(_new_antidote(p, crn.lineage('anti', repetition, j, i)))
+
+        # wild-type individuals
+        for i in range(int(wild / 2)):
+            x = Individual('f', ['W', 'W'], ['W', 'W'],
+                           parameters=p,
+                           lineage=crn.lineage('wild_f', repetition, j, i))
+            x.stage = 'adult'
+            population.add(x)
+            x = Individual('m', ['W', 'W'], ['W', 'W'],
+                           parameters=p,
+                           lineage=crn.lineage('wild_m', repetition, j, i))
+            x.stage = 'adult'
+            population.add(x)
+
+        start_populations.append(population)
+
+    return start_populations
+
+
+def get_additional_releases(p=None, repetition=0):
+    '''Generate the late (antidote) releases
+
+    Args:
+        p (dict)
+            Parameters
+        repetition (int)
+            Round of simulation (keys the common random numbers)
+
+    Returns:
+        additional_releases (tuple)
+            See `run_simulation`; None if there are no late releases
+    '''
+    if p is None:
+        p = params
+    if p['LATE_RELEASES'] is None:
+        return None
+
+    late_releases_start = p['LATE_RELEASES_START']
+    late_releases_counter = p['LATE_RELEASES']
+    late_releases_drive_frequency = p.get('LATE_RELEASES_DRIVE_FREQUENCY', None)
+    if late_releases_drive_frequency is not None:
+        if late_releases_start is not None:
+            sys.stderr.write('Using antidote release timing based on '
+                             'drive frequency, ignoring start time\n')
+            late_releases_start = None
+    late = Population()
+    if p['LATE_RELEASES_ANTI'] is not None:
+        for i in range(int(p['LATE_RELEASES_ANTI'])):
+            late.add(_new_antidote(p, crn.lineage('late_anti', repetition, i)))
+    return (late, late_releases_start,
+            late_releases_counter,
+            late_releases_drive_frequency)
+
+
+def get_simulation(p=None, repetition=0, eggs_filter=None,
+                   observables=None, record_times=None):
+    '''Set up a full simulation, with releases taken from the parameters
+
+    Args:
+        p (dict)
+            Parameters
+        repetition (int)
+            Round of simulation (useful for reporting)
+        eggs_filter (tuple)
+            Trim the eggs output, see `Simulation`
+        observables (Observables)
+            Only compute these output columns, see `Simulation`
+        record_times (iterable of float)
+            Only yield records for these days, see `Simulation`
+
+    Returns:
+        simulation (Simulation)
+            The simulation, ready to be iterated over
+    '''
+    if p is None:
+        p = params
+    return Simulation(get_start_populations(p, repetition),
+                      end_time=p['END_TIME'],
+                      repetition=repetition,
+                      report_times=None,
+                      release=p['RELEASE'],
+                      special_releases={},
+                      additional_releases=get_additional_releases(p, repetition),
+                      eggs_filter=eggs_filter,
+                      time_step=p['TIME_STEP'],
+                      release_days=p['RELEASE_DAYS'],
+                      use_adults_if_needed=p['USE_ADULTS'],
+                      observables=observables,
+                      record_times=record_times,
+                      p=p)
+
+
+def simulate(p=None, repetition=0, report=None, eggs_filter=None):
+    '''Run a full simulation, with releases taken from the parameters
+
+    Args:
+        p (dict)
+            Parameters
+        repetition (int)
+            Round of simulation (useful for reporting)
+        report (function)
+            Called at each report time, see `run_simulation`
+        eggs_filter (tuple)
+            Trim the eggs output, see `Simulation`
+    '''
+    if p is None:
+        p = params
+    if report is None:
+        report = print_status
+    sim = get_simulation(p, repetition=repetition, eggs_filter=eggs_filter)
+    while sim.running():
+        if sim.step():
+            if report(sim.total_time, sim.population, sim.output,
+                      sim.restocking,
+                      sim.latest_eggs, repetition, p):
+                break
+
+
+def set_seed(seed, common=False):
+    '''Seed all random number generators used by the simulation
+
+    Also discards the random variates already drawn in bulk
+    by the distributions, which would otherwise be shared by
+    forked processes
+
+    Args:
+        seed (int)
+            Random seed
+        common (bool)
+            Use common random numbers (see `large_cage.crn`), so that
+            scenarios run with the same seed are paired
+    '''
+    random.seed(seed)
+    np.random.seed(seed)
+    reset_buffers()
+    if common:
+        crn.enable(seed)
+    else:
+        crn.disable()
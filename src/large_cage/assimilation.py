@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import math
+import numpy as np
+from multiprocessing import Pool
+
+from large_cage.agent import set_seed
+from large_cage.agent import get_values
+from large_cage.agent import get_simulation
+from large_cage.agent import get_observables
+
+
+def eggs_loglikelihood(simulated, observed, dispersion=5.):
+    '''Log-likelihood of an observed eggs count (negative binomial)
+
+    The observed count is drawn around the simulated one, with variance
+    mu + mu^2 / dispersion; simulated counts are floored at half an egg,
+    so that an empty cage is very unlikely, but not impossible
+
+    Args:
+        simulated (numpy.array)
+            Simulated eggs, for each particle
+        observed (int)
+            Observed eggs
+        dispersion (float)
+            Size parameter of the negative binomial
+            (lower values allow a larger spread)
+
+    Returns:
+        loglik (numpy.array)
+            Log-likelihood for each particle
+    '''
+    mu = np.maximum(np.asarray(simulated, dtype=float), 0.5)
+    k = float(dispersion)
+    x = float(observed)
+    return (math.lgamma(x + k) - math.lgamma(k) - math.lgamma(x + 1) +
+            k * np.log(k / (k + mu)) + x * np.log(mu / (k + mu)))
+
+
+def get_release_time(p):
+    '''Time at which the drive is first observed in the cage
+
+    The releases follow a fixed schedule, so a single simulation is run
+    up to the first drive observation
+
+    Args:
+        p (dict)
+            Parameters
+
+    Returns:
+        time (float)
+            Day of the GD release
+
+    Raises:
+        ValueError
+            If the drive is never observed
+    '''
+    sim = get_simulation(p, observables=get_observables(['round'], p))
+    while sim.running():
+        if sim.step() and sim.drive_observed:
+            return sim.total_time
+    raise ValueError('The drive is never observed in the simulation')
+
+
+def _weighted_summary(values, weights, interval):
+    # weighted mean and central interval, ignoring undefined values
+    keep = np.isfinite(values)
+    if not keep.any():
+        return np.nan, np.nan, np.nan
+    values = values[keep]
+    weights = weights[keep]
+    order = np.argsort(values)
+    values = values[order]
+    weights = weights[order]
+    cumulative = np.cumsum(weights)
+    cumulative /= cumulative[-1]
+    low, high = [values[min(np.searchsorted(cumulative, q),
+                            values.shape[0] - 1)]
+                 for q in ((1 - interval) / 2, (1 + interval) / 2)]
+    return np.average(values, weights=weights), low, high
+
+
+def _advance(args):
+    # move simulations forward, reporting their values at given times
+    sims, times, observables, seed = args
+    if seed is not None:
+        set_seed(seed)
+    values = np.full((len(times), len(sims), len(observables.columns)),
+                     np.nan)
+    for j, sim in enumerate(sims):
+        for i, time in enumerate(times):
+            # time steps are rounded to a tenth of a day
+            while sim.running() and sim.total_time < round(time, 1):
+                sim.step()
+            values[i, j] = get_values(sim.record(), observables)
+    return sims, values
+
+
+def _silence():
+    # simulations report events on stderr
+    sys.stderr = open(os.devnull, 'w')
+
+
+class ParticleFilter():
+    '''Assimilate the observed eggs counts of a cage (sequential Monte Carlo)
+
+    Simulations of the cage (particles) are advanced together to each
+    observation day and weighted by the likelihood of the observed eggs
+    (see `eggs_loglikelihood`); once the effective sample size falls
+    below a threshold, particles are resampled (systematic resampling):
+    the states matching the observations are cloned (see
+    `large_cage.agent.Simulation.clone`), and those that have diverged
+    are dropped, rather than simulated to the end. This gives the
+    filtered state of the cage on each observation day and, by running
+    the particles further, forecasts conditioned on the observations
+
+    Example: filter cage A, then forecast up to day 300
+    >>> edf, _ = load_observed('data/actual_data_2.tsv')
+    >>> pf = ParticleFilter(p, edf['day'], edf['Cage A'], offset=126)
+    >>> filtered = pf.run()
+    >>> forecast = pf.forecast(300)
+
+    Args:
+        p (dict)
+            Parameters
+        days (iterable)
+            Observation days, relative to the GD release
+        observed (iterable)
+            Observed eggs, on each observation day
+        particles (int)
+            Number of particles
+        columns (iterable)
+            Output columns to estimate (see `large_cage.agent.get_header`);
+            eggs are always included
+        dispersion (float)
+            Dispersion of the observed eggs, see `eggs_loglikelihood`
+        offset (float)
+            Day of the GD release; if None, the first day in which
+            the drive is observed in the cage is used
+        threshold (float)
+            Resample once the effective sample size falls below this
+            fraction of the particles (1: always resample)
+        interval (float)
+            Width of the reported intervals (weighted quantiles)
+        jobs (int)
+            Number of parallel processes (particles are sent to
+            them at each observation day)
+        seed (int)
+            Random seed
+    '''
+    def __init__(self, p, days, observed, particles=100,
+                 columns=('eggs', 'drives', 'WT', 'pop'),
+                 dispersion=5., offset=None, threshold=0.5, interval=0.9,
+                 jobs=1, seed=None):
+        self.p = p
+        self.days = np.asarray(days, dtype=float)
+        self.observed = np.asarray(observed, dtype=float)
+        if self.days.shape != self.observed.shape:
+            raise ValueError('Please provide one eggs count '
+                             'for each observation day')
+        self.particles = particles
+        self.columns = ['eggs'] + [x for x in columns if x != 'eggs']
+        self.observables = get_observables(self.columns, p)
+        self.dispersion = dispersion
+        self.offset = offset
+        self.threshold = threshold
+        self.interval = interval
+        self.jobs = jobs
+        self.rng = np.random.default_rng(seed)
+
+        # current particles, their normalised log-weights
+        # and the log-likelihood of the observations so far
+        self.sims = None
+        self.logw = None
+        self.log_evidence = 0.
+
+    def _seed(self):
+        return int(self.rng.integers(0, 2 ** 32))
+
+    def _start(self):
+        set_seed(self._seed())
+        if self.offset is None:
+            self.offset = get_release_time(self.p)
+        times = self.offset + self.days
+        if (times < 0).any() or (times > self.p['END_TIME']).any():
+            raise ValueError(f'Observation days should be between '
+                             f'{-self.offset:g} and '
+                             f'{self.p["END_TIME"] - self.offset:g} '
+                             f'days from the GD release')
+        self.sims = [get_simulation(self.p, repetition=j,
+                                    observables=self.observables)
+                     for j in range(self.particles)]
+        self.logw = np.full(self.particles, -np.log(self.particles))
+        self.log_evidence = 0.
+
+    def _advance(self, times, pool=None):
+        if pool is None:
+            _, values = _advance((self.sims, times, self.observables, None))
+            return values
+        chunks = np.array_split(np.arange(self.particles), self.jobs)
+        args = [([self.sims[j] for j in chunk], times, self.observables,
+                 self._seed())
+                for chunk in chunks if chunk.shape[0] > 0]
+        sims = []
+        values = []
+        for chunk_sims, chunk_values in pool.map(_advance, args):
+            sims.extend(chunk_sims)
+            values.append(chunk_values)
+        self.sims = sims
+        return np.concatenate(values, axis=1)
+
+    def _resample(self):
+        weights = np.exp(self.logw)
+        positions = (self.rng.random() +
+                     np.arange(self.particles)) / self.particles
+        cumulative = np.cumsum(weights)
+        cumulative /= cumulative[-1]
+        chosen = np.minimum(np.searchsorted(cumulative, positions),
+                            self.particles - 1)
+        sims = []
+        used = set()
+        for j in chosen:
+            # the first copy of a particle is the particle itself
+            sims.append(self.sims[j].clone() if j in used else self.sims[j])
+            used.add(j)
+        self.sims = sims
+        self.logw = np.full(self.particles, -np.log(self.particles))
+
+    def _summary(self, values):
+        weights = np.exp(self.logw)
+        row = {}
+        for k, column in enumerate(self.columns):
+            mean, low, high = _weighted_summary(values[:, k], weights,
+                                                self.interval)
+            row[column] = mean
+            row[f'{column}.low'] = low
+            row[f'{column}.high'] = high
+        return row
+
+    def _pool(self):
+        if self.jobs > 1:
+            return Pool(self.jobs, initializer=_silence)
+        return None
+
+    def run(self):
+        '''Assimilate all observations
+
+        Returns:
+            filtered (pandas.DataFrame)
+                For each observation day: the observed eggs, the weighted
+                mean and interval of each column, the effective sample
+                size, wether particles were resampled, and the
+                log-likelihood of the observation
+        '''
+        import pandas as pd
+
+        self._start()
+        rows = []
+        pool = self._pool()
+        try:
+            for day, observed in zip(self.days, self.observed):
+                time = self.offset + day
+                values = self._advance([time], pool=pool)[0]
+                logw = self.logw + eggs_loglikelihood(values[:, 0], observed,
+                                                      self.dispersion)
+                top = logw.max()
+                loglik = top + np.log(np.exp(logw - top).sum())
+                self.log_evidence += loglik
+                self.logw = logw - loglik
+                ess = 1 / (np.exp(self.logw) ** 2).sum()
+                row = {'day': day, 'time': time, 'observed': observed}
+                row.update(self._summary(values))
+                row['ess'] = ess
+                row['resampled'] = ess < self.threshold * self.particles
+                row['loglik'] = loglik
+                rows.append(row)
+                if row['resampled']:
+                    self._resample()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return pd.DataFrame(rows)
+
+    def forecast(self, end_time=None):
+        '''Run the particles further, after the last observation
+
+        Args:
+            end_time (float)
+                Last day of the forecast (default: END_TIME)
+
+        Returns:
+            forecast (pandas.DataFrame)
+                For each day: the weighted mean and interval of each column
+        '''
+        import pandas as pd
+
+        if self.sims is None:
+            raise ValueError('Please assimilate the observations first')
+        if end_time is None or end_time > self.p['END_TIME']:
+            end_time = self.p['END_TIME']
+        start = int(np.floor(self.offset + self.days.max())) + 1
+        times = list(range(start, int(end_time) + 1))
+        pool = self._pool()
+        try:
+            values = self._advance(times, pool=pool)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        rows = []
+        for time, time_values in zip(times, values):
+            row = {'day': time - self.offset, 'time': time}
+            row.update(self._summary(time_values))
+            rows.append(row)
+        return pd.DataFrame(rows)
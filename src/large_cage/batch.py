@@ -0,0 +1,658 @@
+#!/usr/bin/env python
+
+import sys
+import numpy as np
+
+from large_cage.agent import params
+from large_cage.agent import Census
+from large_cage.agent import get_phenotype
+from large_cage.agent import get_all_genotypes
+from large_cage.distributions import get_distribution
+
+# where individuals are
+POPULATION, NURSERY, PREVIOUS_EGGS = 0, 1, 2
+
+# development stages
+EGG, LARVA, PUPA, ADULT = 0, 1, 2, 3
+
+# alleles, at either locus
+ALLELES = ['W', 'D', 'R', 'A']
+
+
+class BatchSimulation():
+    '''Many repetitions of the same scenario, simulated at once
+
+    All individuals of all repetitions are stored in a single set of
+    arrays (one column per property, plus the repetition they belong to),
+    so that aging, culling, mating, egg production and census are
+    vectorized operations across repetitions, and the per-step overhead
+    is paid once. The model is the same as `large_cage.agent.Simulation`,
+    with releases taken from the parameters as in
+    `large_cage.agent.get_simulation`; repetitions are statistically
+    equivalent to the ones of the individual-based engine, but the random
+    numbers are drawn in a different order. Common random numbers
+    are not supported.
+
+    Iterating over the simulation yields, for each report time, the list
+    of records of the repetitions that are still running
+    (see `large_cage.agent.Simulation`)
+
+    Example:
+    >>> for records in BatchSimulation(p, repetitions=50):
+            for record in records:
+                print(format_record(record))
+
+    Args:
+        p (dict)
+            Parameters
+        repetitions (int)
+            Number of repetitions (default: REPETITIONS parameter)
+        first_repetition (int)
+            Round of the first repetition (useful for reporting)
+        eggs_filter (tuple)
+            Trim the eggs output, according to a desired normal distribution
+            First element is the loc parameter, second is the scale.
+        observables (Observables)
+            Only compute these output columns, see
+            `large_cage.agent.get_observables` (default: all of them)
+        record_times (iterable of float)
+            Only yield records for these days, see
+            `large_cage.agent.Simulation`
+    '''
+    columns = {'rep': int, 'ph': int, 'loc': np.int8, 'stage': np.int8,
+               'age': float, 'time_to_hatch': float, 'time_to_pupa': float,
+               'time_to_maturation': float, 'death': float,
+               'mated': bool, 'mating': bool, 'deposing_eggs': bool,
+               'eggs': int, 'hatching': bool, 'larva': bool, 'pupa': bool}
+
+    def __init__(self, p=None, repetitions=None, first_repetition=0,
+                 eggs_filter=None, observables=None, record_times=None):
+        if p is None:
+            p = params
+        if repetitions is None:
+            repetitions = p['REPETITIONS']
+        self.p = p
+        self.repetitions = repetitions
+        self.first_repetition = first_repetition
+        self.end_time = p['END_TIME']
+        self.time_step = p['TIME_STEP']
+        self.release = p['RELEASE']
+        self.release_days = p['RELEASE_DAYS']
+        self.use_adults_if_needed = p['USE_ADULTS']
+        self.observables = observables
+        self.record_times = None
+        if record_times is not None:
+            self.record_times = {round(float(x), 2) for x in record_times}
+            self.end_time = min(self.end_time, max(self.record_times,
+                                                   default=-1))
+        self.eggs_filter_norm = None
+        if eggs_filter is not None:
+            self.eggs_filter_norm = get_distribution({'loc': eggs_filter[0],
+                                                      'scale': eggs_filter[1]})
+
+        # phenotype classes, indexed by their position
+        self.phenotypes = []
+        self._codes = {}
+        self._tables = {}
+        self.genotypes = list(get_all_genotypes(p))
+        self._genotype_index = {gt: i for i, gt in enumerate(self.genotypes)}
+
+        self.total_time = -self.time_step
+        self.state = self._empty()
+        # eggs produced at the latest release day (repetition, phenotype)
+        self.latest_eggs = (np.zeros(0, dtype=int), np.zeros(0, dtype=int))
+
+        R = repetitions
+        self.active = np.ones(R, dtype=bool)
+        self.restocking = False
+        self.output = None
+
+        # initial introductions, first one is the content of the cage
+        self.start_populations = self._start_populations()[::-1]
+        self._append(self.start_populations.pop())
+
+        # additional (antidote) releases
+        self.additional_releases = None
+        if p['LATE_RELEASES'] is not None:
+            start = p['LATE_RELEASES_START']
+            frequency = p.get('LATE_RELEASES_DRIVE_FREQUENCY', None)
+            if frequency is not None and start is not None:
+                sys.stderr.write('Using antidote release timing based on '
+                                 'drive frequency, ignoring start time\n')
+                start = None
+            late = self._antidotes(0 if p['LATE_RELEASES_ANTI'] is None
+                                   else int(p['LATE_RELEASES_ANTI']))
+            self.additional_releases = (late, start,
+                                        p['LATE_RELEASES'], frequency)
+        self.additional_releases_counter = np.zeros(R, dtype=int)
+
+        # keep track of drive frequencies
+        self.drive_frequencies = [[] for _ in range(R)]
+        self.drive_ever_released = np.zeros(R, dtype=bool)
+        self.drive_threshold_passed = np.zeros(R, dtype=bool)
+
+        # events at the current time step
+        self.drive_observed = np.zeros(R, dtype=bool)
+        self.threshold_passed = np.zeros(R, dtype=bool)
+        self.late_release = np.zeros(R, dtype=bool)
+
+    # individuals' storage
+
+    def _empty(self):
+        return {k: np.zeros(0, dtype=t) for k, t in self.columns.items()}
+
+    def _append(self, new):
+        for k in self.columns:
+            self.state[k] = np.concatenate([self.state[k], new[k]])
+
+    def _keep(self, mask):
+        for k in self.columns:
+            self.state[k] = self.state[k][mask]
+
+    def _take(self, idx, state=None):
+        if state is None:
+            state = self.state
+        return {k: state[k][idx] for k in self.columns}
+
+    # phenotype classes
+
+    def _phenotype(self, sex, genotype1, genotype2,
+                   nucl_from_father=False, nucl_from_mother=False):
+        key = (sex, frozenset(genotype1), frozenset(genotype2),
+               nucl_from_father, nucl_from_mother)
+        i = self._codes.get(key)
+        if i is None:
+            i = self._codes[key] = len(self.phenotypes)
+            self.phenotypes.append(get_phenotype(sex, genotype1, genotype2,
+                                                 nucl_from_father,
+                                                 nucl_from_mother,
+                                                 p=self.p))
+            self._tables = {}
+        return i
+
+    def _table(self, attr):
+        '''Property of all phenotype classes, as an array'''
+        table = self._tables.get(attr)
+        if table is None:
+            if attr == 'female':
+                values = [ph.sex == 'f' for ph in self.phenotypes]
+            elif attr == 'genotype_index':
+                values = [self._genotype_index.get(ph.genotype, -1)
+                          for ph in self.phenotypes]
+            else:
+                values = [getattr(ph, attr) for ph in self.phenotypes]
+            table = self._tables[attr] = np.array(values)
+        return table
+
+    def _decode(self, sex, fg1, mg1, fg2, mg2, from_father, from_mother):
+        # phenotype of each new egg, resolving each combination once
+        code = (((((sex * 4 + fg1) * 4 + mg1) * 4 + fg2) * 4 + mg2) * 2 +
+                from_father) * 2 + from_mother
+        codes, inverse = np.unique(code, return_inverse=True)
+        ids = np.empty(codes.shape[0], dtype=int)
+        for j, c in enumerate(codes):
+            c, m = divmod(int(c), 2)
+            c, f = divmod(c, 2)
+            c, g22 = divmod(c, 4)
+            c, g21 = divmod(c, 4)
+            c, g12 = divmod(c, 4)
+            s, g11 = divmod(c, 4)
+            ids[j] = self._phenotype('m' if s else 'f',
+                                     (ALLELES[g11], ALLELES[g12]),
+                                     (ALLELES[g21], ALLELES[g22]),
+                                     bool(f), bool(m))
+        return ids[inverse.reshape(-1)]
+
+    # new individuals
+
+    def _new(self, rep, ph, hatching_mod=None, loc=POPULATION):
+        '''Draw the properties of new individuals (eggs)'''
+        p = self.p
+        n = rep.shape[0]
+        new = self._empty()
+        new['rep'] = rep
+        new['ph'] = ph
+        new['loc'] = np.full(n, loc, dtype=np.int8)
+        new['stage'] = np.full(n, EGG, dtype=np.int8)
+        new['age'] = np.zeros(n)
+        if hatching_mod is None:
+            hatching_mod = np.ones(n)
+        for k, key in (('time_to_hatch', 'TIME_TO_HATCH'),
+                       ('time_to_pupa', 'TIME_TO_PUPA'),
+                       ('time_to_maturation', 'TIME_TO_MATURATION')):
+            new[k] = np.random.uniform(p[key][0], p[key][1], size=n)
+        new['mated'] = np.zeros(n, dtype=bool)
+        for k in ('death', 'eggs', 'mating', 'deposing_eggs',
+                  'hatching', 'larva', 'pupa'):
+            new[k] = np.zeros(n, dtype=self.columns[k])
+        for i in np.unique(ph):
+            idx = np.flatnonzero(ph == i)
+            k = idx.shape[0]
+            phenotype = self.phenotypes[i]
+            new['death'][idx] = phenotype.death.rvs(k)
+            if phenotype.intersex is not None:
+                intersex = np.random.random(k) <= phenotype.intersex.rvs(k)
+            else:
+                intersex = np.zeros(k, dtype=bool)
+            if phenotype.can_mate:
+                new['mating'][idx] = ((np.random.random(k) <
+                                       phenotype.mating_probability) &
+                                      ~intersex)
+            if phenotype.sex == 'f':
+                new['deposing_eggs'][idx] = (np.random.random(k) <=
+                                             p['EGG_DEPOSITION_PROBABILITY'] *
+                                             phenotype.deposition_mod)
+            if phenotype.eggs is not None:
+                eggs = np.trunc(phenotype.eggs.rvs(k))
+                if phenotype.antidrive_effect is not None:
+                    eggs = np.round(eggs * phenotype.antidrive_effect)
+                new['eggs'][idx] = eggs
+            hatching = phenotype.hatching.rvs(k) * hatching_mod[idx]
+            new['hatching'][idx] = np.random.random(k) < hatching
+            new['larva'][idx] = ~(np.random.random(k) <
+                                  phenotype.larval.rvs(k))
+            new['pupa'][idx] = ~(np.random.random(k) <
+                                 phenotype.pupal.rvs(k))
+        return new
+
+    def _adults(self, counts, sex, genotype1, genotype2,
+                nucl_from_father=False):
+        # same number of adults for each repetition
+        rep = np.repeat(np.arange(self.repetitions), counts)
+        ph = np.full(rep.shape[0],
+                     self._phenotype(sex, genotype1, genotype2,
+                                     nucl_from_father))
+        new = self._new(rep, ph)
+        new['stage'][:] = ADULT
+        return new
+
+    def _antidotes(self, n):
+        if not self.p['HOM_ANTIDOTE']:
+            return self._adults(n, 'm', ['W', 'W'], ['A', 'W'])
+        return self._adults(n, 'm', ['W', 'W'], ['A', 'A'])
+
+    def _start_populations(self):
+        p = self.p
+        start_populations = []
+        for wild, drive, anti in zip(p['RELEASE_WT'], p['RELEASE_DRIVE'],
+                                     p['RELEASE_ANTI']):
+            parts = [self._adults(int(drive), 'm', ['W', 'D'], ['W', 'W'],
+                                  nucl_from_father=True),
+                     self._antidotes(int(anti)),
+                     self._adults(int(int(wild) / 2), 'f',
+                                  ['W', 'W'], ['W', 'W']),
+                     self._adults(int(int(wild) / 2), 'm',
+                                  ['W', 'W'], ['W', 'W'])]
+            start_populations.append({k: np.concatenate([x[k] for x in parts])
+                                      for k in self.columns})
+        return start_populations
+
+    # vectorized model
+
+    def _counts(self, mask=None, rep=None, ph=None):
+        '''Counts by repetition and phenotype class'''
+        if rep is None:
+            rep = self.state['rep'][mask]
+            ph = self.state['ph'][mask]
+        n = len(self.phenotypes)
+        return np.bincount(rep * n + ph,
+                           minlength=self.repetitions * n
+                           ).reshape(self.repetitions, n)
+
+    def _rank(self, rep):
+        '''Random order within each repetition
+
+        Returns:
+            order (numpy.array)
+                Indices, sorted by repetition and random key
+            rank (numpy.array)
+                Position within the repetition of each sorted index
+        '''
+        order = np.lexsort((np.random.random(rep.shape[0]), rep))
+        sorted_rep = rep[order]
+        starts = np.searchsorted(sorted_rep, np.arange(self.repetitions))
+        rank = np.arange(order.shape[0]) - starts[sorted_rep]
+        return order, rank
+
+    def _age(self):
+        S = self.state
+        S['age'] += self.time_step
+        stage = S['stage']
+        hatch = (stage == EGG) & S['hatching'] & (S['age'] >= S['time_to_hatch'])
+        pupate = (stage == LARVA) & S['larva'] & (S['age'] >= S['time_to_pupa'])
+        mature = (stage == PUPA) & S['pupa'] & (S['age'] >= S['time_to_maturation'])
+        stage[hatch] = LARVA
+        stage[pupate] = PUPA
+        stage[mature] = ADULT
+        S['age'][mature] = 0
+        dead = (((stage == ADULT) & (S['age'] > S['death'])) |
+                ((stage == EGG) & ~S['hatching']) |
+                ((stage == LARVA) & ~S['larva']) |
+                ((stage == PUPA) & ~S['pupa']))
+        if dead.any():
+            self._keep(~dead)
+
+    def _gametes1(self, ph):
+        p = self.p
+        gametes = np.empty(ph.shape[0], dtype=int)
+        for i in np.unique(ph):
+            idx = np.flatnonzero(ph == i)
+            k = idx.shape[0]
+            phenotype = self.phenotypes[i]
+            a = [ALLELES.index(x) for x in phenotype.alleles1]
+            if phenotype.hom1:
+                gametes[idx] = a[0]
+            elif not phenotype.drive:
+                gametes[idx] = np.where(np.random.random(k) < 0.5, a[0], a[1])
+            else:
+                drive = ALLELES.index(p['DRIVE'])
+                other = ALLELES.index(phenotype.other1)
+                if phenotype.anti_drive:
+                    gametes[idx] = np.where(np.random.random(k) <=
+                                            1 - phenotype.drive_efficiency_mod,
+                                            drive, other)
+                    continue
+                homing = (np.random.random(k) <=
+                          phenotype.drive_efficiency.rvs(k))
+                resistance = (np.random.random(k) <
+                              phenotype.resistance_efficiency)
+                gametes[idx] = np.where(homing, drive,
+                                        np.where(resistance,
+                                                 ALLELES.index(p['RESISTANCE']),
+                                                 other))
+        return gametes
+
+    def _gametes2(self, ph):
+        p = self.p
+        gametes = np.empty(ph.shape[0], dtype=int)
+        for i in np.unique(ph):
+            idx = np.flatnonzero(ph == i)
+            k = idx.shape[0]
+            phenotype = self.phenotypes[i]
+            a = [ALLELES.index(x) for x in phenotype.alleles2]
+            if phenotype.hom2:
+                gametes[idx] = a[0]
+            elif phenotype.anti_drive:
+                gametes[idx] = np.where(np.random.random(k) <=
+                                        phenotype.antidote_inheritance,
+                                        ALLELES.index(p['ANTI_DRIVE']),
+                                        ALLELES.index(phenotype.other2))
+            else:
+                gametes[idx] = np.where(np.random.random(k) < 0.5, a[0], a[1])
+        return gametes
+
+    def _mate(self):
+        '''Mate all adults that can mate, in all repetitions
+
+        Returns:
+            eggs (dict)
+                New individuals (eggs), as columns
+        '''
+        p = self.p
+        S = self.state
+        female = self._table('female')[S['ph']]
+        candidates = (S['loc'] == POPULATION) & (S['stage'] == ADULT) & S['mating']
+        males = candidates & ~female
+        females = candidates & female
+        if not p['MULTIPLE_MATING_MALE']:
+            males &= ~S['mated']
+        if not p['MULTIPLE_MATING_FEMALE']:
+            females &= ~S['mated']
+        males = np.flatnonzero(males)
+        females = np.flatnonzero(females)
+
+        # random pairs within each repetition
+        pairs = np.minimum(np.bincount(S['rep'][males],
+                                       minlength=self.repetitions),
+                           np.bincount(S['rep'][females],
+                                       minlength=self.repetitions))
+        order, rank = self._rank(S['rep'][males])
+        males = males[order][rank < pairs[S['rep'][males[order]]]]
+        order, rank = self._rank(S['rep'][females])
+        females = females[order][rank < pairs[S['rep'][females[order]]]]
+
+        if not p['MULTIPLE_MATING_FEMALE']:
+            S['mated'][females] = True
+        if not p['MULTIPLE_MATING_MALE']:
+            S['mated'][males] = True
+
+        phm = S['ph'][males]
+        phf = S['ph'][females]
+        deposition_mod = (self._table('deposition_mod')[phm] *
+                          self._table('deposition_mod')[phf])
+        egg_mod = self._table('egg_mod')[phm] * self._table('egg_mod')[phf]
+        hatching_mod = (self._table('hatching_mod')[phm] *
+                        self._table('hatching_mod')[phf])
+        deposing = (np.random.random(females.shape[0]) <=
+                    p['EGG_DEPOSITION_PROBABILITY'] * deposition_mod)
+        # the eggs drawn for a female can be negative, i.e. none
+        actual_eggs = np.where(deposing,
+                               np.maximum(np.round(S['eggs'][females] *
+                                                   egg_mod), 0), 0
+                               ).astype(int)
+
+        # one row per egg
+        pair = np.repeat(np.arange(females.shape[0]), actual_eggs)
+        phm = phm[pair]
+        phf = phf[pair]
+        drive = self._table('drive')
+        sex = (np.random.random(pair.shape[0]) < 0.5).astype(int)
+        ph = self._decode(sex,
+                          self._gametes1(phf), self._gametes1(phm),
+                          self._gametes2(phf), self._gametes2(phm),
+                          drive[phm].astype(int), drive[phf].astype(int))
+        return self._new(S['rep'][females][pair], ph,
+                         hatching_mod=hatching_mod[pair],
+                         loc=PREVIOUS_EGGS)
+
+    def _filter_eggs(self, eggs):
+        counts = np.bincount(eggs['rep'], minlength=self.repetitions)
+        keep = np.trunc(self.eggs_filter_norm.rvs(self.repetitions)).astype(int)
+        keep = np.clip(keep, 0, counts)
+        order, rank = self._rank(eggs['rep'])
+        return self._take(order[rank < keep[eggs['rep'][order]]], eggs)
+
+    def _drive_frequency(self):
+        S = self.state
+        population = S['loc'] == POPULATION
+        pop = np.bincount(S['rep'][population], minlength=self.repetitions)
+        drives = np.bincount(S['rep'][population & self._table('drive')[S['ph']]],
+                             minlength=self.repetitions)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(pop > 0, drives / np.maximum(pop, 1), np.nan)
+
+    def running(self):
+        '''Can the simulation move forward?
+
+        Returns:
+            running (bool)
+                False if all populations are extinct or the end
+                time has been reached
+        '''
+        return self.active.any() and self.total_time < self.end_time
+
+    def step(self):
+        '''Move all repetitions forward by one time step
+
+        Returns:
+            report (bool)
+                Wether this is a report time
+        '''
+        S = self.state
+        additional_releases = self.additional_releases
+
+        # repetitions with an extinct population are over
+        population = S['loc'] == POPULATION
+        self.active &= np.bincount(S['rep'][population],
+                                   minlength=self.repetitions) > 0
+        alive = self.active[S['rep']]
+        if not alive.all():
+            self._keep(alive)
+        latest_rep, latest_ph = self.latest_eggs
+        alive = self.active[latest_rep]
+        self.latest_eggs = (latest_rep[alive], latest_ph[alive])
+
+        self.restocking = False
+        self.drive_observed[:] = False
+        self.threshold_passed[:] = False
+        self.late_release[:] = False
+        self.total_time += self.time_step
+        self.total_time = round(self.total_time, 1)
+        total_time = self.total_time
+
+        # age (population, egg nursery and previous egg batch)
+        self._age()
+        S = self.state
+
+        # day of the week
+        day = round(total_time, 1) % 7
+
+        #  Select the larvae from previous harvests
+        nursery = S['loc'] == NURSERY
+        larvae = nursery & (S['stage'] == LARVA)
+        pupae = nursery & (S['stage'] == PUPA)
+        if self.use_adults_if_needed:
+            # could happen if there is a single release day
+            no_pupae = np.bincount(S['rep'][pupae],
+                                   minlength=self.repetitions) == 0
+            pupae |= nursery & (S['stage'] == ADULT) & no_pupae[S['rep']]
+        self.output = (S['rep'][larvae | pupae], S['ph'][larvae | pupae])
+        pupae = np.flatnonzero(pupae)
+
+        # feeding/harvesting/release day
+        if day % 1 == 0 and int(day) in self.release_days:
+            self.restocking = True
+            # collect the previous round of eggs
+            S['loc'][S['loc'] == PREVIOUS_EGGS] = NURSERY
+
+            # add further start populations
+            if len(self.start_populations) > 0 and total_time > 1:
+                new = self.start_populations.pop()
+                self._append(self._take(self.active[new['rep']], new))
+
+            # additional releases (to be done before mating)
+            if additional_releases is not None:
+                late, start, releases, frequency = additional_releases
+                if frequency is None:
+                    release = np.full(self.repetitions, total_time >= start)
+                else:
+                    release = self.drive_threshold_passed.copy()
+                release &= self.active
+                self.additional_releases_counter[release] += 1
+                if releases != -1:
+                    release &= self.additional_releases_counter <= releases
+                self.late_release[:] = release
+                if release.any():
+                    self._append(self._take(release[late['rep']], late))
+
+            # mate adults (we are after feeding)
+            eggs = self._mate()
+            # trim eggs if parameter is set
+            if self.eggs_filter_norm is not None:
+                eggs = self._filter_eggs(eggs)
+            self.latest_eggs = (eggs['rep'], eggs['ph'])
+            self._append(eggs)
+
+            if pupae.shape[0] > 0:
+                # pick random new pupae to introduce
+                # (rows have only been appended since they were selected)
+                S = self.state
+                order, rank = self._rank(S['rep'][pupae])
+                released = pupae[order][rank < self.release]
+                S['loc'][released] = POPULATION
+
+        if not round(total_time, 2) % 1:
+            drive_freq = self._drive_frequency()
+            for r in np.flatnonzero(self.active & ~self.drive_threshold_passed):
+                # keep track of drive frequencies
+                if not self.drive_ever_released[r] and drive_freq[r] > 0:
+                    self.drive_ever_released[r] = True
+                    self.drive_observed[r] = True
+                    sys.stderr.write(f'{total_time} drive observed\n')
+                frequencies = self.drive_frequencies[r]
+                frequencies.append(drive_freq[r])
+                del frequencies[:-7]
+                # if set, check if drive frequency threshold has been passed
+                if (additional_releases is not None and
+                        additional_releases[3] is not None and
+                        self.drive_ever_released[r]):
+                    if all(x > additional_releases[3] for x in frequencies):
+                        self.drive_threshold_passed[r] = True
+                        self.threshold_passed[r] = True
+                        sys.stderr.write(f'{total_time} will start '
+                                         'antidote releases\n')
+            return True
+        return False
+
+    def _census(self, counts):
+        # one census per repetition
+        table = {attr: self._table(attr).astype(int)
+                 for attr in ('female', 'wild_type', 'transgenic',
+                              'drive', 'anti_drive', 'resistance')}
+        genotypes = np.zeros((len(self.phenotypes), len(self.genotypes)),
+                             dtype=int)
+        index = self._table('genotype_index')
+        known = np.flatnonzero(index >= 0)
+        genotypes[known, index[known]] = 1
+        values = [counts.sum(axis=1)]
+        for attr in ('female', 'wild_type', 'transgenic',
+                     'drive', 'anti_drive', 'resistance'):
+            values.append(counts @ table[attr])
+        values.append(counts @ genotypes)
+        return [Census(*[int(x[r]) for x in values[:-1]], values[-1][r])
+                for r in range(self.repetitions)]
+
+    def records(self):
+        '''Summarise the current state of all running repetitions
+
+        Returns:
+            records (list)
+                One record for each running repetition,
+                see `large_cage.agent.Simulation.record`
+        '''
+        S = self.state
+        if self.observables is None:
+            censuses = ('population', 'fitness', 'eggs', 'output')
+        else:
+            censuses = self.observables.censuses
+        population = S['loc'] == POPULATION
+        if 'fitness' in censuses:
+            female = self._table('female')[S['ph']]
+            fertile = np.bincount(S['rep'][population & female &
+                                           S['mating'] & S['deposing_eggs']],
+                                  minlength=self.repetitions)
+        populations = eggs = outputs = [None] * self.repetitions
+        if 'population' in censuses:
+            populations = self._census(self._counts(population))
+        if 'eggs' in censuses:
+            eggs = self._census(self._counts(rep=self.latest_eggs[0],
+                                             ph=self.latest_eggs[1]))
+        if 'output' in censuses:
+            outputs = self._census(self._counts(rep=self.output[0],
+                                                ph=self.output[1]))
+        records = []
+        for r in np.flatnonzero(self.active):
+            fitness = np.nan
+            if 'fitness' in censuses and populations[r].females > 0:
+                fitness = fertile[r] / populations[r].females
+            record = {'round': self.first_repetition + int(r),
+                      'time': self.total_time,
+                      'initial_release': self.restocking,
+                      'fitness': fitness,
+                      'population': populations[r],
+                      'eggs': eggs[r],
+                      'output': outputs[r],
+                      'drive_observed': bool(self.drive_observed[r]),
+                      'threshold_passed': bool(self.threshold_passed[r]),
+                      'late_release': bool(self.late_release[r])}
+            if self.observables is not None:
+                record['observables'] = self.observables
+            records.append(record)
+        return records
+
+    def __iter__(self):
+        while self.running():
+            if self.step() and (self.record_times is None or
+                                round(self.total_time, 2) in
+                                self.record_times):
+                yield self.records()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+
+import large_cage
+
+
+def get_key(p, seed, common=False, engine='agent'):
+    '''Content-addressed key for a simulation run
+
+    The key is a hash of the fully resolved parameters, the
+    random seed (and how it is used) and the version of the simulation
+    engine (which should be increased whenever the output would change)
+
+    Args:
+        p (dict)
+            Resolved parameters
+        seed (int)
+            Random seed
+        common (bool)
+            Wether common random numbers are used
+        engine (str)
+            Simulation engine ("agent" or "batch")
+
+    Returns:
+        key (str)
+            Hexadecimal digest
+    '''
+    content = json.dumps({'parameters': p,
+                          'seed': seed,
+                          'common': common,
+                          'engine': engine,
+                          'version': large_cage.__version__},
+                         sort_keys=True, default=repr)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultCache():
+    '''Local cache of simulation outputs, on disk
+
+    Each output is stored compressed under its key (see `get_key`);
+    once the cache exceeds its maximum size, the least recently
+    used outputs are removed. Outputs are written atomically, so
+    that the cache can be shared by concurrent jobs
+
+    Args:
+        path (str)
+            Cache directory (created if needed)
+        max_size (int)
+            Maximum size of the cache, in bytes
+    '''
+    def __init__(self, path, max_size=2 ** 30):
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def _fname(self, key):
+        return os.path.join(self.path, key[:2], f'{key}.tsv.gz')
+
+    def get(self, key):
+        '''Retrieve an output
+
+        Args:
+            key (str)
+                Output key
+
+        Returns:
+            output (str)
+                The cached output, None if missing
+        '''
+        fname = self._fname(key)
+        try:
+            with gzip.open(fname, 'rt') as f:
+                output = f.read()
+        except (FileNotFoundError, EOFError, OSError):
+            return None
+        # mark as recently used
+        try:
+            os.utime(fname)
+        except FileNotFoundError:
+            pass
+        return output
+
+    def put(self, key, output):
+        '''Store an output, evicting old ones if needed
+
+        Args:
+            key (str)
+                Output key
+            output (str)
+                Simulation output
+        '''
+        fname = self._fname(key)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fname),
+                                   suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                f.write(output)
+            os.replace(tmp, fname)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        '''All cached outputs
+
+        Returns:
+            entries (list)
+                (last used, size, path) of each output
+        '''
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                if not f.endswith('.tsv.gz'):
+                    continue
+                fname = os.path.join(root, f)
+                try:
+                    stat = os.stat(fname)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, fname))
+        return entries
+
+    def evict(self):
+        '''Remove the least recently used outputs above the size limit
+
+        Returns:
+            removed (int)
+                Number of outputs removed
+        '''
+        entries = sorted(self.entries())
+        size = sum(x[1] for x in entries)
+        removed = 0
+        for _, fsize, fname in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(fname)
+            except FileNotFoundError:
+                pass
+            size -= fsize
+            removed += 1
+        return removed
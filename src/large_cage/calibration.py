@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import numpy as np
+from multiprocessing import Pool
+
+from large_cage.agent import set_seed
+from large_cage.agent import simulate
+from large_cage.agent import get_drive_frequency
+from large_cage.parameters import check_parameters
+from large_cage.parameters import resolve_parameters
+
+
+def load_observed(fname):
+    '''Load the observed eggs counts
+
+    Args:
+        fname (str)
+            Path to the empirical data (tsv format)
+
+    Returns:
+        edf (pandas.DataFrame)
+            Eggs for each cage, with days relative to the GD release
+        data (numpy.array)
+            Eggs for both cages, concatenated
+    '''
+    import pandas as pd
+
+    edf = pd.read_csv(fname, sep='\t')
+
+    edf = edf.iloc[1:].copy()
+    edf = edf.rename(columns={'Unnamed: 1': 'day',
+                              'Eggs': 'Cage A',
+                              'Unnamed: 3': 'Cage B'})
+    edf = edf[['day', 'Cage A', 'Cage B']].astype(int)
+    # TODO: fix this
+    # clip last time point, simulations did not include it
+    edf = edf[edf['day'] <= 0].copy()
+    data = np.concatenate([edf['Cage A'].values,
+                           edf['Cage B'].values])
+    return edf, data
+
+
+class EggsDistance():
+    '''Distance between simulated and observed eggs counts
+
+    To be used as the report function of `run_simulation`;
+    the distance is 1 - R^2 of the simulated eggs against the eggs
+    observed in all cages (as in `check_parameters.py`).
+    The squared errors can only increase as more observation days are
+    reached, so the simulation is stopped as soon as the distance
+    exceeds the tolerance, or once all observation days are reached
+
+    Args:
+        days (iterable)
+            Observation days, relative to the GD release
+        observed (numpy.array)
+            Observed eggs, one column per cage
+        tolerance (float)
+            Stop the simulation once this distance is exceeded
+        offset (int)
+            Day of the GD release; if None, the first day in which
+            the drive is observed in the cage is used
+    '''
+    def __init__(self, days, observed, tolerance=np.inf, offset=None):
+        self.days = np.asarray(days, dtype=int)
+        self.observed = np.asarray(observed, dtype=float).reshape(self.days.shape[0], -1)
+        self.tolerance = tolerance
+        self.offset = offset
+        self.sst = ((self.observed - self.observed.mean()) ** 2).sum()
+        self.eggs = {}
+        self.sse = 0.
+        self.scored = 0
+        self.stopped = False
+
+    def __call__(self, time, population, output,
+                 initial_population, eggs, repetition, p):
+        if time % 1:
+            return False
+        time = int(time)
+        self.eggs[time] = len(eggs)
+        if self.offset is None:
+            if get_drive_frequency(population, p) > 0:
+                self.offset = time
+            else:
+                return False
+
+        # score all observation days reached so far
+        while self.scored < self.days.shape[0]:
+            day = self.days[self.scored] + self.offset
+            if day > time:
+                break
+            # days not simulated cannot be scored
+            simulated = self.eggs.get(day, np.nan)
+            self.sse += ((self.observed[self.scored] - simulated) ** 2).sum()
+            self.scored += 1
+
+        if not self.sse <= self.tolerance * self.sst:
+            self.stopped = True
+            return True
+        return self.scored == self.days.shape[0]
+
+    def distance(self):
+        '''Distance for the simulated eggs
+
+        Returns:
+            distance (float)
+                1 - R^2; infinite if not all observation days
+                could be simulated
+        '''
+        if self.scored < self.days.shape[0] and not self.stopped:
+            return np.inf
+        if np.isnan(self.sse):
+            return np.inf
+        return self.sse / self.sst
+
+
+def _evaluate(args):
+    p, days, observed, tolerance, offset, repeats, seed = args
+    set_seed(seed)
+    # the mean exceeds the tolerance once the sum of the distances
+    # exceeds repeats * tolerance: each repetition is stopped
+    # as soon as it uses up what is left of that budget
+    budget = repeats * tolerance
+    total = 0.
+    for j in range(repeats):
+        d = EggsDistance(days, observed, tolerance=budget - total,
+                         offset=offset)
+        simulate(p, repetition=j, report=d)
+        if d.stopped:
+            # the distance of a stopped repetition is only a lower bound
+            return np.inf
+        total += d.distance()
+    return total / repeats
+
+
+def _silence():
+    # simulations report events on stderr
+    sys.stderr = open(os.devnull, 'w')
+
+
+class ABCSMC():
+    '''Approximate Bayesian computation (sequential Monte Carlo)
+
+    Particles are perturbed with a multivariate normal kernel
+    (covariance twice the weighted covariance of the previous population)
+    and the tolerance of each population is a quantile of the distances
+    of the previous one. Particles are evaluated in parallel, and each
+    simulation is stopped (and the particle rejected) as soon as the
+    mean distance of its repetitions is bound to exceed the tolerance.
+
+    Args:
+        p (dict)
+            Base parameters
+        priors (dict)
+            Parameter name (or dot-separated path) -> (low, high)
+            of its uniform prior
+        days (iterable)
+            Observation days, relative to the GD release
+        observed (numpy.array)
+            Observed eggs, one column per cage
+        particles (int)
+            Population size
+        quantile (float)
+            Quantile of the previous distances used as tolerance
+        offset (int)
+            Day of the GD release, see `EggsDistance`
+        repeats (int)
+            Simulations averaged for each particle
+        jobs (int)
+            Number of parallel processes
+        seed (int)
+            Random seed
+    '''
+    def __init__(self, p, priors, days, observed,
+                 particles=100, quantile=0.5, offset=None,
+                 repeats=1, jobs=1, seed=None):
+        self.p = p
+        self.names = list(priors)
+        self.lows = np.array([priors[k][0] for k in self.names], dtype=float)
+        self.highs = np.array([priors[k][1] for k in self.names], dtype=float)
+        self.days = days
+        self.observed = observed
+        self.particles = particles
+        self.quantile = quantile
+        self.offset = offset
+        self.repeats = repeats
+        self.jobs = jobs
+        self.rng = np.random.default_rng(seed)
+
+        # current population
+        self.theta = None
+        self.weights = None
+        self.distances = None
+        self.tolerance = np.inf
+        self.generation = -1
+        self.history = []
+
+    def _parameters(self, theta):
+        p = resolve_parameters(dict(zip(self.names,
+                                        [float(x) for x in theta])),
+                               p=self.p)
+        check_parameters(p)
+        return p
+
+    def _propose(self, n):
+        if self.theta is None:
+            return self.rng.uniform(self.lows, self.highs,
+                                    size=(n, len(self.names)))
+        cov = 2 * np.atleast_2d(np.cov(self.theta.T, aweights=self.weights))
+        proposals = []
+        while len(proposals) < n:
+            i = self.rng.choice(self.theta.shape[0], p=self.weights)
+            theta = self.rng.multivariate_normal(self.theta[i], cov)
+            # outside of the prior
+            if (theta < self.lows).any() or (theta > self.highs).any():
+                continue
+            proposals.append(theta)
+        return np.array(proposals)
+
+    def _weights(self, theta):
+        if self.theta is None:
+            return np.ones(theta.shape[0]) / theta.shape[0]
+        # uniform priors: only the kernel density matters
+        cov = 2 * np.atleast_2d(np.cov(self.theta.T, aweights=self.weights))
+        inv = np.linalg.pinv(cov)
+        diff = theta[:, np.newaxis, :] - self.theta[np.newaxis, :, :]
+        kernel = np.exp(-0.5 * np.einsum('ijk,kl,ijl->ij', diff, inv, diff))
+        weights = 1 / (kernel * self.weights[np.newaxis, :]).sum(axis=1)
+        return weights / weights.sum()
+
+    def step(self, pool, max_evaluations=None):
+        '''Generate the next population
+
+        Args:
+            pool (multiprocessing.Pool)
+                Pool used to evaluate particles
+            max_evaluations (int)
+                Give up after evaluating this many particles, keeping
+                the current population (default: no limit)
+
+        Returns:
+            acceptance (float)
+                Proportion of accepted particles
+        '''
+        tolerance = self.tolerance
+        if self.distances is not None:
+            tolerance = np.quantile(self.distances, self.quantile)
+
+        accepted = []
+        distances = []
+        evaluated = 0
+        while len(accepted) < self.particles:
+            if max_evaluations is not None and evaluated >= max_evaluations:
+                return len(accepted) / evaluated
+            n = max(self.jobs, self.particles - len(accepted))
+            proposals = self._propose(n)
+            seeds = self.rng.integers(0, 2 ** 32, size=n)
+            args = [(self._parameters(theta), self.days, self.observed,
+                     tolerance, self.offset, self.repeats, int(seed))
+                    for theta, seed in zip(proposals, seeds)]
+            for theta, d in zip(proposals,
+                                pool.imap(_evaluate, args)):
+                evaluated += 1
+                if np.isfinite(d) and d <= tolerance:
+                    accepted.append(theta)
+                    distances.append(d)
+
+        self.generation += 1
+        self.tolerance = tolerance
+        theta = np.array(accepted[:self.particles])
+        self.weights = self._weights(theta)
+        self.theta = theta
+        self.distances = np.array(distances[:self.particles])
+        self.history.append(self.posterior())
+        return self.particles / evaluated
+
+    def run(self, generations=5, min_acceptance=0.01):
+        '''Run the calibration
+
+        Args:
+            generations (int)
+                Maximum number of populations
+            min_acceptance (float)
+                Stop when the acceptance rate falls below this value;
+                a population needing more than particles / min_acceptance
+                evaluations is not completed
+
+        Returns:
+            posterior (pandas.DataFrame)
+                Posterior sample (with weights and distances)
+
+        Raises:
+            ValueError
+                If not even the first population could be completed
+        '''
+        max_evaluations = None
+        if min_acceptance > 0:
+            max_evaluations = int(np.ceil(self.particles / min_acceptance))
+        with Pool(self.jobs, initializer=_silence) as pool:
+            for generation in range(generations):
+                acceptance = self.step(pool, max_evaluations)
+                sys.stderr.write(f'generation {generation}: '
+                                 f'tolerance {self.tolerance:.5f}, '
+                                 f'acceptance {acceptance:.3f}\n')
+                if acceptance < min_acceptance:
+                    break
+        if self.theta is None:
+            raise ValueError(f'Less than {min_acceptance:g} of the '
+                             f'particles were accepted in the first '
+                             f'population')
+        return self.posterior()
+
+    def posterior(self):
+        '''Current posterior sample
+
+        Returns:
+            posterior (pandas.DataFrame)
+                One row per particle, with weights and distances
+        '''
+        import pandas as pd
+
+        df = pd.DataFrame(self.theta, columns=self.names)
+        df['weight'] = self.weights
+        df['distance'] = self.distances
+        df['tolerance'] = self.tolerance
+        df['generation'] = self.generation
+        return df
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+import os
+import heapq
+import pickle
+import numpy as np
+
+# names of the features used by the cost model, see `get_features`
+FEATURES = ['intercept', 'repetitions', 'steps', 'population',
+            'releases', 'late_releases', 'mating', 'deposition']
+
+# prior coefficients (log scale): runtime proportional to the repetitions,
+# the time steps and the population size, calibrated on a bugdorm cage
+# (12 repetitions of 45 days in ~40 seconds); memory growing
+# slowly with the population size (~50MB for a bugdorm cage)
+PRIOR_RUNTIME = np.array([np.log(8e-6), 1, 1, 1, 0, 0, 0, 0])
+PRIOR_MEMORY = np.array([np.log(30), 0, 0, 0.1, 0, 0, 0, 0])
+
+
+def get_features(p):
+    '''Features of a scenario that drive its cost
+
+    Args:
+        p (dict)
+            Parameters
+
+    Returns:
+        features (numpy.array)
+            See `FEATURES`: log repetitions, log time steps,
+            log population size (pupae released at each feeding,
+            the largest start release and the late releases), log of
+            the individuals released at the start, log of the
+            individuals released later on
+            (indefinite releases last until the end), mating and
+            egg deposition probabilities
+    '''
+    end_time = float(p['END_TIME'])
+    release_days = len(p['RELEASE_DAYS'])
+    released = (sum(p['RELEASE_WT']) + sum(p['RELEASE_DRIVE']) +
+                sum(p['RELEASE_ANTI']))
+    late = 0.
+    if p.get('LATE_RELEASES') is not None and p.get('LATE_RELEASES_ANTI'):
+        start = p.get('LATE_RELEASES_START') or 0
+        if p['LATE_RELEASES'] == -1:
+            # one release per feeding until the end
+            releases = max(end_time - start, 0) / 7 * release_days
+        else:
+            releases = p['LATE_RELEASES']
+        late = releases * p['LATE_RELEASES_ANTI']
+    # pupae released at each feeding, and the largest start release
+    largest = max(w + d + a for w, d, a in zip(p['RELEASE_WT'],
+                                               p['RELEASE_DRIVE'],
+                                               p['RELEASE_ANTI']))
+    population = p['RELEASE'] * release_days + largest + late
+    return np.array([1.,
+                     np.log(max(p.get('REPETITIONS', 1), 1)),
+                     np.log(end_time / p['TIME_STEP']),
+                     np.log1p(population),
+                     np.log1p(released),
+                     np.log1p(late),
+                     float(p['MATING_PROBABILITY']),
+                     float(p['EGG_DEPOSITION_PROBABILITY'])])
+
+
+class CostModel():
+    '''Predict the runtime and memory of a simulation from its parameters
+
+    Both are modelled as log-linear functions of the scenario's features
+    (see `get_features`), fitted on past runs by ridge regression,
+    shrunk towards prior coefficients; an unfitted model uses the priors,
+    which are enough to rank scenarios by their cost
+
+    Example:
+    >>> model = CostModel().fit(parameters, runtimes, memory)
+    >>> seconds, mb = model.predict(p)
+
+    Args:
+        penalty (float)
+            Strength of the shrinkage towards the priors
+    '''
+    def __init__(self, penalty=1.):
+        self.penalty = penalty
+        self.runtime = PRIOR_RUNTIME.copy()
+        self.memory = PRIOR_MEMORY.copy()
+        # residual standard deviations (log scale)
+        self.runtime_sd = 1.
+        self.memory_sd = 0.5
+        self.observations = 0
+
+    def _fit(self, X, y, prior):
+        # ridge regression of the residuals from the prior
+        A = X.T @ X + self.penalty * np.eye(X.shape[1])
+        b = X.T @ (y - X @ prior)
+        coef = prior + np.linalg.solve(A, b)
+        residuals = y - X @ coef
+        sd = np.sqrt((residuals ** 2).sum() / max(X.shape[0] - 1, 1))
+        return coef, sd
+
+    def fit(self, parameters, runtimes, memory):
+        '''Fit the model on past runs
+
+        Args:
+            parameters (iterable)
+                Parameters of each run
+            runtimes (iterable)
+                Wall time of each run, in seconds
+            memory (iterable)
+                Maximum resident memory of each run, in MB
+                (NaN if unknown)
+
+        Returns:
+            model (CostModel)
+                The fitted model
+        '''
+        X = np.array([get_features(p) for p in parameters])
+        runtimes = np.asarray(runtimes, dtype=float)
+        memory = np.asarray(memory, dtype=float)
+        self.observations = X.shape[0]
+        if self.observations == 0:
+            return self
+        self.runtime, self.runtime_sd = self._fit(X, np.log(runtimes),
+                                                  PRIOR_RUNTIME)
+        known = ~np.isnan(memory) & (memory > 0)
+        if known.any():
+            self.memory, self.memory_sd = self._fit(X[known],
+                                                    np.log(memory[known]),
+                                                    PRIOR_MEMORY)
+        return self
+
+    def predict(self, p, margin=0.):
+        '''Predicted runtime and memory of a simulation
+
+        Args:
+            p (dict)
+                Parameters
+            margin (float)
+                Residual standard deviations added to the predictions
+                (e.g. 2 to reserve enough memory for most runs)
+
+        Returns:
+            seconds (float)
+                Runtime, in seconds
+            mb (float)
+                Maximum resident memory, in MB
+        '''
+        x = get_features(p)
+        return (float(np.exp(x @ self.runtime + margin * self.runtime_sd)),
+                float(np.exp(x @ self.memory + margin * self.memory_sd)))
+
+    def save(self, fname):
+        '''Save the model to file
+
+        Args:
+            fname (str)
+                Output file
+        '''
+        with open(fname, 'wb') as f:
+            pickle.dump(self, f)
+
+
+def load_cost_model(fname=None):
+    '''Load a cost model from file
+
+    Args:
+        fname (str)
+            File with a saved model; if None or missing,
+            an unfitted model is returned
+
+    Returns:
+        model (CostModel)
+            The model
+    '''
+    if fname is None or not os.path.exists(fname):
+        return CostModel()
+    with open(fname, 'rb') as f:
+        return pickle.load(f)
+
+
+def read_benchmark(fname):
+    '''Runtime and memory recorded by a snakemake "benchmark" directive
+
+    Args:
+        fname (str)
+            Benchmark file (tsv format)
+
+    Returns:
+        seconds (float)
+            Wall time, averaged across measurements
+        mb (float)
+            Maximum resident memory, in MB (NaN if not recorded)
+    '''
+    with open(fname) as f:
+        header = f.readline().rstrip('\n').split('\t')
+        rows = [dict(zip(header, line.rstrip('\n').split('\t')))
+                for line in f if line.strip()]
+    seconds = np.mean([float(row['s']) for row in rows])
+    memory = [float(row['max_rss']) for row in rows
+              if row.get('max_rss', '-') not in ('-', 'NA', '')]
+    return float(seconds), float(max(memory)) if memory else np.nan
+
+
+def schedule(jobs, cores=1, memory=np.inf):
+    '''Order jobs longest first, packing them under a memory budget
+
+    Jobs are started as soon as a core is free, picking the longest
+    job that fits in the remaining memory; a job larger than
+    the whole budget is run on its own
+
+    Args:
+        jobs (iterable)
+            (name, seconds, mb) of each job
+        cores (int)
+            Number of jobs that can run at once
+        memory (float)
+            Memory budget, in MB
+
+    Returns:
+        plan (list)
+            (name, start, end, seconds, mb) of each job, in start order
+    '''
+    pending = sorted(jobs, key=lambda x: -x[1])
+    running = []
+    used = 0.
+    time = 0.
+    plan = []
+    while pending:
+        started = False
+        if len(running) < cores:
+            for i, (name, seconds, mb) in enumerate(pending):
+                if used + mb <= memory or not running:
+                    heapq.heappush(running, (time + seconds, mb))
+                    used += mb
+                    plan.append((name, time, time + seconds, seconds, mb))
+                    del pending[i]
+                    started = True
+                    break
+        if not started:
+            # wait for the next job to end
+            time, mb = heapq.heappop(running)
+            used -= mb
+    return plan
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+import zlib
+import random
+
+# 64 bits
+MASK = 2 ** 64 - 1
+
+# active streams, see `enable`
+streams = None
+
+# integer codes for events and other keys
+_codes = {}
+
+
+def _mix(x):
+    # splitmix64 finalizer
+    x = (x + 0x9E3779B97F4A7C15) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+def _code(part):
+    if part is None:
+        return 0
+    elif isinstance(part, int):
+        return part & MASK
+    elif isinstance(part, float):
+        # times have a resolution well above this
+        return int(round(part * 1000)) & MASK
+    code = _codes.get(part)
+    if code is None:
+        code = _codes[part] = zlib.crc32(str(part).encode())
+    return code
+
+
+class CommonRandom():
+    '''Counter-based random numbers keyed by lineage and event
+
+    Every individual carries a lineage key, derived from the keys
+    of its parents (or from its position in the releases), and each
+    of its life-history events draws a uniform number that only
+    depends on the seed, the lineage and the event. Two scenarios
+    run with the same seed therefore share the random numbers of all
+    individuals and events they have in common; variates are obtained
+    through the inverse CDF of each distribution, so that they move
+    monotonically when a parameter changes
+
+    Args:
+        seed (int)
+            Random seed
+    '''
+    def __init__(self, seed):
+        self.seed = _mix(_code(seed))
+
+    def lineage(self, *parts):
+        '''Key for a new lineage
+
+        Args:
+            *parts
+                Parent keys, time, counters or names (int, float or str)
+
+        Returns:
+            key (int)
+                Lineage key
+        '''
+        h = self.seed
+        for part in parts:
+            h = _mix(h ^ _code(part))
+        return h
+
+    def uniform(self, key, event, time=None):
+        '''Uniform random number in [0, 1)
+
+        Args:
+            key (int)
+                Lineage key
+            event (str)
+                Event name
+            time (float)
+                Time of the event, for events that can be repeated
+
+        Returns:
+            u (float)
+                Random number
+        '''
+        h = _mix(_mix(key ^ _code(event)) ^ _code(time))
+        return (h >> 11) / 9007199254740992
+
+    def shuffle(self, individuals, event, time=None):
+        '''Shuffle individuals in place, by their lineage
+
+        Individuals found in two scenarios keep the same relative order
+
+        Args:
+            individuals (list)
+                Individuals, with a lineage key
+            event (str)
+                Event name
+            time (float)
+                Time of the event
+        '''
+        individuals.sort(key=lambda x: self.uniform(x.lineage or 0,
+                                                    event, time))
+
+
+class Draws():
+    '''Random numbers for a single lineage
+
+    Args:
+        streams (CommonRandom)
+            Active streams
+        key (int)
+            Lineage key
+    '''
+    __slots__ = ('streams', 'key')
+
+    def __init__(self, streams, key):
+        self.streams = streams
+        self.key = key
+
+    def random(self, event, time=None):
+        '''Uniform random number for an event, see `CommonRandom.uniform`'''
+        return self.streams.uniform(self.key, event, time)
+
+    def variate(self, dist, event, time=None):
+        '''Random variate for an event, through the inverse CDF
+
+        Args:
+            dist (large_cage.distributions.Distribution)
+                Distribution
+            event (str)
+                Event name
+            time (float)
+                Time of the event
+
+        Returns:
+            x (float)
+                Random variate
+        '''
+        return dist.ppf(self.streams.uniform(self.key, event, time))
+
+
+class GlobalDraws():
+    '''Random numbers from the global generators, ignoring events
+
+    Used when common random numbers are disabled
+    '''
+    __slots__ = ()
+
+    def random(self, event, time=None):
+        return random.random()
+
+    def variate(self, dist, event, time=None):
+        return dist.rvs()
+
+
+_global = GlobalDraws()
+
+
+def draws(key, *parts):
+    '''Random numbers for a lineage
+
+    Args:
+        key (int)
+            Lineage key (None if the individual has no lineage)
+        *parts
+            Further keys (e.g. the role of a parent)
+
+    Returns:
+        draws (Draws or GlobalDraws)
+            Lineage-keyed draws if common random numbers are enabled,
+            otherwise draws from the global generators
+    '''
+    if streams is None or key is None:
+        return _global
+    if parts:
+        key = streams.lineage(key, *parts)
+    return Draws(streams, key)
+
+
+def enable(seed):
+    '''Enable common random numbers
+
+    Args:
+        seed (int)
+            Random seed
+    '''
+    global streams
+    streams = CommonRandom(seed)
+
+
+def disable():
+    '''Disable common random numbers'''
+    global streams
+    streams = None
+
+
+def lineage(*parts):
+    '''Key for a new lineage, None if common random numbers are disabled
+
+    Args:
+        *parts
+            Parent keys, time, counters or names
+
+    Returns:
+        key (int)
+            Lineage key
+    '''
+    if streams is None:
+        return None
+    return streams.lineage(*parts)
@@ -1,36 +1,510 @@
 #!/usr/bin/env python
 
+import math
 import numpy as np
-from scipy import stats
 
-class GaussianMixture():
-    def __init__(self, distributions, samples):
-        self._samples = np.concatenate([dist.rvs(n)
-                                        for dist, n in zip(distributions,
-                                                           samples)])
-        self.kde = stats.gaussian_kde(self._samples)
 
-    def rvs(self, n=1):
-        samples = self.kde.resample(n)[0]
-        if n == 1:
-            return np.abs(samples[0])
+# name -> class, see `register`
+registry = {}
+
+# already built distributions
+# key: hashable version of the specification
+built = {}
+
+# scipy.stats names for some distributions
+aliases = {'weibull': 'weibull_min'}
+
+
+def register(name):
+    '''Class decorator to register a distribution
+
+    The class constructor receives the YAML specification
+    (without the "dist" key) as keyword arguments
+
+    Args:
+        name (str)
+            Name used in the "dist" key of the YAML specification
+    '''
+    def wrapper(cls):
+        registry[name] = cls
+        return cls
+    return wrapper
+
+
+def _freeze(spec):
+    if isinstance(spec, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in spec.items()))
+    elif isinstance(spec, (list, tuple)):
+        return tuple(_freeze(x) for x in spec)
+    return spec
+
+
+def get_distribution(spec, default='norm'):
+    '''Build (or retrieve) a distribution from its specification
+
+    The specification is a dictionary, usually coming from the YAML
+    parameters file; the "dist" key indicates the distribution
+    name, while all the other keys are passed to the constructor.
+    If no "dist" key is present the default is used.
+    Any distribution in `scipy.stats` can be used, in addition to the
+    ones that have been registered in this module; the normal and
+    weibull distributions used by default are sampled with numpy,
+    and scipy is only imported for the other ones
+
+    Example: normal distribution
+    >>> get_distribution({'loc': 137.4, 'scale': 34.5})
+
+    Example: mixture of two normal distributions
+    >>> get_distribution({'dist': 'mixture',
+                          'weights': [0.7, 0.3],
+                          'components': [{'loc': 130, 'scale': 20},
+                                         {'loc': 60, 'scale': 10}]})
+
+    Example: KDE from empirical measurements
+    >>> get_distribution({'dist': 'kde',
+                          'samples': [21, 23.5, 18, 30, 27.2]})
+
+    Args:
+        spec (dict)
+            Distribution specification
+        default (str)
+            Distribution to use if the specification has no "dist" key
+
+    Returns:
+        distribution (Distribution)
+            A distribution object
+    '''
+    if isinstance(spec, Distribution):
+        return spec
+    key = (default, _freeze(spec))
+    if key not in built:
+        kwargs = dict(spec)
+        name = kwargs.pop('dist', default)
+        if name in registry:
+            built[key] = registry[name](**kwargs)
         else:
-            return np.abs(samples)
+            built[key] = ScipyDistribution(name, **kwargs)
+    return built[key]
+
+
+def reset_buffers():
+    '''Discard all random variates already drawn in bulk
+
+    Should be called after re-seeding the random number generator
+    '''
+    for dist in built.values():
+        dist._buffer = []
+
+
+class Distribution():
+    '''Base class for all distributions
+
+    Subclasses need to implement the `sample` method,
+    which should draw all the requested variates in bulk.
+    Single variates are served from a buffer that is refilled
+    in blocks, to avoid paying the sampling overhead each time.
+
+    Subclasses implementing `cdf` and `support` can also be sampled
+    through the inverse CDF (`ppf`), which is tabulated once
+    '''
+    block = 1024
+    # points in the tabulated inverse CDF
+    resolution = 4096
+
+    def __init__(self):
+        self._buffer = []
+        self._quantiles = None
+
+    def sample(self, n):
+        '''Draw random variates
+
+        Args:
+            n (int)
+                Number of random variates
+
+        Returns:
+            samples (numpy.array)
+                Array of random variates
+        '''
+        raise NotImplementedError
+
+    def rvs(self, n=None):
+        '''Draw random variates
+
+        Args:
+            n (int)
+                Number of random variates
+
+        Returns:
+            samples (float or numpy.array)
+                A single random variate if n is not given,
+                otherwise an array (as scipy's frozen distributions)
+        '''
+        if n is not None:
+            return self.sample(n)
+        if not self._buffer:
+            self._buffer = self.sample(self.block).tolist()
+        return self._buffer.pop()
+
+    def cdf(self, x):
+        '''Cumulative distribution function
+
+        Args:
+            x (numpy.array)
+                Values
+
+        Returns:
+            cdf (numpy.array)
+                Cumulative probabilities
+        '''
+        raise NotImplementedError
+
+    def support(self):
+        '''Range containing virtually all the probability mass
+
+        Returns:
+            low (float)
+                Lower bound
+            high (float)
+                Upper bound
+        '''
+        raise NotImplementedError
+
+    def quantiles(self):
+        '''Tabulated inverse CDF, at evenly spaced probabilities
+
+        Returns:
+            quantiles (numpy.array)
+                Values at probabilities 0, 1/resolution, ..., 1
+        '''
+        low, high = self.support()
+        x = np.linspace(low, high, 2 * self.resolution + 1)
+        cdf = np.maximum.accumulate(self.cdf(x))
+        return np.interp(np.linspace(cdf[0], cdf[-1], self.resolution + 1),
+                         cdf, x)
+
+    def ppf(self, u):
+        '''Inverse of the cumulative distribution function
+
+        Linear interpolation over the tabulated inverse CDF, which
+        makes it cheap enough to be called for each individual
+
+        Args:
+            u (float)
+                Probability, in [0, 1)
+
+        Returns:
+            x (float)
+                Random variate corresponding to u
+        '''
+        if self._quantiles is None:
+            self._quantiles = self.quantiles().tolist()
+        pos = u * self.resolution
+        i = int(pos)
+        if i >= self.resolution:
+            return self._quantiles[-1]
+        low = self._quantiles[i]
+        return low + (self._quantiles[i + 1] - low) * (pos - i)
+
+    def clipped_mean(self, low=0., high=1.):
+        '''Mean of the variates, clipped to a range
+
+        E[min(max(X, low), high)] = low + the integral of 1 - CDF(x)
+        between low and high, integrated numerically; this is *e.g.*
+        the probability that a uniform random number is below a
+        random variate, for probabilities drawn from this distribution
+
+        Args:
+            low (float)
+                Lower bound
+            high (float)
+                Upper bound
+
+        Returns:
+            mean (float)
+                Mean of the clipped variates
+        '''
+        x = np.linspace(low, high, self.resolution + 1)
+        survival = 1 - np.asarray(self.cdf(x), dtype=float)
+        return low + float((survival[1:] + survival[:-1]).sum() / 2 *
+                           (x[1] - x[0]))
+
+
+def _bounds(dist, tail=1e-9):
+    # works for scipy.stats frozen distributions as well
+    return float(dist.ppf(tail)), float(dist.ppf(1 - tail))
 
-class DistributionMixture():
-    def __init__(self, distributions, weights):
+
+def _absolute_cdf(cdf, x):
+    # distribution of |X|, for x >= 0
+    x = np.maximum(x, 0)
+    return cdf(x) - cdf(-x)
+
+
+@register('scipy')
+class ScipyDistribution(Distribution):
+    '''Any distribution from `scipy.stats`
+
+    Example: weibull distribution
+    >>> ScipyDistribution('weibull_min', c=1.7, loc=1.8, scale=11.4)
+    '''
+    def __init__(self, name, **kwargs):
+        from scipy import stats
+
+        super().__init__()
+        name = aliases.get(name, name)
+        try:
+            dist = getattr(stats, name)
+        except AttributeError:
+            raise ValueError(f'{name} not implemented yet')
+        self._dist = dist(**kwargs)
+
+    def sample(self, n):
+        return np.atleast_1d(self._dist.rvs(size=n))
+
+    def cdf(self, x):
+        return self._dist.cdf(x)
+
+    def support(self):
+        return _bounds(self._dist)
+
+    def quantiles(self):
+        u = np.linspace(0, 1, self.resolution + 1)
+        u[0], u[-1] = 1e-9, 1 - 1e-9
+        return self._dist.ppf(u)
+
+
+@register('norm')
+class Normal(Distribution):
+    '''Normal distribution, sampled with numpy
+
+    Args:
+        loc (float)
+            Mean
+        scale (float)
+            Standard deviation
+    '''
+    def __init__(self, loc=0., scale=1.):
+        super().__init__()
+        self.loc = loc
+        self.scale = scale
+
+    def sample(self, n):
+        return np.random.normal(self.loc, self.scale, size=n)
+
+    def cdf(self, x):
+        z = (np.asarray(x, dtype=float) - self.loc) / (self.scale * math.sqrt(2))
+        return 0.5 * (1 + np.vectorize(math.erf, otypes=[float])(z))
+
+    def support(self):
+        # beyond 1e-9 of the tails, as for scipy distributions
+        return self.loc - 6.1 * self.scale, self.loc + 6.1 * self.scale
+
+    def ppf(self, u):
+        return self.loc + self.scale * _probit(u)
+
+
+def _probit(u):
+    # inverse of the standard normal CDF (Acklam's approximation)
+    u = min(max(u, 1e-9), 1 - 1e-9)
+    a = (-3.969683028665376e+01, 2.209460984245205e+02,
+         -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02,
+         -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549671010448312e+00,
+         4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01,
+         2.445134137142996e+00, 3.754408661907416e+00)
+    if u < 0.02425 or u > 1 - 0.02425:
+        q = math.sqrt(-2 * math.log(min(u, 1 - u)))
+        x = ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) /
+             ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))
+        return x if u < 0.5 else -x
+    q = u - 0.5
+    r = q * q
+    return ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q /
+            (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1))
+
+
+@register('weibull')
+@register('weibull_min')
+class Weibull(Distribution):
+    '''Weibull distribution (as `scipy.stats.weibull_min`), sampled with numpy
+
+    Args:
+        c (float)
+            Shape
+        loc (float)
+            Location
+        scale (float)
+            Scale
+    '''
+    def __init__(self, c, loc=0., scale=1.):
+        super().__init__()
+        self.c = c
+        self.loc = loc
+        self.scale = scale
+
+    def sample(self, n):
+        return self.loc + self.scale * np.random.weibull(self.c, size=n)
+
+    def cdf(self, x):
+        z = np.maximum(np.asarray(x, dtype=float) - self.loc, 0) / self.scale
+        return 1 - np.exp(-z ** self.c)
+
+    def support(self):
+        return self.ppf(1e-9), self.ppf(1 - 1e-9)
+
+    def ppf(self, u):
+        # closed form
+        return self.loc + self.scale * (-math.log1p(-u)) ** (1 / self.c)
+
+
+@register('mixture')
+class DistributionMixture(Distribution):
+    '''Weighted mixture of distributions
+
+    Components are chosen for all samples at once,
+    then each component draws its samples in bulk
+
+    Args:
+        distributions (iterable)
+            Distribution objects (with a `rvs(n)` method)
+        weights (iterable)
+            Weight of each component (normalized to 1)
+        absolute (bool)
+            Return the absolute value of each sample
+            (default: only if the components are distribution objects)
+        components (iterable)
+            Specification of each component (dictionaries), used
+            instead of `distributions` when coming from YAML
+    '''
+    def __init__(self, distributions=None, weights=None,
+                 absolute=None, components=None):
+        super().__init__()
+        if absolute is None:
+            absolute = components is None
+        if components is not None:
+            distributions = [get_distribution(x) for x in components]
         self._distributions = distributions
-        self._weights = np.array(weights)
+        self._weights = np.array(weights, dtype=float)
         self._weights /= self._weights.sum()
+        self._absolute = absolute
 
-    def rvs(self, n=1):
-        samples = []
-        for _ in range(n):
-            dist = np.random.choice(np.arange(len(self._distributions)),
-                                    p=self._weights)
-            sample = np.abs(self._distributions[dist].rvs(1))
-            samples.append(sample)
-        if n == 1:
-            return samples[0]
-        else:
-            return np.array(samples)
+    def sample(self, n):
+        choices = np.random.choice(len(self._distributions),
+                                   size=n,
+                                   p=self._weights)
+        samples = np.empty(n)
+        for i, dist in enumerate(self._distributions):
+            idx = np.flatnonzero(choices == i)
+            if idx.shape[0] == 0:
+                continue
+            samples[idx] = dist.rvs(idx.shape[0])
+        if self._absolute:
+            return np.abs(samples)
+        return samples
+
+    def _cdf(self, x):
+        return sum(w * dist.cdf(x)
+                   for w, dist in zip(self._weights, self._distributions))
+
+    def cdf(self, x):
+        if self._absolute:
+            return _absolute_cdf(self._cdf, x)
+        return self._cdf(x)
+
+    def support(self):
+        bounds = np.array([_bounds(dist) for dist in self._distributions])
+        low, high = bounds[:, 0].min(), bounds[:, 1].max()
+        if self._absolute:
+            return 0., max(abs(low), abs(high))
+        return low, high
+
+
+@register('kde')
+class KernelDensity(Distribution):
+    '''Gaussian kernel density estimate from empirical samples
+
+    Args:
+        samples (iterable)
+            Observed values
+        file (str)
+            Text file with one observed value per line
+            (used if samples is None)
+        bw_method (str or float)
+            Bandwidth, as in `scipy.stats.gaussian_kde`
+        absolute (bool)
+            Return the absolute value of each sample
+    '''
+    def __init__(self, samples=None, file=None,
+                 bw_method=None, absolute=False):
+        super().__init__()
+        from scipy import stats
+
+        if samples is None:
+            samples = np.loadtxt(file)
+        self._samples = np.asarray(samples, dtype=float)
+        self.kde = stats.gaussian_kde(self._samples, bw_method=bw_method)
+        self._absolute = absolute
+
+    def sample(self, n):
+        samples = self.kde.resample(n)[0]
+        if self._absolute:
+            return np.abs(samples)
+        return samples
+
+    def _bandwidth(self):
+        return np.sqrt(self.kde.covariance[0, 0])
+
+    def _cdf(self, x):
+        from scipy.special import ndtr
+
+        x = np.atleast_1d(x)
+        bw = self._bandwidth()
+        cdf = np.empty(x.shape[0])
+        # limit the size of the intermediate matrix
+        for i in range(0, x.shape[0], 256):
+            z = (x[i:i + 256, np.newaxis] - self._samples[np.newaxis, :]) / bw
+            cdf[i:i + 256] = ndtr(z).mean(axis=1)
+        return cdf
+
+    def cdf(self, x):
+        if self._absolute:
+            return _absolute_cdf(self._cdf, x)
+        return self._cdf(x)
+
+    def support(self):
+        bw = self._bandwidth()
+        low = self._samples.min() - 8 * bw
+        high = self._samples.max() + 8 * bw
+        if self._absolute:
+            return 0., max(abs(low), abs(high))
+        return low, high
+
+
+@register('gaussian_mixture')
+class GaussianMixture(KernelDensity):
+    '''Gaussian kernel density estimate built on samples drawn
+    from multiple distributions
+
+    Args:
+        distributions (iterable)
+            Distribution objects (with a `rvs(n)` method)
+        samples (iterable)
+            Number of samples to draw from each distribution
+        components (iterable)
+            Specification of each component (dictionaries), used
+            instead of `distributions` when coming from YAML
+    '''
+    def __init__(self, distributions=None, samples=None,
+                 components=None):
+        if components is not None:
+            distributions = [get_distribution(x) for x in components]
+        super().__init__(np.concatenate([dist.rvs(n)
+                                         for dist, n in zip(distributions,
+                                                            samples)]),
+                         absolute=True)
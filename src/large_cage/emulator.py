@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+import pickle
+import numpy as np
+
+
+def flatten_parameters(p, prefix=''):
+    '''Flatten a parameters dictionary to dot-separated paths
+
+    Only numeric values are kept; the paths can be used in
+    sweeps and overrides (see `large_cage.parameters.set_parameter`)
+
+    Args:
+        p (dict)
+            Parameters
+        prefix (str)
+            Prefix for all paths
+
+    Returns:
+        flat (dict)
+            Path -> value
+    '''
+    flat = {}
+    if isinstance(p, dict):
+        items = p.items()
+    else:
+        items = enumerate(p)
+    for k, v in items:
+        key = f'{prefix}{k}'
+        if isinstance(v, (dict, list, tuple)):
+            flat.update(flatten_parameters(v, prefix=f'{key}.'))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            flat[key] = float(v)
+    return flat
+
+
+def summarise(df, times, threshold=0.5, end_time=None):
+    '''Summarise the output of a scenario (all rounds)
+
+    Args:
+        df (pandas.DataFrame)
+            Collated output, with at least the "round", "time",
+            "initial_release", "eggs" and "drives" columns
+        times (iterable)
+            Days at which to report the drive frequency
+        threshold (float)
+            Drive frequency for the time-to-threshold summary
+        end_time (float)
+            Value used for the time-to-threshold if the threshold is
+            never reached (default: last time point)
+
+    Returns:
+        summary (dict)
+            Summary statistics, averaged across rounds
+    '''
+    import pandas as pd
+
+    if end_time is None:
+        end_time = df['time'].max()
+    summaries = []
+    for _, r in df.groupby('round'):
+        r = r.set_index('time')
+        s = {}
+        for t in times:
+            # no individuals left: no drive either
+            s[f'drives_{t:g}'] = r['drives'].reindex([float(t)]).fillna(0).values[0]
+        passed = r.index[r['drives'] >= threshold]
+        if passed.shape[0] > 0:
+            s[f'time_to_{threshold:g}'] = passed.min()
+        else:
+            s[f'time_to_{threshold:g}'] = end_time
+        s['total_eggs'] = r[r['initial_release'].astype(str) == 'True']['eggs'].sum()
+        summaries.append(s)
+    return pd.DataFrame(summaries).mean().to_dict()
+
+
+class Emulator():
+    '''Surrogate model mapping parameters to summary statistics
+
+    One regressor is trained for each summary statistic; inputs
+    are scaled to the training ranges.
+
+    Args:
+        method (str)
+            "gp" (gaussian process, with a Matern kernel and noise term)
+            or "gbt" (gradient boosted trees, with uncertainty derived
+            from the 10th and 90th quantile models)
+    '''
+    def __init__(self, method='gp'):
+        if method not in ('gp', 'gbt'):
+            raise ValueError(f'{method} not implemented yet')
+        self.method = method
+        self.inputs = None
+        self.integers = None
+        self.outputs = None
+        self.lows = None
+        self.highs = None
+        self.models = {}
+
+    def _scale(self, X):
+        X = np.asarray(X[self.inputs], dtype=float)
+        span = np.where(self.highs > self.lows, self.highs - self.lows, 1)
+        return (X - self.lows) / span
+
+    def _regressors(self):
+        if self.method == 'gp':
+            from sklearn.gaussian_process import GaussianProcessRegressor
+            from sklearn.gaussian_process.kernels import Matern
+            from sklearn.gaussian_process.kernels import WhiteKernel
+            from sklearn.gaussian_process.kernels import ConstantKernel
+
+            kernel = (ConstantKernel() *
+                      Matern(length_scale=np.ones(len(self.inputs)), nu=2.5) +
+                      WhiteKernel())
+            return [GaussianProcessRegressor(kernel=kernel,
+                                             normalize_y=True,
+                                             n_restarts_optimizer=2)]
+        from sklearn.ensemble import GradientBoostingRegressor
+
+        return [GradientBoostingRegressor(loss='quantile', alpha=alpha)
+                for alpha in (0.1, 0.5, 0.9)]
+
+    def fit(self, X, Y):
+        '''Train the emulator
+
+        Args:
+            X (pandas.DataFrame)
+                Parameters, one row per scenario
+            Y (pandas.DataFrame)
+                Summary statistics, one row per scenario
+
+        Returns:
+            self (Emulator)
+        '''
+        # only use parameters that vary
+        self.inputs = [c for c in X.columns
+                       if X[c].nunique() > 1]
+        self.outputs = list(Y.columns)
+        self.integers = [c for c in self.inputs
+                         if (X[c] % 1 == 0).all()]
+        self.lows = X[self.inputs].min().values.astype(float)
+        self.highs = X[self.inputs].max().values.astype(float)
+        Xs = self._scale(X)
+        for c in self.outputs:
+            y = Y[c].values.astype(float)
+            regressors = self._regressors()
+            for r in regressors:
+                r.fit(Xs, y)
+            self.models[c] = regressors
+        return self
+
+    def predict(self, X):
+        '''Predict the summary statistics
+
+        Args:
+            X (pandas.DataFrame)
+                Parameters, one row per scenario
+
+        Returns:
+            mean (pandas.DataFrame)
+                Predicted summary statistics
+            std (pandas.DataFrame)
+                Predictive uncertainty (standard deviation)
+        '''
+        import pandas as pd
+
+        Xs = self._scale(X)
+        mean = {}
+        std = {}
+        for c, regressors in self.models.items():
+            if self.method == 'gp':
+                mean[c], std[c] = regressors[0].predict(Xs, return_std=True)
+            else:
+                low, median, high = [r.predict(Xs) for r in regressors]
+                mean[c] = median
+                # 10th-90th percentiles of a normal distribution
+                std[c] = np.abs(high - low) / 2.563
+        return (pd.DataFrame(mean, index=X.index),
+                pd.DataFrame(std, index=X.index))
+
+    def suggest(self, n=10, candidates=1000, ranges=None, seed=None):
+        '''Suggest the next points to simulate
+
+        Candidates are drawn with a latin hypercube within the
+        ranges, and the ones with the highest predictive uncertainty
+        (relative to the spread of each statistic) are chosen,
+        avoiding points too close to each other
+
+        Args:
+            n (int)
+                Number of points to suggest
+            candidates (int)
+                Number of candidate points
+            ranges (dict)
+                Parameter -> (low, high), default: training ranges
+            seed (int)
+                Random seed
+
+        Returns:
+            points (pandas.DataFrame)
+                Suggested parameters, with their uncertainty score
+        '''
+        import pandas as pd
+        from scipy.stats import qmc
+
+        lows = self.lows.copy()
+        highs = self.highs.copy()
+        if ranges is not None:
+            for k, (low, high) in ranges.items():
+                i = self.inputs.index(k)
+                lows[i], highs[i] = low, high
+        sampler = qmc.LatinHypercube(len(self.inputs), seed=seed)
+        X = pd.DataFrame(qmc.scale(sampler.random(candidates), lows, highs),
+                         columns=self.inputs)
+        for c in self.integers:
+            X[c] = X[c].round().astype(int)
+        _, std = self.predict(X)
+        score = (std / std.max().replace(0, 1)).mean(axis=1).values
+
+        Xs = self._scale(X)
+        # minimum distance between suggestions (scaled units)
+        min_dist = 0.5 / max(n, 1) ** (1 / len(self.inputs))
+        chosen = []
+        for i in np.argsort(-score):
+            if all(np.linalg.norm(Xs[i] - Xs[j]) >= min_dist
+                   for j in chosen):
+                chosen.append(i)
+            if len(chosen) == n:
+                break
+        points = X.iloc[chosen].copy()
+        points['uncertainty'] = score[chosen]
+        return points.reset_index(drop=True)
+
+    def save(self, fname):
+        '''Save the emulator to file
+
+        Args:
+            fname (str)
+                Output file
+        '''
+        with open(fname, 'wb') as f:
+            pickle.dump(self, f)
+
+
+def load_emulator(fname):
+    '''Load an emulator from file
+
+    Args:
+        fname (str)
+            File with a saved emulator
+
+    Returns:
+        emulator (Emulator)
+            The emulator
+    '''
+    with open(fname, 'rb') as f:
+        return pickle.load(f)
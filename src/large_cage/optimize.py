@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import math
+import numpy as np
+from multiprocessing import Pool
+
+from large_cage.agent import set_seed
+from large_cage.agent import get_observables
+from large_cage.agent import format_record
+from large_cage.agent import get_simulation
+from large_cage.batch import BatchSimulation
+from large_cage.sequential import Target
+from large_cage.parameters import check_parameters
+from large_cage.parameters import resolve_parameters
+
+
+def late_releases(rows, p):
+    '''Number of late releases in a repetition'''
+    return float(sum(row['late_release'] for row in rows))
+
+
+def released_anti(rows, p):
+    '''Antidote individuals released in a repetition (start and late releases)'''
+    late = p['LATE_RELEASES_ANTI'] if p['LATE_RELEASES'] is not None else 0
+    return float(sum(p['RELEASE_ANTI']) +
+                 late_releases(rows, p) * (late or 0))
+
+
+def released_drive(rows, p):
+    '''Drive individuals released in a repetition'''
+    return float(sum(p['RELEASE_DRIVE']))
+
+
+# objective terms computed from the releases rather than the output
+COSTS = {'late_releases': late_releases,
+         'released_anti': released_anti,
+         'released_drive': released_drive}
+
+
+class Objective():
+    '''Weighted sum of targets, to be minimised
+
+    Each term is either a target on the simulation output
+    (see `large_cage.sequential.Target`; targets measured after the
+    end of a shortened simulation are measured at its last time point)
+    or one of the release costs (see `COSTS`)
+
+    Example: low drive frequency at day 200, with few antidote releases
+    >>> objective = Objective([('drives@200', 1),
+    ...                        ('released_anti', 1e-4)])
+
+    Args:
+        terms (iterable)
+            (target, weight) pairs
+    '''
+    def __init__(self, terms):
+        self.terms = [(spec, float(weight)) for spec, weight in terms]
+        for spec, _ in self.terms:
+            if spec not in COSTS:
+                Target(spec, 0)
+
+    def __call__(self, rows, p):
+        '''Value of the objective in a single repetition
+
+        Args:
+            rows (list)
+                Output of the repetition (see `Target.value`), with
+                the "late_release" flag of each record
+            p (dict)
+                Parameters of the repetition
+
+        Returns:
+            value (float)
+                Objective value, NaN if undefined
+        '''
+        value = 0.
+        for spec, weight in self.terms:
+            if spec in COSTS:
+                value += weight * COSTS[spec](rows, p)
+                continue
+            target = Target(spec, 0)
+            if target.time is not None and target.time > p['END_TIME']:
+                target.time = None
+            value += weight * target.value(rows)
+        return value
+
+    def columns(self):
+        '''Output columns needed by the objective
+
+        Returns:
+            columns (list)
+                Columns, see `large_cage.agent.get_header`
+        '''
+        columns = ['round', 'time']
+        for spec, _ in self.terms:
+            if spec in COSTS:
+                continue
+            column = Target(spec, 0).column
+            if column == 'suppression':
+                column = 'pop'
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+
+def _rows(records, header):
+    for record in records:
+        row = dict(zip(header, format_record(record).split('\t')))
+        row['late_release'] = record['late_release']
+        yield row
+
+
+def _evaluate(args):
+    p, objective, repeats, seed, common, batch = args
+    set_seed(seed, common=common)
+    # only compute the columns used by the objective
+    observables = get_observables(objective.columns(), p)
+    header = observables.columns
+    if batch:
+        rows = [[] for _ in range(repeats)]
+        for records in BatchSimulation(p, repetitions=repeats,
+                                       observables=observables):
+            for record, row in zip(records, _rows(records, header)):
+                rows[record['round']].append(row)
+    else:
+        rows = [list(_rows(get_simulation(p, repetition=j,
+                                          observables=observables),
+                           header))
+                for j in range(repeats)]
+    return [objective(x, p) for x in rows]
+
+
+def _silence():
+    # simulations report events on stderr
+    sys.stderr = open(os.devnull, 'w')
+
+
+class SuccessiveHalving():
+    '''Search release strategies through successive halving
+
+    Many candidates are first evaluated with few repetitions and
+    (optionally) a shorter simulation; at each rung only the best
+    1 / eta of them are promoted, and evaluated with eta times more
+    repetitions and a longer simulation, until the full number of
+    repetitions and the full simulation length are reached.
+    With Hyperband, several such brackets are run, trading the number
+    of candidates for the resources given to them at the first rung.
+    All candidates are simulated with the same seed, so that they are
+    compared on the same random numbers as far as possible
+
+    Example: release size and antidote releases
+    >>> sh = SuccessiveHalving(p, {'RELEASE': (500, 5000),
+    ...                            'LATE_RELEASES_ANTI': (50, 500)},
+    ...                        Objective([('drives@200', 1)]))
+    >>> evaluations = sh.run(candidates=81)
+
+    Args:
+        p (dict)
+            Base parameters
+        space (dict)
+            Parameter name (or dot-separated path) -> (low, high);
+            if both bounds are integers, values are rounded to integers
+        objective (Objective)
+            Objective to minimise
+        eta (int)
+            Proportion of candidates promoted at each rung (1 / eta)
+        min_repeats (int)
+            Repetitions at the first rung
+        max_repeats (int)
+            Repetitions at the last rung
+        min_end_time (float)
+            Simulation length at the first rung
+            (default: always the full length)
+        common (bool)
+            Use common random numbers (see `large_cage.crn`)
+        batch (bool)
+            Use the batch engine (see `large_cage.batch`)
+        jobs (int)
+            Number of parallel processes
+        seed (int)
+            Random seed
+    '''
+    def __init__(self, p, space, objective, eta=3,
+                 min_repeats=1, max_repeats=27, min_end_time=None,
+                 common=False, batch=False, jobs=1, seed=None):
+        self.p = p
+        self.names = list(space)
+        self.space = space
+        self.objective = objective
+        self.eta = eta
+        self.min_repeats = min_repeats
+        self.max_repeats = max(max_repeats, min_repeats)
+        self.end_time = p['END_TIME']
+        if min_end_time is None:
+            min_end_time = self.end_time
+        self.min_end_time = min(min_end_time, self.end_time)
+        self.common = common
+        self.batch = batch
+        self.jobs = jobs
+        self.rng = np.random.default_rng(seed)
+        self.seed = int(self.rng.integers(0, 2 ** 32))
+        self.rungs = int(math.floor(math.log(self.max_repeats /
+                                             self.min_repeats, eta) +
+                                    1e-9)) + 1
+        self.evaluations = []
+
+    def sample(self, n):
+        '''Random candidates within the search space
+
+        Args:
+            n (int)
+                Number of candidates
+
+        Returns:
+            candidates (list)
+                Parameter name -> value
+        '''
+        candidates = []
+        for _ in range(n):
+            candidate = {}
+            for k in self.names:
+                low, high = self.space[k]
+                if isinstance(low, int) and isinstance(high, int):
+                    candidate[k] = int(self.rng.integers(low, high + 1))
+                else:
+                    candidate[k] = float(self.rng.uniform(low, high))
+            candidates.append(candidate)
+        return candidates
+
+    def resources(self, rung):
+        '''Repetitions and simulation length at a rung
+
+        Args:
+            rung (int)
+                Rung (0 is the first)
+
+        Returns:
+            repeats (int)
+                Number of repetitions
+            end_time (float)
+                Simulation length, in days
+        '''
+        last = self.rungs - 1
+        repeats = min(self.max_repeats, self.min_repeats * self.eta ** rung)
+        if last == 0:
+            return repeats, self.end_time
+        # geometric progression between the shortest and full lengths
+        end_time = (self.min_end_time *
+                    (self.end_time / self.min_end_time) ** (rung / last))
+        return repeats, float(math.ceil(end_time))
+
+    def _parameters(self, candidate, end_time):
+        p = resolve_parameters(dict(candidate), p=self.p)
+        p['END_TIME'] = end_time
+        check_parameters(p)
+        return p
+
+    def evaluate(self, pool, candidates, rung, bracket=0):
+        '''Evaluate candidates at a rung
+
+        Args:
+            pool (multiprocessing.Pool)
+                Pool used to run the simulations
+            candidates (list)
+                Candidates to evaluate
+            rung (int)
+                Rung, sets the resources
+            bracket (int)
+                Hyperband bracket (for reporting)
+
+        Returns:
+            scores (numpy.array)
+                Mean objective of each candidate (infinite if undefined)
+        '''
+        repeats, end_time = self.resources(rung)
+        args = [(self._parameters(x, end_time), self.objective,
+                 repeats, self.seed, self.common, self.batch)
+                for x in candidates]
+        scores = []
+        for candidate, values in zip(candidates,
+                                     pool.imap(_evaluate, args)):
+            values = np.array(values, dtype=float)
+            values = values[~np.isnan(values)]
+            if values.shape[0] > 0:
+                score = values.mean()
+                sem = (values.std(ddof=1) / np.sqrt(values.shape[0])
+                       if values.shape[0] > 1 else np.nan)
+            else:
+                score = np.inf
+                sem = np.nan
+            scores.append(score)
+            self.evaluations.append(dict(candidate,
+                                         bracket=bracket, rung=rung,
+                                         repeats=repeats, end_time=end_time,
+                                         objective=score, sem=sem))
+        return np.array(scores)
+
+    def bracket(self, pool, candidates, first_rung=0, bracket=0):
+        '''Run successive halving on a set of candidates
+
+        Args:
+            pool (multiprocessing.Pool)
+                Pool used to run the simulations
+            candidates (list)
+                Initial candidates
+            first_rung (int)
+                Rung at which the candidates are first evaluated
+            bracket (int)
+                Hyperband bracket (for reporting)
+
+        Returns:
+            best (dict)
+                Best candidate, with its objective
+        '''
+        for rung in range(first_rung, self.rungs):
+            scores = self.evaluate(pool, candidates, rung, bracket)
+            order = np.argsort(scores, kind='stable')
+            sys.stderr.write(f'bracket {bracket}, rung {rung}: '
+                             f'{len(candidates)} candidates, '
+                             f'best {scores[order[0]]:.5f}\n')
+            if rung == self.rungs - 1:
+                return dict(candidates[order[0]],
+                            objective=scores[order[0]])
+            keep = max(1, len(candidates) // self.eta)
+            candidates = [candidates[i] for i in order[:keep]]
+
+    def run(self, candidates=81, hyperband=False):
+        '''Run the search
+
+        Args:
+            candidates (int)
+                Candidates at the first rung (of the most
+                exploratory bracket, with Hyperband)
+            hyperband (bool)
+                Run all Hyperband brackets, rather than a single
+                successive halving from the first rung
+
+        Returns:
+            evaluations (pandas.DataFrame)
+                All evaluations, the last rung of each bracket
+                being the full evaluation of its best candidates
+        '''
+        brackets = [(0, candidates)]
+        if hyperband:
+            s_max = self.rungs - 1
+            # fewer candidates, starting from later rungs
+            brackets = [(s_max - s,
+                         max(1, int(math.ceil(candidates * (s_max + 1) /
+                                              ((s + 1) *
+                                               self.eta ** (s_max - s))))))
+                        for s in range(s_max, -1, -1)]
+
+        with Pool(self.jobs, initializer=_silence) as pool:
+            for i, (first_rung, n) in enumerate(brackets):
+                self.bracket(pool, self.sample(n),
+                             first_rung=first_rung, bracket=i)
+        return self.history()
+
+    def history(self):
+        '''All evaluations so far
+
+        Returns:
+            evaluations (pandas.DataFrame)
+                One row per candidate and rung
+        '''
+        import pandas as pd
+
+        return pd.DataFrame(self.evaluations,
+                            columns=self.names + ['bracket', 'rung',
+                                                  'repeats', 'end_time',
+                                                  'objective', 'sem'])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import sys
+import yaml
+from copy import deepcopy
+
+from large_cage import agent
+
+
+def read_yaml(fname):
+    '''Read a YAML file
+
+    Args:
+        fname (str)
+            Path to the YAML file
+
+    Returns:
+        content (dict)
+            Content of the file
+    '''
+    with open(fname) as f:
+        return yaml.load(f, Loader=yaml.SafeLoader)
+
+
+def set_parameter(p, key, value):
+    '''Set a (possibly nested) parameter
+
+    Nested keys are separated by dots, and integers
+    can be used to index lists
+
+    Example: change the mating modifier of hom. antidote males
+    >>> set_parameter(p, 'MATING_MOD.m.WWAA', 0.5)
+
+    Example: change the size of the fourth drive release
+    >>> set_parameter(p, 'RELEASE_DRIVE.3', 200)
+
+    Args:
+        p (dict)
+            Parameters
+        key (str)
+            Parameter name, or dot-separated path
+        value (object)
+            New value
+    '''
+    path = str(key).split('.')
+    d = p
+    for k in path[:-1]:
+        if isinstance(d, list):
+            d = d[int(k)]
+        else:
+            d = d.setdefault(k, {})
+    if isinstance(d, list):
+        d[int(path[-1])] = value
+    else:
+        d[path[-1]] = value
+
+
+def resolve_parameters(overrides, p=None, verbose=False):
+    '''Apply a set of overrides on top of the parameters
+
+    Args:
+        overrides (dict)
+            New values, keys can be dot-separated paths
+            (see `set_parameter`)
+        p (dict)
+            Parameters to start from (not modified)
+            (default: the defaults in `large_cage.agent`)
+        verbose (bool)
+            Report which default parameters are changed
+
+    Returns:
+        p (dict)
+            Resolved parameters
+    '''
+    if p is None:
+        p = agent.params
+    p = deepcopy(p)
+    for k, v in overrides.items():
+        if verbose and k in p:
+            sys.stderr.write(f'Changing parameter {k} from its default\n')
+        set_parameter(p, k, v)
+    return p
+
+
+def load_parameters(fname=None, verbose=False):
+    '''Load parameters from a YAML file, on top of the defaults
+
+    Args:
+        fname (str)
+            Path to the YAML file (default: only use the default ones)
+        verbose (bool)
+            Report which default parameters are changed
+
+    Returns:
+        p (dict)
+            Resolved parameters
+    '''
+    if fname is None:
+        return deepcopy(agent.params)
+    return resolve_parameters(read_yaml(fname), verbose=verbose)
+
+
+def check_parameters(p):
+    '''Check the consistency of the parameters
+
+    Args:
+        p (dict)
+            Parameters
+
+    Raises:
+        ValueError
+            If the initial introductions have different lengths
+    '''
+    if len(p['RELEASE_WT']) != len(p['RELEASE_DRIVE']) or len(p['RELEASE_DRIVE']) != len(p['RELEASE_ANTI']):
+        raise ValueError('Please provide the same number of introductions '
+                         'for wild-type, drive and antidote individuals')
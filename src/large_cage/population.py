@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+
+class Population():
+    '''Container of individuals with linear-time bulk operations
+
+    Individuals are kept in a list, in insertion order; additions
+    are done in place, and removals are done in a single pass over
+    the container rather than one individual at a time
+
+    Example: age all individuals, removing the dead ones
+    >>> population = Population(start_population)
+    >>> dead = population.age(0.1)
+
+    Example: move pupae from the nursery to the cage
+    >>> pupae = nursery.select(lambda x: x.stage == 'pupa')
+    >>> nursery.transfer(pupae[:400], population)
+
+    Args:
+        individuals (iterable)
+            Initial content
+    '''
+    def __init__(self, individuals=()):
+        self._individuals = list(individuals)
+
+    def __len__(self):
+        return len(self._individuals)
+
+    def __iter__(self):
+        return iter(self._individuals)
+
+    def __repr__(self):
+        return f'Population({len(self)} individuals)'
+
+    def add(self, individual):
+        '''Add a single individual
+
+        Args:
+            individual (Individual)
+                Individual to add
+        '''
+        self._individuals.append(individual)
+
+    def extend(self, individuals):
+        '''Add many individuals, in place
+
+        Args:
+            individuals (iterable)
+                Individuals to add
+        '''
+        self._individuals.extend(individuals)
+
+    def select(self, predicate):
+        '''Individuals satisfying a condition
+
+        Args:
+            predicate (function)
+                Called on each individual
+
+        Returns:
+            individuals (list)
+                Selected individuals, in order
+        '''
+        return [x for x in self._individuals if predicate(x)]
+
+    def keep(self, mask):
+        '''Keep the individuals indicated by a mask, removing all others
+
+        Args:
+            mask (iterable of bool)
+                One value per individual, in order
+
+        Returns:
+            removed (list)
+                Removed individuals
+        '''
+        kept = []
+        removed = []
+        for x, keep in zip(self._individuals, mask):
+            if keep:
+                kept.append(x)
+            else:
+                removed.append(x)
+        self._individuals = kept
+        return removed
+
+    def remove_all(self, individuals):
+        '''Remove many individuals at once
+
+        Args:
+            individuals (iterable)
+                Individuals to remove (others are ignored)
+        '''
+        ids = {id(x) for x in individuals}
+        if ids:
+            self._individuals = [x for x in self._individuals
+                                 if id(x) not in ids]
+
+    def transfer(self, individuals, other):
+        '''Move individuals to another container
+
+        Args:
+            individuals (iterable)
+                Individuals to move (should be in this container)
+            other (Population)
+                Destination
+        '''
+        individuals = list(individuals)
+        self.remove_all(individuals)
+        other.extend(individuals)
+
+    def take(self, other):
+        '''Move all individuals of another container into this one
+
+        Args:
+            other (Population)
+                Source, emptied
+        '''
+        self._individuals.extend(other._individuals)
+        other._individuals = []
+
+    def clear(self):
+        '''Remove all individuals'''
+        self._individuals = []
+
+    def age(self, time_step):
+        '''Increase the age of all individuals, removing the dead ones
+
+        Args:
+            time_step (float)
+                Increase in age, in days
+
+        Returns:
+            dead (list)
+                Removed individuals
+        '''
+        alive = []
+        dead = []
+        for x in self._individuals:
+            x.change_age(time_step)
+            if x.is_alive():
+                alive.append(x)
+            else:
+                dead.append(x)
+        self._individuals = alive
+        return dead
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+
+def _t_quantile(q, df):
+    # Student's t quantile (scipy is only needed for the intervals)
+    from scipy import stats
+
+    return float(stats.t.ppf(q, df))
+
+
+def _value(x):
+    # empty cells are undefined values (e.g. frequencies in an empty cage)
+    return float(x) if x != '' else np.nan
+
+
+class Target():
+    '''Statistic computed on each repetition of a scenario
+
+    Targets are given as a column of the simulation output
+    (see `large_cage.agent.get_header`) and are measured
+    at the last time point, unless a time is given after an "@".
+    The special "suppression" target is the first time at which
+    the cage is empty (the last time point if it is never reached)
+
+    Example: final drive frequency, eggs at day 30 and time to suppression
+    >>> targets = [Target('drives', 0.05),
+    ...            Target('eggs@30', 500),
+    ...            Target('suppression', 10)]
+
+    Args:
+        spec (str)
+            Target specification
+        tolerance (float)
+            Maximum width of the confidence interval of the mean
+    '''
+    def __init__(self, spec, tolerance):
+        self.spec = spec
+        self.tolerance = float(tolerance)
+        column, _, time = spec.partition('@')
+        self.column = column
+        self.time = float(time) if time else None
+
+    def __repr__(self):
+        return f'Target({self.spec!r}, {self.tolerance})'
+
+    def value(self, rows):
+        '''Value of the target in a single repetition
+
+        Args:
+            rows (list)
+                Output of the repetition, as a list of dicts
+                (column -> value, as strings), in time order
+
+        Returns:
+            value (float)
+                Target value, NaN if undefined
+        '''
+        if self.column == 'suppression':
+            for row in rows:
+                if row['pop'] == '0':
+                    return float(row['time'])
+            return float(rows[-1]['time'])
+        if self.time is None:
+            return _value(rows[-1][self.column])
+        for row in rows:
+            if float(row['time']) >= self.time:
+                return _value(row[self.column])
+        return np.nan
+
+
+class SequentialStopping():
+    '''Decide how many repetitions of a scenario are needed
+
+    Repetitions are added in steps until the confidence interval of the
+    mean of every target is narrower than its tolerance, or the maximum
+    number of repetitions is reached. Undefined values are ignored;
+    a target without any defined value is considered converged
+
+    Example:
+    >>> stopping = SequentialStopping([Target('drives', 0.05)])
+    >>> while not stopping.done():
+    ...     for rows in run(stopping.next_step()):
+    ...         stopping.add(rows)
+
+    Args:
+        targets (iterable)
+            Targets, see `Target`
+        confidence (float)
+            Confidence level of the intervals
+        min_repeats (int)
+            Minimum number of repetitions
+        max_repeats (int)
+            Maximum number of repetitions
+        step (int)
+            Repetitions added at each step
+    '''
+    def __init__(self, targets, confidence=0.95,
+                 min_repeats=10, max_repeats=50, step=10):
+        self.targets = list(targets)
+        self.confidence = confidence
+        self.min_repeats = min_repeats
+        self.max_repeats = max(max_repeats, 1)
+        self.step = max(step, 1)
+        self.values = [[] for _ in self.targets]
+        self.added = 0
+
+    @property
+    def repeats(self):
+        '''Number of repetitions added so far'''
+        return self.added
+
+    def add(self, rows):
+        '''Add a repetition
+
+        Args:
+            rows (list)
+                Output of the repetition, see `Target.value`
+        '''
+        for target, values in zip(self.targets, self.values):
+            values.append(target.value(rows))
+        self.added += 1
+
+    def interval(self, i):
+        '''Confidence interval of the mean of a target
+
+        Args:
+            i (int)
+                Target index
+
+        Returns:
+            mean (float)
+                Mean of the defined values
+            low (float)
+                Lower bound
+            high (float)
+                Upper bound
+        '''
+        values = np.array(self.values[i], dtype=float)
+        values = values[~np.isnan(values)]
+        n = values.shape[0]
+        if n == 0:
+            return np.nan, np.nan, np.nan
+        mean = values.mean()
+        if n == 1:
+            return mean, -np.inf, np.inf
+        t = _t_quantile(1 - (1 - self.confidence) / 2, n - 1)
+        half = t * values.std(ddof=1) / np.sqrt(n)
+        return mean, mean - half, mean + half
+
+    def converged(self, i):
+        '''Wether the interval of a target is narrower than its tolerance
+
+        Args:
+            i (int)
+                Target index
+
+        Returns:
+            converged (bool)
+        '''
+        mean, low, high = self.interval(i)
+        if np.isnan(mean):
+            return True
+        return high - low <= self.targets[i].tolerance
+
+    def done(self):
+        '''Wether no more repetitions are needed
+
+        Returns:
+            done (bool)
+        '''
+        n = self.repeats
+        if n >= self.max_repeats:
+            return True
+        if n < self.min_repeats or not self.targets:
+            return False
+        return all(self.converged(i) for i in range(len(self.targets)))
+
+    def next_step(self):
+        '''Repetitions to add next
+
+        Returns:
+            repeats (int)
+                Number of repetitions, 0 if done
+        '''
+        if self.done():
+            return 0
+        n = self.repeats
+        return min(max(self.step, self.min_repeats - n),
+                   self.max_repeats - n)
+
+    def summary(self):
+        '''Outcome of each target
+
+        Returns:
+            rows (list)
+                (target, tolerance, repeats, mean, low, high, converged)
+        '''
+        return [(target.spec, target.tolerance, self.repeats) +
+                self.interval(i) + (self.converged(i),)
+                for i, target in enumerate(self.targets)]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import numpy as np
+from multiprocessing import Pool
+
+from large_cage.agent import set_seed
+from large_cage.agent import get_simulation
+from large_cage.agent import get_values
+from large_cage.agent import get_observables
+
+
+class Score():
+    '''Score of a simulation, measured on an output column
+
+    Example: the drive frequency falling towards zero after day 10
+    >>> score = Score('drives', [0.1, 0.05, 0.02, 0], direction='down',
+    ...               after=10)
+
+    Args:
+        column (str)
+            Output column (see `large_cage.agent.get_header`)
+        levels (iterable)
+            Intermediate levels, in the order they are crossed;
+            the last one defines the rare event
+        direction (str)
+            "down" if levels are crossed when the column falls below
+            them (e.g. drive loss), "up" when it rises above them
+            (e.g. wild-type rebound)
+        after (float)
+            Only consider the score from this day on
+    '''
+    def __init__(self, column, levels, direction='down', after=0):
+        if direction not in ('down', 'up'):
+            raise ValueError(f'Unknown direction: {direction}')
+        self.column = column
+        self.levels = [float(x) for x in levels]
+        self.direction = direction
+        self.after = float(after)
+        if len(self.levels) == 0:
+            raise ValueError('Please provide at least one level')
+        ordered = sorted(self.levels, reverse=direction == 'down')
+        if ordered != self.levels:
+            raise ValueError('Levels should be in the order they are crossed')
+
+    def value(self, record, observables):
+        '''Value of the score for a record
+
+        Args:
+            record (dict)
+                See `large_cage.agent.get_record`
+            observables (Observables)
+                Observables of the score column
+
+        Returns:
+            value (float)
+                NaN if undefined (e.g. empty cage)
+        '''
+        return get_values(record, observables)[0]
+
+    def crossed(self, value, level):
+        '''Number of levels crossed by a value, starting from a level'''
+        if np.isnan(value):
+            return level
+        while level < len(self.levels):
+            if self.direction == 'down' and value > self.levels[level]:
+                break
+            if self.direction == 'up' and value < self.levels[level]:
+                break
+            level += 1
+        return level
+
+
+def _advance(sim, score, observables, level):
+    # run until new levels are crossed, or the simulation ends
+    days = 0.
+    while sim.running():
+        before = sim.total_time
+        report = sim.step()
+        days += sim.total_time - before
+        if not report or sim.total_time < score.after:
+            continue
+        value = score.value(sim.record(), observables)
+        crossed = score.crossed(value, level)
+        if crossed > level:
+            return crossed, sim.total_time, days
+    return level, None, days
+
+
+def split(p, score, splits=4, repetition=0):
+    '''Multilevel splitting from a single start
+
+    The simulation is run until it crosses the next level of the
+    score, at which point it is cloned into `splits` branches
+    (for each level crossed), each carrying a fraction of the weight
+    and continuing with its own random numbers; branches stop once they
+    reach the last level (the rare event) or the simulation ends
+
+    Args:
+        p (dict)
+            Parameters
+        score (Score)
+            Score and levels
+        splits (int)
+            Branches at each level
+        repetition (int)
+            Round of simulation
+
+    Returns:
+        result (dict)
+            weight: the weight of the branches reaching the rare event
+            (an unbiased estimate of its probability), reached: weight of
+            the branches reaching each level, branches: number of
+            branches reaching each level, times: (time, weight) of the
+            rare events, days: days simulated across all branches
+    '''
+    observables = get_observables([score.column], p)
+    levels = len(score.levels)
+    reached = [0.] * levels
+    branches = [0] * levels
+    times = []
+    days = 0.
+    # depth first, to keep few simulations in memory
+    stack = [(get_simulation(p, repetition=repetition,
+                             observables=observables), 0, 1.)]
+    while stack:
+        sim, level, weight = stack.pop()
+        crossed, time, simulated = _advance(sim, score, observables, level)
+        days += simulated
+        if crossed == level:
+            continue
+        for k in range(level, crossed):
+            reached[k] += weight
+            branches[k] += 1
+        if crossed == levels:
+            times.append((time, weight))
+            continue
+        n = splits ** (crossed - level)
+        weight /= n
+        stack.extend((sim.clone(), crossed, weight) for _ in range(n - 1))
+        stack.append((sim, crossed, weight))
+    return {'weight': reached[-1], 'reached': reached, 'branches': branches,
+            'times': times, 'days': days}
+
+
+def _split(args):
+    p, score, splits, repetition, seed = args
+    set_seed(seed)
+    return split(p, score, splits=splits, repetition=repetition)
+
+
+def _silence():
+    # simulations report events on stderr
+    sys.stderr = open(os.devnull, 'w')
+
+
+def estimate(p, score, repeats=100, splits=4, seed=None, jobs=1):
+    '''Probability of a rare event through multilevel splitting
+
+    Each start is seeded independently, without common random
+    numbers, so that the branches of a clone diverge
+
+    Args:
+        p (dict)
+            Parameters
+        score (Score)
+            Score and levels, the last one defining the rare event
+        repeats (int)
+            Independent starts
+        splits (int)
+            Branches at each level
+        seed (int)
+            Random seed (default: random)
+        jobs (int)
+            Number of parallel processes
+
+    Returns:
+        probability (float)
+            Estimated probability of the rare event
+        sem (float)
+            Standard error of the estimate
+        levels (list)
+            (level, probability of reaching it, branches reaching it)
+        days (float)
+            Days simulated across all branches
+        results (list)
+            Results of each start, see `split`
+    '''
+    # one seed for each start
+    rng = np.random.default_rng(seed)
+    seeds = rng.integers(0, 2 ** 32, size=repeats)
+    args = [(p, score, splits, j, int(seeds[j])) for j in range(repeats)]
+    if jobs > 1:
+        with Pool(jobs, initializer=_silence) as pool:
+            results = pool.map(_split, args)
+    else:
+        results = [_split(x) for x in args]
+    weights = np.array([x['weight'] for x in results])
+    probability = weights.mean()
+    sem = (weights.std(ddof=1) / np.sqrt(repeats)
+           if repeats > 1 else np.nan)
+    levels = [(level,
+               np.mean([x['reached'][k] for x in results]),
+               sum(x['branches'][k] for x in results))
+              for k, level in enumerate(score.levels)]
+    days = sum(x['days'] for x in results)
+    return probability, sem, levels, days, results
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import sqlite3
+
+# columns identifying each record
+INDEX = ['size', 'scenario', 'cage', 'round', 'time']
+
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+def _value(x):
+    # output cells as stored: numbers, booleans as 0/1,
+    # empty cells (undefined frequencies) as NULL
+    if x == '' or x is None:
+        return None
+    if x == 'True':
+        return 1
+    if x == 'False':
+        return 0
+    return float(x)
+
+
+def get_labels(fname):
+    '''Scenario labels of an output, from its path
+
+    Outputs follow the layout of the `snakemake` rules:
+    `{out,raw}/{size}/{scenario}/{cage}[_{repeat}].tsv`, and
+    `sweeps/{out,raw}/{sweep}/{point}[_{repeat}].tsv`
+    (labelled as size "sweeps", scenario {sweep} and cage {point})
+
+    Args:
+        fname (str)
+            Output file
+
+    Returns:
+        size (str)
+        scenario (str)
+        cage (str)
+        repeat (int)
+            Repeat of a raw output, None for collated outputs
+
+    Raises:
+        ValueError
+            If the path does not follow the layout
+    '''
+    parts = os.path.normpath(fname).split(os.sep)
+    name = os.path.splitext(parts[-1])[0]
+    if len(parts) >= 4 and parts[-4] == 'sweeps' and \
+            parts[-3] in ('out', 'raw'):
+        kind, size, scenario = parts[-3], 'sweeps', parts[-2]
+    elif len(parts) >= 4 and parts[-4] in ('out', 'raw'):
+        kind, size, scenario = parts[-4], parts[-3], parts[-2]
+    else:
+        raise ValueError(f'Cannot find the scenario of {fname}')
+    repeat = None
+    if kind == 'raw':
+        name, _, repeat = name.rpartition('_')
+        if not repeat.isdigit():
+            raise ValueError(f'Cannot find the repeat of {fname}')
+        repeat = int(repeat)
+    return size, scenario, name, repeat
+
+
+class ResultStore():
+    '''Indexed store of simulation outputs (SQLite database)
+
+    Each scenario (size, scenario and cage) is stored once, with its
+    parameters; its records are stored in a single table, indexed by
+    scenario, round and time, with one column per output column
+    (see `large_cage.agent.get_header`), added as new ones are seen.
+    Queries thus only read the relevant scenarios and time points.
+    Writes are done in a single transaction, so that the store can be
+    shared by concurrent jobs on the same machine
+
+    Example: drive frequency at day 300 for all antidote release scenarios
+    >>> store = ResultStore('results.sqlite')
+    >>> store.put('bugdorm', 'release_500_0.10', 'antidote', header, rows)
+    >>> df = store.query(['drives'], scenario='release_*_*',
+    ...                  cage='antidote', time=300)
+
+    Args:
+        path (str)
+            Database file (created if needed)
+        timeout (float)
+            Seconds to wait for other writers
+    '''
+    def __init__(self, path, timeout=600):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout,
+                                  isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS runs (
+                               id INTEGER PRIMARY KEY,
+                               size TEXT NOT NULL,
+                               scenario TEXT NOT NULL,
+                               cage TEXT NOT NULL,
+                               parameters TEXT,
+                               added REAL,
+                               UNIQUE (size, scenario, cage))''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS records (
+                               run INTEGER NOT NULL,
+                               round INTEGER NOT NULL,
+                               time REAL NOT NULL)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS records_round
+                           ON records (run, round, time)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS records_time
+                           ON records (run, time)''')
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def columns(self):
+        '''Output columns found in the store
+
+        Returns:
+            columns (list)
+                Column names, in the order they were added
+        '''
+        return [row[1] for row in self.db.execute('PRAGMA table_info(records)')
+                if row[1] not in ('run', 'round', 'time')]
+
+    def _add_columns(self, header):
+        known = set(self.columns())
+        for column in header:
+            if column not in known and column not in INDEX:
+                self.db.execute(f'ALTER TABLE records ADD COLUMN '
+                                f'{_quote(column)} REAL')
+                known.add(column)
+
+    def put(self, size, scenario, cage, header, rows, parameters=None):
+        '''Store the output of a scenario
+
+        Rounds already stored for this scenario are replaced,
+        other rounds are kept
+
+        Args:
+            size (str)
+                Cage size (e.g. "bugdorm")
+            scenario (str)
+                Scenario (e.g. "base")
+            cage (str)
+                Cage (e.g. "antidote")
+            header (list)
+                Output columns, including "round" and "time"
+            rows (iterable)
+                Output rows, as lists of strings (or numbers)
+                in the order of the header
+            parameters (dict)
+                Parameters of the scenario (stored as JSON)
+
+        Returns:
+            records (int)
+                Number of records stored
+        '''
+        iround = header.index('round')
+        itime = header.index('time')
+        columns = [(i, c) for i, c in enumerate(header)
+                   if c not in ('round', 'time')]
+        records = [[int(float(row[iround])), float(row[itime])] +
+                   [_value(row[i]) for i, _ in columns]
+                   for row in rows]
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self._add_columns([c for _, c in columns])
+            self.db.execute('''INSERT OR IGNORE INTO runs
+                               (size, scenario, cage) VALUES (?, ?, ?)''',
+                            (size, scenario, cage))
+            run = self.db.execute('''SELECT id FROM runs WHERE size = ?
+                                     AND scenario = ? AND cage = ?''',
+                                  (size, scenario, cage)).fetchone()[0]
+            self.db.execute('UPDATE runs SET added = ? WHERE id = ?',
+                            (time.time(), run))
+            if parameters is not None:
+                self.db.execute('UPDATE runs SET parameters = ? '
+                                'WHERE id = ?',
+                                (json.dumps(parameters, sort_keys=True,
+                                            default=repr), run))
+            self.db.executemany('DELETE FROM records '
+                                'WHERE run = ? AND round = ?',
+                                [(run, r) for r in
+                                 sorted({x[0] for x in records})])
+            names = ', '.join(['run', 'round', 'time'] +
+                              [_quote(c) for _, c in columns])
+            marks = ', '.join(['?'] * (len(columns) + 3))
+            self.db.executemany(f'INSERT INTO records ({names}) '
+                                f'VALUES ({marks})',
+                                ([run] + x for x in records))
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return len(records)
+
+    def put_table(self, size, scenario, cage, fname, round=None,
+                  parameters=None):
+        '''Store an output file (tsv format)
+
+        Args:
+            size (str)
+            scenario (str)
+            cage (str)
+                Scenario labels, see `put`
+            fname (str)
+                Output file
+            round (int)
+                Round of all the records (e.g. the repeat of a raw output),
+                default: use the "round" column
+            parameters (dict)
+                Parameters of the scenario
+
+        Returns:
+            records (int)
+                Number of records stored
+        '''
+        with open(fname) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            rows = [line.rstrip('\n').split('\t') for line in f
+                    if line.strip()]
+        if round is not None:
+            iround = header.index('round')
+            for row in rows:
+                row[iround] = round
+        return self.put(size, scenario, cage, header, rows,
+                        parameters=parameters)
+
+    def _where(self, size=None, scenario=None, cage=None):
+        clauses = []
+        args = []
+        for name, value in (('size', size), ('scenario', scenario),
+                            ('cage', cage)):
+            if value is None:
+                continue
+            if isinstance(value, str):
+                value = [value]
+            # patterns use shell wildcards (*, ?, [...])
+            clauses.append('(' + ' OR '.join([f'runs.{name} GLOB ?'] *
+                                             len(value)) + ')')
+            args.extend(value)
+        return clauses, args
+
+    def scenarios(self, size=None, scenario=None, cage=None):
+        '''Scenarios in the store
+
+        Args:
+            size (str or list)
+            scenario (str or list)
+            cage (str or list)
+                Only return matching scenarios, see `query`
+
+        Returns:
+            scenarios (pandas.DataFrame)
+                Size, scenario, cage, number of rounds and records,
+                and the time at which they were last stored
+        '''
+        import pandas as pd
+
+        clauses, args = self._where(size, scenario, cage)
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        sql = f'''SELECT size, scenario, cage,
+                         COUNT(DISTINCT round) AS rounds,
+                         COUNT(round) AS records, added
+                  FROM runs LEFT JOIN records ON records.run = runs.id
+                  {where}
+                  GROUP BY runs.id
+                  ORDER BY size, scenario, cage'''
+        return pd.read_sql_query(sql, self.db, params=args)
+
+    def parameters(self, size, scenario, cage):
+        '''Stored parameters of a scenario
+
+        Returns:
+            p (dict)
+                Parameters, None if not stored
+        '''
+        row = self.db.execute('''SELECT parameters FROM runs WHERE size = ?
+                                 AND scenario = ? AND cage = ?''',
+                              (size, scenario, cage)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def query(self, columns=None, size=None, scenario=None, cage=None,
+              round=None, time=None):
+        '''Records of the matching scenarios
+
+        Args:
+            columns (list)
+                Output columns to return (default: all of them)
+            size (str or list)
+            scenario (str or list)
+            cage (str or list)
+                Scenarios to return, as shell-like patterns
+                (e.g. "release_*_*"), or lists of patterns
+                (default: all)
+            round (int or list)
+                Rounds to return (default: all)
+            time (float or tuple)
+                Time point to return, or (start, end) interval
+                (both included, either can be None)
+
+        Returns:
+            records (pandas.DataFrame)
+                Size, scenario, cage, round, time and the requested
+                columns, sorted in that order; undefined values are NaN
+        '''
+        import pandas as pd
+
+        if columns is None:
+            columns = self.columns()
+        unknown = set(columns) - set(self.columns())
+        if unknown:
+            raise ValueError('Unknown columns: ' +
+                             ', '.join(sorted(unknown)))
+        clauses, args = self._where(size, scenario, cage)
+        if round is not None:
+            if isinstance(round, int):
+                round = [round]
+            clauses.append('records.round IN (%s)' %
+                           ', '.join(['?'] * len(round)))
+            args.extend(int(x) for x in round)
+        if isinstance(time, (tuple, list)):
+            start, end = time
+            if start is not None:
+                clauses.append('records.time >= ?')
+                args.append(float(start))
+            if end is not None:
+                clauses.append('records.time <= ?')
+                args.append(float(end))
+        elif time is not None:
+            clauses.append('records.time = ?')
+            args.append(float(time))
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        names = ', '.join(['runs.size', 'runs.scenario', 'runs.cage',
+                           'records.round', 'records.time'] +
+                          [f'records.{_quote(c)}' for c in columns])
+        sql = f'''SELECT {names}
+                  FROM runs JOIN records ON records.run = runs.id
+                  {where}
+                  ORDER BY runs.size, runs.scenario, runs.cage,
+                           records.round, records.time'''
+        df = pd.read_sql_query(sql, self.db, params=args)
+        df.columns = INDEX + list(columns)
+        return df
+
+    def remove(self, size=None, scenario=None, cage=None):
+        '''Remove the matching scenarios
+
+        Returns:
+            removed (int)
+                Number of scenarios removed
+        '''
+        clauses, args = self._where(size, scenario, cage)
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            runs = [x[0] for x in
+                    self.db.execute(f'SELECT id FROM runs {where}', args)]
+            self.db.executemany('DELETE FROM records WHERE run = ?',
+                                [(x,) for x in runs])
+            self.db.executemany('DELETE FROM runs WHERE id = ?',
+                                [(x,) for x in runs])
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        return len(runs)
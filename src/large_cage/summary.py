@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import json
+import warnings
+import numpy as np
+from collections import namedtuple
+
+# replicate outputs as a (round x time x column) array
+Runs = namedtuple('Runs', ['columns', 'times', 'values'])
+
+
+def read_runs(fname):
+    '''Load replicate outputs as a 3D array
+
+    Args:
+        fname (str)
+            Model's output, with a "round" and a "time" column (tsv format),
+            or an array saved by `save_runs` (.npy), which is memory-mapped
+
+    Returns:
+        runs (Runs)
+            Column names, times and values (rounds x times x columns);
+            missing values are NaN
+    '''
+    if fname.endswith('.npy'):
+        with open(fname[:-4] + '.json') as f:
+            meta = json.load(f)
+        return Runs(meta['columns'], np.array(meta['times']),
+                    np.load(fname, mmap_mode='r'))
+
+    import pandas as pd
+
+    m = pd.read_csv(fname, sep='\t')
+    columns = [x for x in m.columns if x not in ('round', 'time')]
+    rounds, r = np.unique(m['round'].values, return_inverse=True)
+    times, t = np.unique(m['time'].values, return_inverse=True)
+    values = np.full((rounds.shape[0], times.shape[0], len(columns)),
+                     np.nan)
+    values[r, t] = m[columns].values.astype(float)
+    return Runs(columns, times, values)
+
+
+def save_runs(runs, fname):
+    '''Save replicate outputs, to be memory-mapped by `read_runs`
+
+    Args:
+        runs (Runs)
+            Replicate outputs
+        fname (str)
+            Output array (.npy), the column names and times
+            are saved alongside (.json)
+    '''
+    np.save(fname, runs.values)
+    with open(fname[:-4] + '.json', 'w') as f:
+        json.dump({'columns': list(runs.columns),
+                   'times': runs.times.tolist()}, f)
+
+
+def _quantile(x, q):
+    # quantiles along the first axis, only using
+    # the (slow) NaN-aware version where values are missing
+    missing = np.isnan(x)
+    partial = missing.any(axis=0) & ~missing.all(axis=0)
+    res = np.quantile(np.where(missing, 0, x), q, axis=0)
+    res[:, missing.all(axis=0)] = np.nan
+    if partial.any():
+        res[:, partial] = np.nanquantile(x[:, partial], q, axis=0)
+    return res
+
+
+def bootstrap_weights(rounds, bootstrap, seed=None):
+    '''How many times each round is drawn in each bootstrap sample
+
+    Args:
+        rounds (int)
+            Number of rounds
+        bootstrap (int)
+            Number of bootstrap samples
+        seed (int)
+            Random seed
+
+    Returns:
+        weights (numpy.array)
+            Counts (bootstrap x rounds)
+    '''
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(rounds, np.full(rounds, 1 / rounds),
+                           size=bootstrap).astype(float)
+
+
+def summarise(values, quantiles=(), weights=None, confidence=0.95):
+    '''Summary statistics across rounds
+
+    The MAD is the median absolute deviation from the median;
+    confidence intervals of the mean use the percentile bootstrap,
+    each bootstrap mean being computed as a weighted average of
+    all rounds (so that all samples are computed at once)
+
+    Args:
+        values (numpy.array)
+            Values (rounds x times x columns), missing values are NaN
+        quantiles (iterable)
+            Quantiles to report, in [0, 1]
+        weights (numpy.array)
+            Bootstrap weights (samples x rounds, see `bootstrap_weights`),
+            None to skip confidence intervals
+        confidence (float)
+            Confidence level of the intervals
+
+    Returns:
+        stats (dict)
+            Statistic name -> values (times x columns)
+    '''
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    stats = {}
+    with warnings.catch_warnings():
+        # all values missing, reported as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        stats['mean'] = np.nanmean(values, axis=0)
+        median = _quantile(values, [0.5])[0]
+        stats['median'] = median
+        stats['MAD'] = _quantile(np.abs(values - median), [0.5])[0]
+        quantiles = list(quantiles)
+        if quantiles:
+            for q, res in zip(quantiles, _quantile(values, quantiles)):
+                stats[f'q{q:g}'] = res
+        if weights is not None:
+            shape = values.shape[1:]
+            flat = np.where(missing, 0, values).reshape(values.shape[0], -1)
+            present = (~missing).reshape(values.shape[0], -1)
+            means = (weights @ flat) / (weights @ present)
+            means = means.reshape((weights.shape[0],) + shape)
+            alpha = (1 - confidence) / 2
+            low, high = _quantile(means, [alpha, 1 - alpha])
+            stats['ci_low'] = low
+            stats['ci_high'] = high
+    return stats
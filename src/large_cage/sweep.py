@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+import itertools
+import numpy as np
+
+from large_cage.parameters import read_yaml
+from large_cage.parameters import resolve_parameters
+
+
+class Sweep():
+    '''Parameters sweep, expanded lazily in memory
+
+    A sweep is defined by a base parameters file, a set of fixed
+    overrides and a series of blocks; the points of the sweep
+    are the cartesian product of the points of each block.
+    Parameter names can be dot-separated paths
+    (see `large_cage.parameters.set_parameter`).
+
+    Supported blocks:
+    - grid: cartesian product of all values
+    - zip: values are taken in parallel
+    - lhs: latin hypercube sample within ranges
+    - sobol: scrambled Sobol sample within ranges
+
+    Ranges are given as [low, high]; if both are integers
+    the sampled values are rounded to integers.
+
+    Example: (YAML)
+    base: ../bugdorm/base/antidote.yaml
+    set: {END_TIME: 500}
+    name: 'release_{RELEASE}_{LATE_RELEASES_DRIVE_FREQUENCY:.2f}'
+    sweep:
+      - zip:
+          RELEASE: [500, 1000]
+          RELEASE_WT.0: [500, 1000]
+      - grid:
+          LATE_RELEASES_DRIVE_FREQUENCY: [0.1, 0.2, 0.3]
+      - lhs:
+          n: 10
+          seed: 42
+          ranges:
+            MATING_PROBABILITY: [0.1, 0.9]
+
+    Each point has a stable identifier: either the "name" template
+    formatted with the point's values (dots in parameter names are
+    replaced by underscores), or a hash of the values
+    '''
+    def __init__(self, spec, root='.'):
+        '''Create a new sweep
+
+        Args:
+            spec (dict)
+                Sweep specification
+            root (str)
+                Directory used to resolve the base file path
+        '''
+        self.spec = spec
+        base = spec.get('base')
+        if base is not None:
+            base = read_yaml(os.path.join(root, base))
+        else:
+            base = {}
+        # parse the base file only once
+        self.base = resolve_parameters(base)
+        self.base = resolve_parameters(spec.get('set', {}),
+                                       p=self.base)
+        self.name = spec.get('name')
+        self.blocks = [_parse_block(b) for b in spec.get('sweep', [])]
+
+    def __len__(self):
+        n = 1
+        for block in self.blocks:
+            n *= len(block)
+        return n
+
+    def __iter__(self):
+        '''Iterate over all points
+
+        Yields:
+            point_id (str)
+                Stable identifier of the point
+            p (dict)
+                Resolved parameters for the point
+        '''
+        for point_id, overrides in self.points():
+            yield point_id, resolve_parameters(overrides, p=self.base)
+
+    def points(self):
+        '''Iterate over all points, without resolving parameters
+
+        Yields:
+            point_id (str)
+                Stable identifier of the point
+            overrides (dict)
+                Values for the point
+        '''
+        for values in itertools.product(*self.blocks):
+            overrides = {}
+            for v in values:
+                overrides.update(v)
+            yield self.point_id(overrides), overrides
+
+    def point_id(self, overrides):
+        '''Stable identifier for a set of values
+
+        Args:
+            overrides (dict)
+                Values for a point
+
+        Returns:
+            point_id (str)
+                Point identifier
+        '''
+        if self.name is not None:
+            return self.name.format(**{k.replace('.', '_'): v
+                                       for k, v in overrides.items()})
+        h = hashlib.sha1(json.dumps(overrides, sort_keys=True).encode())
+        return h.hexdigest()[:12]
+
+    def get(self, point):
+        '''Resolve the parameters of a single point
+
+        Args:
+            point (str or int)
+                Point identifier or index
+
+        Returns:
+            p (dict)
+                Resolved parameters for the point
+        '''
+        for i, (point_id, overrides) in enumerate(self.points()):
+            if point_id == str(point) or (isinstance(point, int) and
+                                          i == point):
+                return resolve_parameters(overrides, p=self.base)
+        raise KeyError(point)
+
+
+def _parse_block(block):
+    if len(block) != 1:
+        raise ValueError(f'Each sweep block should have a single type: {block}')
+    kind, values = list(block.items())[0]
+    if kind == 'grid':
+        keys = list(values)
+        return [dict(zip(keys, x))
+                for x in itertools.product(*[values[k] for k in keys])]
+    elif kind == 'zip':
+        keys = list(values)
+        if len({len(values[k]) for k in keys}) > 1:
+            raise ValueError(f'All values in a zip block should have the same length: {keys}')
+        return [dict(zip(keys, x))
+                for x in zip(*[values[k] for k in keys])]
+    elif kind in ('lhs', 'sobol'):
+        return _sample_block(kind, values)
+    raise ValueError(f'{kind} sweep not implemented yet')
+
+
+def _sample_block(kind, values):
+    from scipy.stats import qmc
+
+    keys = list(values['ranges'])
+    lows = np.array([values['ranges'][k][0] for k in keys], dtype=float)
+    highs = np.array([values['ranges'][k][1] for k in keys], dtype=float)
+    if kind == 'lhs':
+        sampler = qmc.LatinHypercube(len(keys), seed=values.get('seed'))
+    else:
+        sampler = qmc.Sobol(len(keys), seed=values.get('seed'))
+    samples = qmc.scale(sampler.random(int(values['n'])), lows, highs)
+
+    points = []
+    for sample in samples:
+        point = {}
+        for k, v in zip(keys, sample):
+            low, high = values['ranges'][k]
+            if isinstance(low, int) and isinstance(high, int):
+                point[k] = int(round(v))
+            else:
+                point[k] = float(v)
+        points.append(point)
+    return points
+
+
+def load_sweep(fname):
+    '''Load a sweep specification
+
+    Args:
+        fname (str)
+            Path to the YAML specification; the base
+            file path is relative to its directory
+
+    Returns:
+        sweep (Sweep)
+            The sweep
+    '''
+    return Sweep(read_yaml(fname),
+                 root=os.path.dirname(fname))
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import hashlib
+import tempfile
+import subprocess
+
+
+def _write_json(fname, content):
+    # atomic, so that readers never see a partial file
+    tmp = f'{fname}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(content, f)
+    os.replace(tmp, fname)
+
+
+def _read_json(fname):
+    try:
+        with open(fname) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def get_unit(output, args, priority=0.):
+    '''A unit of work: one simulation, written to one output
+
+    Args:
+        output (str)
+            Output file (relative to the working directory)
+        args (list)
+            Arguments of `src/simulation.py` (e.g. parameters and seed)
+        priority (float)
+            Units with a higher priority are claimed first
+            (e.g. their predicted runtime, to run the longest first)
+
+    Returns:
+        unit (dict)
+            id (a hash of the output), output, args and priority
+    '''
+    return {'id': hashlib.sha1(output.encode()).hexdigest()[:20],
+            'output': output,
+            'args': list(args),
+            'priority': float(priority)}
+
+
+class Lease():
+    '''Exclusive claim on a unit, to be renewed while it runs
+
+    Args:
+        fname (str)
+            Lease file
+        owner (str)
+            Worker holding the lease
+        duration (float)
+            Seconds after which the lease expires unless renewed
+    '''
+    def __init__(self, fname, owner, duration):
+        self.fname = fname
+        self.owner = owner
+        self.duration = duration
+        self.token = uuid.uuid4().hex
+
+    def content(self):
+        return {'owner': self.owner, 'token': self.token,
+                'expires': time.time() + self.duration}
+
+    def acquire(self):
+        '''Create the lease file, if no one else holds it
+
+        Returns:
+            acquired (bool)
+        '''
+        tmp = f'{self.fname}.{self.token}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.content(), f)
+        try:
+            # hard links are created atomically, also over NFS
+            os.link(tmp, self.fname)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def held(self):
+        '''Wether the lease is still ours'''
+        lease = _read_json(self.fname)
+        return lease is not None and lease.get('token') == self.token
+
+    def renew(self):
+        '''Extend the lease
+
+        Returns:
+            renewed (bool)
+                False if the lease has been lost (e.g. recovered by
+                another worker after expiring)
+        '''
+        if not self.held():
+            return False
+        _write_json(self.fname, self.content())
+        return True
+
+    def release(self):
+        '''Remove the lease file, if still ours'''
+        if self.held():
+            try:
+                os.remove(self.fname)
+            except FileNotFoundError:
+                pass
+
+
+class WorkQueue():
+    '''Queue of simulations on a shared file system
+
+    Units (see `get_unit`) are stored as files in the queue directory;
+    any number of workers, on any machine sharing the file system,
+    claim them through lease files, which they renew while running.
+    Leases that are not renewed (e.g. the worker's machine went down)
+    expire and their units are claimed again. Outputs are written to a
+    temporary file and moved in place once complete, and a unit is done
+    once its output exists, so that running a unit twice is harmless.
+    There is no central service: adding workers scales the throughput
+
+    Example:
+    >>> q = WorkQueue('.queue')
+    >>> q.submit([get_unit('raw/bugdorm/base/antidote_0.tsv',
+    ...                    ['--parameters', 'parameters/bugdorm/base/antidote.yaml',
+    ...                     '--seed', '0'])])
+    >>> q.work()
+
+    Args:
+        path (str)
+            Queue directory (created if needed)
+        lease (float)
+            Lease duration, in seconds; leases are renewed three times
+            per duration, which should be much longer than any clock
+            difference between machines
+        max_attempts (int)
+            Failed units are retried up to this number of times
+    '''
+    def __init__(self, path, lease=600, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        for d in ('units', 'leases', 'failed'):
+            os.makedirs(os.path.join(path, d), exist_ok=True)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def _unit_fname(self, unit_id):
+        return os.path.join(self.path, 'units', f'{unit_id}.json')
+
+    def _lease_fname(self, unit_id):
+        return os.path.join(self.path, 'leases', f'{unit_id}.lease')
+
+    def _failed_fname(self, unit_id):
+        return os.path.join(self.path, 'failed', f'{unit_id}.json')
+
+    def submit(self, units):
+        '''Add units to the queue (units already there are overwritten)
+
+        Args:
+            units (iterable)
+                See `get_unit`
+
+        Returns:
+            submitted (int)
+                Number of units
+        '''
+        n = 0
+        for unit in units:
+            _write_json(self._unit_fname(unit['id']), unit)
+            n += 1
+        return n
+
+    def units(self):
+        '''All units in the queue
+
+        Returns:
+            units (list)
+                See `get_unit`, highest priority first
+        '''
+        units = []
+        for f in os.listdir(os.path.join(self.path, 'units')):
+            if f.endswith('.json'):
+                unit = _read_json(os.path.join(self.path, 'units', f))
+                if unit is not None:
+                    units.append(unit)
+        return sorted(units, key=lambda x: (-x['priority'], x['id']))
+
+    def done(self, unit):
+        '''Wether the output of a unit exists'''
+        return os.path.exists(unit['output'])
+
+    def attempts(self, unit):
+        '''Failed attempts of a unit'''
+        failed = _read_json(self._failed_fname(unit['id']))
+        return 0 if failed is None else failed['attempts']
+
+    def claim(self, unit):
+        '''Try to claim a unit, recovering an expired lease
+
+        Args:
+            unit (dict)
+                See `get_unit`
+
+        Returns:
+            lease (Lease)
+                None if the unit is held by another worker
+        '''
+        fname = self._lease_fname(unit['id'])
+        lease = Lease(fname, self.owner, self.lease)
+        if lease.acquire():
+            return lease
+        current = _read_json(fname)
+        if current is None or current['expires'] > time.time():
+            return None
+        # expired: move it away (only one worker can), check that
+        # it was indeed the expired lease, then claim the unit
+        stale = f'{fname}.{lease.token}.stale'
+        try:
+            os.rename(fname, stale)
+        except FileNotFoundError:
+            return None
+        moved = _read_json(stale)
+        if (moved is None or moved.get('token') != current['token'] or
+                moved['expires'] > time.time()):
+            # renewed in the meantime, or another worker's fresh lease:
+            # put it back
+            try:
+                os.link(stale, fname)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return None
+        os.remove(stale)
+        sys.stderr.write(f'Recovering {unit["output"]} '
+                         f'(lease of {current["owner"]} expired)\n')
+        return lease if lease.acquire() else None
+
+    def run(self, unit, lease, simulation='src/simulation.py'):
+        '''Run a unit, renewing its lease
+
+        Args:
+            unit (dict)
+                See `get_unit`
+            lease (Lease)
+                Lease on the unit
+            simulation (str)
+                Simulation script
+
+        Returns:
+            success (bool)
+                False if the simulation failed, or was stopped
+                because the lease was lost
+        '''
+        output = unit['output']
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        # the simulation compresses its output depending on the suffix
+        tmp = f'{output}.{lease.token}.tmp{os.path.splitext(output)[1]}'
+        cmd = [sys.executable, simulation] + unit['args'] + ['--output', tmp]
+        lost = False
+        with tempfile.TemporaryFile('w+') as log:
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                                    stderr=log)
+            while True:
+                try:
+                    proc.wait(timeout=self.lease / 3)
+                    break
+                except subprocess.TimeoutExpired:
+                    if not lease.renew():
+                        # someone else is running it
+                        lost = True
+                        proc.kill()
+                        proc.wait()
+                        break
+            log.seek(0)
+            message = log.read()[-2000:]
+        if proc.returncode != 0:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if not lost:
+                _write_json(self._failed_fname(unit['id']),
+                            {'attempts': self.attempts(unit) + 1,
+                             'owner': self.owner,
+                             'message': message})
+            return False
+        # outputs only appear once complete; the same unit run twice
+        # gives the same output, so replacing it is harmless
+        os.replace(tmp, output)
+        return True
+
+    def work(self, simulation='src/simulation.py', poll=30, max_units=None):
+        '''Claim and run units until none are left
+
+        Units are tried in order of priority, starting from a random
+        position among the units with the same priority, so that
+        concurrent workers rarely compete for the same unit
+
+        Args:
+            simulation (str)
+                Simulation script
+            poll (float)
+                Seconds to wait for units held by other workers
+                (which might expire)
+            max_units (int)
+                Stop after running this many units (default: no limit)
+
+        Returns:
+            ran (int)
+                Number of units run successfully
+        '''
+        ran = 0
+        while max_units is None or ran < max_units:
+            pending = [x for x in self.units()
+                       if not self.done(x) and
+                       self.attempts(x) < self.max_attempts]
+            if not pending:
+                break
+            random.shuffle(pending)
+            pending.sort(key=lambda x: -x['priority'])
+            claimed = False
+            for unit in pending:
+                lease = self.claim(unit)
+                if lease is None:
+                    continue
+                claimed = True
+                # might have been completed in the meantime
+                if not self.done(unit):
+                    sys.stderr.write(f'{self.owner} running '
+                                     f'{unit["output"]}\n')
+                    if self.run(unit, lease, simulation=simulation):
+                        ran += 1
+                lease.release()
+                break
+            if not claimed:
+                time.sleep(poll)
+        return ran
+
+    def status(self):
+        '''Progress of the queue
+
+        Returns:
+            counts (dict)
+                Number of units done, running (with a valid lease),
+                expired (lease not renewed), failed (too many
+                attempts) and pending
+        '''
+        counts = {'done': 0, 'running': 0, 'expired': 0,
+                  'failed': 0, 'pending': 0}
+        now = time.time()
+        for unit in self.units():
+            if self.done(unit):
+                counts['done'] += 1
+                continue
+            lease = _read_json(self._lease_fname(unit['id']))
+            if lease is not None:
+                counts['running' if lease['expires'] > now
+                       else 'expired'] += 1
+            elif self.attempts(unit) >= self.max_attempts:
+                counts['failed'] += 1
+            else:
+                counts['pending'] += 1
+        return counts
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+import sys
+import gzip
+import queue
+import threading
+
+from large_cage.agent import format_record
+
+# sent to the writer thread once all records have been queued
+_STOP = object()
+
+
+class BackgroundWriter():
+    '''Write the simulation output from a background thread
+
+    Records (see `large_cage.agent.get_record`) and lines are handed to
+    a bounded queue; a writer thread formats them, and writes them
+    (compressed, if requested) in large blocks, so that the simulation
+    does not wait for the file system. Once the queue is full the
+    simulation waits for the writer, which keeps the memory bounded
+
+    Example:
+    >>> with BackgroundWriter('output.tsv.gz') as writer:
+    ...     writer.write('\t'.join(get_header(p)))
+    ...     for record in get_simulation(p):
+    ...         writer.put(record)
+
+    Args:
+        fname (str)
+            Output file, compressed with gzip if it ends with ".gz"
+            (default: stdout)
+        block_size (int)
+            Characters buffered before each write
+        max_queued (int)
+            Records (or lines) queued before the simulation waits
+        keep (bool)
+            Also keep the whole output in memory (see `getvalue`)
+    '''
+    def __init__(self, fname=None, block_size=2 ** 20, max_queued=4096,
+                 keep=False):
+        self.fname = fname
+        self.block_size = block_size
+        self.keep = keep
+        self.kept = []
+        self.error = None
+        if fname is None or fname == '-':
+            self.stream = sys.stdout
+        elif fname.endswith('.gz'):
+            self.stream = gzip.open(fname, 'wt')
+        else:
+            self.stream = open(fname, 'w')
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _flush(self, lines):
+        if not lines:
+            return
+        block = '\n'.join(lines) + '\n'
+        if self.keep:
+            self.kept.append(block)
+        self.stream.write(block)
+
+    def _run(self):
+        lines = []
+        size = 0
+        stopped = False
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    stopped = True
+                    break
+                line = item if isinstance(item, str) else format_record(item)
+                lines.append(line)
+                size += len(line) + 1
+                if size >= self.block_size:
+                    self._flush(lines)
+                    lines = []
+                    size = 0
+            self._flush(lines)
+            self.stream.flush()
+        except BaseException as e:
+            self.error = e
+            # keep consuming, so that the simulation never blocks
+            # until the end of the records, unless already reached
+            while not stopped:
+                stopped = self.queue.get() is _STOP
+
+    def _put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def put(self, record):
+        '''Queue a record, to be formatted by the writer
+
+        Args:
+            record (dict)
+                See `large_cage.agent.get_record`
+        '''
+        self._put(record)
+
+    def write(self, line):
+        '''Queue an output line
+
+        Args:
+            line (str)
+                Line (without newline)
+        '''
+        self._put(line)
+
+    def close(self):
+        '''Wait for all records to be written and close the output
+
+        Raises:
+            Exception
+                Any error raised while writing
+        '''
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        try:
+            if self.stream is not sys.stdout:
+                self.stream.close()
+        except Exception as e:
+            # buffered output that could not be written
+            if self.error is None:
+                self.error = e
+        if self.error is not None:
+            raise self.error
+
+    def getvalue(self):
+        '''The whole output, if kept
+
+        Returns:
+            output (str)
+                All lines written so far
+        '''
+        return ''.join(self.kept)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+
+import sys
+import argparse
+
+from large_cage.parameters import load_parameters
+from large_cage.parameters import check_parameters
+from large_cage.agent import get_header
+from large_cage.optimize import COSTS
+from large_cage.optimize import Objective
+from large_cage.optimize import SuccessiveHalving
+
+
+def get_options():
+    description = 'Search release strategies (successive halving)'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('--parameters',
+                        default=None,
+                        help='Base parameters (YAML file) '
+                             '(default: use the default ones)')
+    parser.add_argument('--search',
+                        nargs=3,
+                        action='append',
+                        metavar=('NAME', 'LOW', 'HIGH'),
+                        required=True,
+                        help='Range for a parameter (integers if both '
+                             'bounds are integers); nested parameters can be '
+                             'indicated with dots (e.g. RELEASE_ANTI.0). '
+                             'Can be used multiple times')
+    parser.add_argument('--objective',
+                        nargs=2,
+                        action='append',
+                        metavar=('TARGET', 'WEIGHT'),
+                        required=True,
+                        help='Term of the objective to minimise: an output '
+                             'column at the last time point (e.g. drives), '
+                             'at a given time (e.g. drives@200), the time '
+                             'to suppression (suppression), or a release '
+                             'cost (' + ', '.join(COSTS) + '). '
+                             'Can be used multiple times')
+    parser.add_argument('--candidates',
+                        type=int,
+                        default=81,
+                        help='Candidates at the first rung '
+                             '(default: %(default)d)')
+    parser.add_argument('--eta',
+                        type=int,
+                        default=3,
+                        help='Only the best 1/eta candidates are promoted '
+                             'at each rung (default: %(default)d)')
+    parser.add_argument('--min-repeats',
+                        type=int,
+                        default=1,
+                        help='Repetitions at the first rung '
+                             '(default: %(default)d)')
+    parser.add_argument('--max-repeats',
+                        type=int,
+                        default=27,
+                        help='Repetitions at the last rung '
+                             '(default: %(default)d)')
+    parser.add_argument('--min-end-time',
+                        type=float,
+                        default=None,
+                        help='Simulation length at the first rung, '
+                             'growing up to END_TIME at the last one '
+                             '(default: always END_TIME)')
+    parser.add_argument('--hyperband',
+                        action='store_true',
+                        default=False,
+                        help='Run all Hyperband brackets rather than '
+                             'a single successive halving')
+    parser.add_argument('--common-random-numbers',
+                        action='store_true',
+                        default=False,
+                        help='Pair candidates through common random numbers')
+    parser.add_argument('--batch',
+                        action='store_true',
+                        default=False,
+                        help='Use the batch engine '
+                             '(cannot be used with --common-random-numbers)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of parallel processes '
+                             '(default: %(default)d)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Random seed (default: random)')
+    parser.add_argument('--history',
+                        default=None,
+                        help='Save all evaluations to this file '
+                             '(tsv format, default: do not save)')
+
+    return parser.parse_args()
+
+
+def _bound(x):
+    try:
+        return int(x)
+    except ValueError:
+        return float(x)
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    p = load_parameters(options.parameters)
+    try:
+        check_parameters(p)
+        objective = Objective(options.objective)
+        columns = set(get_header(p)) | set(COSTS) | {'suppression'}
+        for target, _ in options.objective:
+            if target.partition('@')[0] not in columns:
+                raise ValueError(f'Unknown objective target: {target}')
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    if options.common_random_numbers and options.batch:
+        sys.stderr.write('Common random numbers are not supported '
+                         'by the batch engine\n')
+        sys.exit(1)
+
+    space = {name: (_bound(low), _bound(high))
+             for name, low, high in options.search}
+
+    sh = SuccessiveHalving(p, space, objective,
+                           eta=options.eta,
+                           min_repeats=options.min_repeats,
+                           max_repeats=options.max_repeats,
+                           min_end_time=options.min_end_time,
+                           common=options.common_random_numbers,
+                           batch=options.batch,
+                           jobs=options.jobs,
+                           seed=options.seed)
+    evaluations = sh.run(candidates=options.candidates,
+                         hyperband=options.hyperband)
+
+    if options.history is not None:
+        evaluations.to_csv(options.history, sep='\t', index=False)
+    # fully evaluated candidates, best first
+    best = evaluations[evaluations['rung'] == sh.rungs - 1]
+    best = best.sort_values('objective')
+    best.to_csv(sys.stdout, sep='\t', index=False)
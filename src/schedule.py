@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+
+import os
+import sys
+import math
+import argparse
+
+from large_cage.sweep import load_sweep
+from large_cage.parameters import load_parameters
+from large_cage.cost import CostModel
+from large_cage.cost import schedule
+from large_cage.cost import read_benchmark
+from large_cage.cost import load_cost_model
+
+
+def get_options():
+    description = 'Predict the cost of simulations and schedule them'
+    parser = argparse.ArgumentParser(description=description)
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit = subparsers.add_parser('fit',
+                                help='Fit the cost model on past runs')
+    fit.add_argument('model',
+                     help='Output file for the cost model')
+    fit.add_argument('--benchmarks',
+                     default='benchmarks',
+                     help='Directory with the snakemake benchmarks of '
+                          'past simulations (default: %(default)s)')
+    fit.add_argument('--parameters-dir',
+                     default='parameters',
+                     help='Directory with the parameters of each scenario '
+                          '(default: %(default)s)')
+    fit.add_argument('--run',
+                     nargs=2,
+                     action='append',
+                     default=[],
+                     metavar=('PARAMETERS', 'BENCHMARK'),
+                     help='Parameters (YAML file) and benchmark of a run; '
+                          'can be used multiple times')
+    fit.add_argument('--min-runtime',
+                     type=float,
+                     default=2,
+                     help='Ignore runs shorter than this (seconds), '
+                          'e.g. outputs taken from the cache '
+                          '(default: %(default).0f)')
+    fit.add_argument('--penalty',
+                     type=float,
+                     default=1,
+                     help='Shrinkage towards the prior model '
+                          '(default: %(default).1f)')
+
+    for name, help in [('predict', 'Predict runtime and memory'),
+                       ('plan', 'Order simulations longest first under '
+                                'a memory budget'),
+                       ('hints', 'Resource hints for snakemake (profile)')]:
+        sub = subparsers.add_parser(name, help=help)
+        sub.add_argument('parameters',
+                         nargs='*',
+                         help='Parameters of each scenario (YAML files)')
+        sub.add_argument('--sweep',
+                         action='append',
+                         default=[],
+                         help='Also include all points of this sweep '
+                              '(YAML file); can be used multiple times')
+        sub.add_argument('--model',
+                         default=None,
+                         help='Cost model (default: prior model)')
+        sub.add_argument('--repeats',
+                         type=int,
+                         default=1,
+                         help='Runs of each scenario (default: %(default)d)')
+        sub.add_argument('--margin',
+                         type=float,
+                         default=2,
+                         help='Standard deviations added to the predicted '
+                              'memory (default: %(default).1f)')
+        if name == 'plan':
+            sub.add_argument('--cores',
+                             type=int,
+                             default=1,
+                             help='Simultaneous simulations '
+                                  '(default: %(default)d)')
+            sub.add_argument('--memory',
+                             type=float,
+                             default=math.inf,
+                             help='Memory budget in MB '
+                                  '(default: unlimited)')
+
+    return parser.parse_args()
+
+
+def get_scenarios(options):
+    scenarios = [(os.path.splitext(fname)[0], load_parameters(fname))
+                 for fname in options.parameters]
+    for fname in options.sweep:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        scenarios.extend((os.path.join(name, point_id), p)
+                         for point_id, p in load_sweep(fname))
+    return scenarios
+
+
+def get_jobs(options):
+    model = load_cost_model(options.model)
+    jobs = []
+    for name, p in get_scenarios(options):
+        seconds, _ = model.predict(p)
+        _, mb = model.predict(p, margin=options.margin)
+        for repeat in range(options.repeats):
+            job = name if options.repeats == 1 else f'{name}_{repeat}'
+            jobs.append((job, seconds, mb))
+    return jobs
+
+
+def fit(options):
+    runs = []
+    sweeps = {}
+    for root, _, files in os.walk(options.benchmarks):
+        for f in sorted(files):
+            if not f.endswith('.tsv'):
+                continue
+            fname = os.path.join(root, f)
+            # same layout as the simulation outputs
+            rel = os.path.relpath(fname, options.benchmarks).split(os.sep)
+            name = f.rsplit('_', 1)[0]
+            if rel[0] == 'sweeps' and len(rel) == 3:
+                sweep = rel[1]
+                if sweep not in sweeps:
+                    spec = os.path.join(options.parameters_dir, 'sweeps',
+                                        f'{sweep}.yaml')
+                    sweeps[sweep] = (load_sweep(spec)
+                                     if os.path.exists(spec) else None)
+                if sweeps[sweep] is None:
+                    continue
+                try:
+                    p = sweeps[sweep].get(name)
+                except KeyError:
+                    continue
+            else:
+                params = os.path.join(options.parameters_dir, *rel[:-1],
+                                      f'{name}.yaml')
+                if not os.path.exists(params):
+                    continue
+                p = load_parameters(params)
+            runs.append((p, fname))
+    for params, fname in options.run:
+        runs.append((load_parameters(params), fname))
+
+    parameters = []
+    runtimes = []
+    memory = []
+    for p, fname in runs:
+        seconds, mb = read_benchmark(fname)
+        if seconds < options.min_runtime:
+            continue
+        parameters.append(p)
+        runtimes.append(seconds)
+        memory.append(mb)
+
+    model = CostModel(penalty=options.penalty).fit(parameters,
+                                                    runtimes, memory)
+    sys.stderr.write(f'Fitted on {model.observations} runs, '
+                     f'residual sd (log) runtime {model.runtime_sd:.2f}, '
+                     f'memory {model.memory_sd:.2f}\n')
+    model.save(options.model)
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    if options.command == 'fit':
+        fit(options)
+        sys.exit(0)
+
+    jobs = get_jobs(options)
+    if options.command == 'predict':
+        print('\t'.join(['scenario', 'seconds', 'mb']))
+        for job, seconds, mb in jobs:
+            print(f'{job}\t{seconds:.1f}\t{mb:.0f}')
+    elif options.command == 'plan':
+        plan = schedule(jobs, cores=options.cores, memory=options.memory)
+        print('\t'.join(['scenario', 'start', 'end', 'seconds', 'mb']))
+        for job, start, end, seconds, mb in plan:
+            print(f'{job}\t{start:.1f}\t{end:.1f}\t{seconds:.1f}\t{mb:.0f}')
+        makespan = max(x[2] for x in plan) if plan else 0
+        sys.stderr.write(f'Predicted makespan: {makespan / 3600:.2f} hours\n')
+    else:
+        # enough for the largest simulation
+        mb = max(x[2] for x in jobs) if jobs else 0
+        runtime = max(x[1] for x in jobs) if jobs else 0
+        print('set-resources:')
+        for rule in ('simulate', 'simulate_sweep'):
+            print(f'  {rule}:')
+            print(f'    mem_mb: {int(math.ceil(mb))}')
+            print(f'    runtime: {int(math.ceil(runtime / 60))}')
@@ -1,16 +1,25 @@
 #!/usr/bin/env python
 
 
+import os
 import sys
-import yaml
 import argparse
-from copy import deepcopy
 
-from large_cage import agent
-from large_cage.agent import get_all_genotypes
-from large_cage.agent import Individual
-from large_cage.agent import run_simulation
-from large_cage.agent import print_header
+from large_cage.sweep import load_sweep
+from large_cage.cache import get_key
+from large_cage.cache import ResultCache
+from large_cage.store import ResultStore
+from large_cage.parameters import load_parameters
+from large_cage.parameters import check_parameters
+from large_cage.agent import set_seed
+from large_cage.agent import get_header
+from large_cage.agent import get_observables
+from large_cage.agent import format_record
+from large_cage.agent import get_simulation
+from large_cage.batch import BatchSimulation
+from large_cage.writer import BackgroundWriter
+from large_cage.sequential import Target
+from large_cage.sequential import SequentialStopping
 
 
 def get_options():
@@ -25,111 +34,383 @@ def get_options():
                              'in the provided file, then the default value '
                              'is used '
                              '(default: use the default ones)')
+    parser.add_argument('--sweep',
+                        default=None,
+                        help='Sweep specification (YAML file); '
+                             'parameters are resolved in memory '
+                             'for the point indicated by --point')
+    parser.add_argument('--point',
+                        default=None,
+                        help='Sweep point to simulate (identifier or index)')
+    parser.add_argument('--list-points',
+                        action='store_true',
+                        default=False,
+                        help='List all points in the sweep and exit')
+    parser.add_argument('--output',
+                        default=None,
+                        help='Output file, compressed if it ends with ".gz"; '
+                             'records are formatted and written in the '
+                             'background (default: stdout)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Random seed (default: random)')
+    parser.add_argument('--common-random-numbers',
+                        action='store_true',
+                        default=False,
+                        help='Draw the random numbers of each individual '
+                             'from its lineage, so that scenarios run with '
+                             'the same seed are paired; requires --seed')
+    parser.add_argument('--batch',
+                        action='store_true',
+                        default=False,
+                        help='Simulate all repetitions at once, in a '
+                             'single vectorized state (faster; '
+                             'cannot be used with --common-random-numbers)')
+    parser.add_argument('--cache',
+                        default=None,
+                        help='Cache directory; outputs are stored under a '
+                             'hash of the resolved parameters, the seed '
+                             'and the engine version, and returned directly '
+                             'when found. Requires --seed '
+                             '(default: no cache)')
+    parser.add_argument('--cache-size',
+                        type=float,
+                        default=1024,
+                        help='Maximum size of the cache in MB; the least '
+                             'recently used outputs are removed '
+                             '(default: %(default).0f)')
+    parser.add_argument('--observables',
+                        nargs='+',
+                        default=None,
+                        metavar='COLUMN',
+                        help='Only compute and output these columns '
+                             '(round and time are always included), '
+                             'e.g. "eggs fitness" '
+                             '(default: all columns)')
+    parser.add_argument('--times',
+                        default=None,
+                        help='Only output these days (one per line, '
+                             'e.g. data/reference_time_points.txt); '
+                             'each simulation ends after the last of them '
+                             '(default: every day)')
+    parser.add_argument('--store',
+                        default=None,
+                        help='Also add the output to this results store '
+                             '(SQLite database, see src/store.py), '
+                             'replacing the rounds already stored for '
+                             'the scenario (default: do not store)')
+    parser.add_argument('--store-as',
+                        nargs=3,
+                        default=None,
+                        metavar=('SIZE', 'SCENARIO', 'CAGE'),
+                        help='Labels of the scenario in the results store '
+                             '(default: from the parameters file path, '
+                             'parameters/SIZE/SCENARIO/CAGE.yaml, '
+                             'or the sweep and point)')
+    parser.add_argument('--target',
+                        nargs=2,
+                        action='append',
+                        default=[],
+                        metavar=('TARGET', 'TOLERANCE'),
+                        help='Add repetitions until the confidence interval '
+                             'of the mean of this target is narrower than '
+                             'the tolerance (ignoring the REPETITIONS '
+                             'parameter); targets are output columns at the '
+                             'last time point (e.g. drives), at a given time '
+                             '(e.g. eggs@30), or the time to suppression '
+                             '(suppression). Can be given multiple times')
+    parser.add_argument('--min-repeats',
+                        type=int,
+                        default=10,
+                        help='Minimum repetitions with --target '
+                             '(default: %(default)d)')
+    parser.add_argument('--max-repeats',
+                        type=int,
+                        default=50,
+                        help='Maximum repetitions with --target '
+                             '(default: %(default)d)')
+    parser.add_argument('--repeats-step',
+                        type=int,
+                        default=10,
+                        help='Repetitions added at once with --target '
+                             '(default: %(default)d)')
+    parser.add_argument('--confidence',
+                        type=float,
+                        default=0.95,
+                        help='Confidence level of the intervals with '
+                             '--target (default: %(default).2f)')
+    parser.add_argument('--repeats-report',
+                        default=None,
+                        help='Write the repetitions used and the interval of '
+                             'each target to this file (tsv format)')
 
     return parser.parse_args()
 
 
+def load_times(fname):
+    '''Days listed in a file, one per line'''
+    with open(fname) as f:
+        return [float(line) for line in f if line.strip()]
+
+
+def get_repetitions(p, first, repetitions, batch=False,
+                    observables=None, times=None):
+    '''Simulate consecutive repetitions
+
+    Args:
+        p (dict)
+            Parameters
+        first (int)
+            First repetition
+        repetitions (int)
+            Number of repetitions
+        batch (bool)
+            Use the batch engine
+        observables (Observables)
+            Only compute these columns (default: all)
+        times (list)
+            Only output these days (default: all)
+
+    Returns:
+        lines (list)
+            Output lines of each repetition
+    '''
+    if not batch:
+        return [[format_record(record)
+                 for record in get_simulation(p, repetition=j,
+                                              observables=observables,
+                                              record_times=times)]
+                for j in range(first, first + repetitions)]
+    lines = [[] for _ in range(repetitions)]
+    for records in BatchSimulation(p, repetitions=repetitions,
+                                   first_repetition=first,
+                                   observables=observables,
+                                   record_times=times):
+        for record in records:
+            lines[record['round'] - first].append(format_record(record))
+    return lines
+
+
+def run(p, writer, batch=False, stopping=None, observables=None, times=None):
+    if observables is None:
+        header = get_header(p)
+    else:
+        header = list(observables.columns)
+    writer.write('\t'.join(header))
+    if stopping is None and not batch:
+        # records are formatted and written in the background
+        for j in range(p['REPETITIONS']):
+            for record in get_simulation(p, repetition=j,
+                                         observables=observables,
+                                         record_times=times):
+                writer.put(record)
+        return
+    if stopping is None:
+        # keep the output sorted by repetition
+        for rep in get_repetitions(p, 0, p['REPETITIONS'], batch,
+                                   observables, times):
+            for line in rep:
+                writer.write(line)
+        return
+    repetitions = stopping.next_step()
+    while repetitions:
+        for rep in get_repetitions(p, stopping.repeats, repetitions, batch,
+                                   observables, times):
+            for line in rep:
+                writer.write(line)
+            stopping.add([dict(zip(header, line.split('\t')))
+                          for line in rep])
+        repetitions = stopping.next_step()
+
+
+def replay(output, stopping):
+    '''Add the repetitions found in an output to the stopping rule'''
+    lines = output.splitlines()
+    header = lines[0].split('\t')
+    rows = {}
+    for line in lines[1:]:
+        row = dict(zip(header, line.split('\t')))
+        rows.setdefault(row['round'], []).append(row)
+    for rep in rows.values():
+        stopping.add(rep)
+
+
+def get_store_labels(options):
+    '''Labels of the simulated scenario in the results store'''
+    if options.store_as is not None:
+        return tuple(options.store_as)
+    if options.sweep is not None:
+        name = os.path.splitext(os.path.basename(options.sweep))[0]
+        return 'sweeps', name, options.point
+    if options.parameters is None:
+        return 'default', 'default', 'default'
+    # parameters/SIZE/SCENARIO/CAGE.yaml
+    parts = os.path.normpath(options.parameters).split(os.sep)
+    parts = ['default'] * max(3 - len(parts), 0) + parts[-3:]
+    return parts[0], parts[1], os.path.splitext(parts[2])[0]
+
+
+def store_output(options, p, output):
+    size, scenario, cage = get_store_labels(options)
+    lines = output.splitlines()
+    with ResultStore(options.store) as store:
+        store.put(size, scenario, cage, lines[0].split('\t'),
+                  (line.split('\t') for line in lines[1:]),
+                  parameters=p)
+
+
+def write_report(fname, stopping):
+    with open(fname, 'w') as f:
+        f.write('\t'.join(['target', 'tolerance', 'repeats', 'mean',
+                           'low', 'high', 'converged']) + '\n')
+        for row in stopping.summary():
+            f.write('\t'.join(str(x) for x in row) + '\n')
+
+
 if __name__ == "__main__":
     options = get_options()
 
-    p = deepcopy(agent.params)
-
-    # should we override the parameters?
-    if options.parameters is not None:
-        new_params = yaml.load(open(options.parameters),
-                               Loader=yaml.SafeLoader)
-        for k, v in new_params.items():
-            if k in p:
-                sys.stderr.write(f'Changing parameter {k} from its default\n')
-            p[k] = v
+    if options.sweep is not None:
+        sweep = load_sweep(options.sweep)
+        if options.list_points:
+            for point_id, _ in sweep.points():
+                print(point_id)
+            sys.exit(0)
+        if options.point is None:
+            sys.stderr.write('Please indicate which point to simulate '
+                             'with --point\n')
+            sys.exit(1)
+        point = options.point
+        if point.isdigit():
+            point = int(point)
+        try:
+            p = sweep.get(point)
+        except KeyError:
+            sys.stderr.write(f'Could not find point {options.point} '
+                             'in the sweep\n')
+            sys.exit(1)
+    else:
+        # should we override the parameters?
+        p = load_parameters(options.parameters, verbose=True)
 
     # check drive and antidote have the same length
-    if len(p['RELEASE_WT']) != len(p['RELEASE_DRIVE']) or len(p['RELEASE_DRIVE']) != len(p['RELEASE_ANTI']):
-        sys.stderr.write('Please provide the same number of introductions '
-                         'for wild-type, drive and antidote individuals\n')
+    try:
+        check_parameters(p)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    if options.common_random_numbers and options.seed is None:
+        sys.stderr.write('Please provide a random seed (--seed) '
+                         'to use common random numbers\n')
+        sys.exit(1)
+
+    if options.common_random_numbers and options.batch:
+        sys.stderr.write('Common random numbers are not supported '
+                         'by the batch engine\n')
         sys.exit(1)
-    WILDS = [int(x) for x in p['RELEASE_WT']]
-    DRIVES = [int(x) for x in p['RELEASE_DRIVE']]
-    ANTIDOTES = [int(x) for x in p['RELEASE_ANTI']]
-
-    eggs_filter = None
-
-    print_header(p)
-    for j in range(p['REPETITIONS']):
-        # init
-        start_populations = []
-        gd_populations = []
-        for wild, drive, anti in zip(WILDS, DRIVES, ANTIDOTES):
-            population = set()
-
-            for i in range(drive):
-                # het. male drives
-                x = Individual('m', ['W', 'D'], ['W', 'W'],
-                               nucl_from_father=True,
-                               parameters=p)
-                x.stage = 'adult'
-                population.add(x)
-            for i in range(anti):
-                if not p['HOM_ANTIDOTE']:
-                    # het. male antidotes
-                    x = Individual('m', ['W', 'W'], ['A', 'W'],
-                                   parameters=p)
-                else:
-                    # hom. male antidotes
-                    x = Individual('m', ['W', 'W'], ['A', 'A'],
-                                   parameters=p)
-                x.stage = 'adult'
-                population.add(x)
-
-            # wild-type individuals
-            for i in range(int(wild / 2)):
-                x = Individual('f', ['W', 'W'], ['W', 'W'],
-                               parameters=p)
-                x.stage = 'adult'
-                population.add(x)
-                x = Individual('m', ['W', 'W'], ['W', 'W'],
-                               parameters=p)
-                x.stage = 'adult'
-                population.add(x)
-
-            start_populations.append(population)
-
-        late_releases = None
-        if p['LATE_RELEASES'] is not None:
-            late_releases_start = p['LATE_RELEASES_START']
-            late_releases_counter = p['LATE_RELEASES']
-            late_releases_drive_frequency = p.get('LATE_RELEASES_DRIVE_FREQUENCY', None)
-            if late_releases_drive_frequency is not None:
-                if late_releases_start is not None:
-                    sys.stderr.write('Using antidote release timing based on '
-                                     'drive frequency, ignoring start time\n')
-                    late_releases_start = None
-            late = set()
-            if p['LATE_RELEASES_ANTI'] is not None:
-                for i in range(int(p['LATE_RELEASES_ANTI'])):
-                    if not p['HOM_ANTIDOTE']:
-                        # het. male antidotes
-                        x = Individual('m', ['W', 'W'], ['A', 'W'],
-                                       parameters=p)
-                    else:
-                        # hom. male antidotes
-                        x = Individual('m', ['W', 'W'], ['A', 'A'],
-                                       parameters=p)
-                    x.stage = 'adult'
-                    late.add(x)
-            late_releases = (late, late_releases_start,
-                             late_releases_counter,
-                             late_releases_drive_frequency)
-
-        run_simulation(start_populations,
-                       end_time=p['END_TIME'],
-                       repetition=j,
-                       report_times=None,
-                       release=p['RELEASE'],
-                       special_releases={},
-                       additional_releases=late_releases,
-                       eggs_filter=eggs_filter,
-                       time_step=p['TIME_STEP'],
-                       release_days=p['RELEASE_DAYS'],
-                       use_adults_if_needed=p['USE_ADULTS'],
-                       p=p)
+
+    stopping = None
+    if options.target:
+        try:
+            targets = [Target(*x) for x in options.target]
+        except ValueError:
+            sys.stderr.write('Please provide targets as COLUMN or '
+                             'COLUMN@TIME, with a numeric tolerance\n')
+            sys.exit(1)
+        columns = set(get_header(p)) | {'suppression'}
+        for target in targets:
+            if target.column not in columns:
+                sys.stderr.write(f'Unknown target: {target.spec}\n')
+                sys.exit(1)
+        stopping = SequentialStopping(targets,
+                                      confidence=options.confidence,
+                                      min_repeats=options.min_repeats,
+                                      max_repeats=options.max_repeats,
+                                      step=options.repeats_step)
+
+    observables = None
+    if options.observables is not None:
+        columns = ['round', 'time'] + [x for x in options.observables
+                                       if x not in ('round', 'time')]
+        # columns needed by the targets
+        if stopping is not None:
+            for target in stopping.targets:
+                column = ('pop' if target.column == 'suppression'
+                          else target.column)
+                if column not in columns:
+                    columns.append(column)
+        try:
+            observables = get_observables(columns, p)
+        except ValueError as e:
+            sys.stderr.write(f'{e}\n')
+            sys.exit(1)
+    times = None
+    if options.times is not None:
+        times = load_times(options.times)
+        # records are only made once a day
+        skipped = [x for x in times
+                   if x % 1 or not 0 <= x <= p['END_TIME']]
+        if skipped:
+            sys.stderr.write(f'Times should be whole days between 0 and '
+                             f'{p["END_TIME"]}, no record would be made at: '
+                             f'{", ".join(f"{x:g}" for x in skipped)}\n')
+            sys.exit(1)
+
+    cache = None
+    if options.cache is not None:
+        if options.seed is None:
+            sys.stderr.write('Please provide a random seed (--seed) '
+                             'to use the cache\n')
+            sys.exit(1)
+        cache = ResultCache(options.cache,
+                            max_size=int(options.cache_size * 2 ** 20))
+        # the number of repetitions depends on the stopping rule
+        key_p = p
+        if stopping is not None:
+            key_p = dict(key_p, REPETITIONS=[options.target,
+                                             options.confidence,
+                                             options.min_repeats,
+                                             options.max_repeats,
+                                             options.repeats_step])
+        # and so does the output
+        if observables is not None or times is not None:
+            key_p = dict(key_p, OBSERVABLES=(observables.columns
+                                             if observables is not None
+                                             else None),
+                         RECORD_TIMES=times)
+        key = get_key(key_p, options.seed,
+                      common=options.common_random_numbers,
+                      engine='batch' if options.batch else 'agent')
+        output = cache.get(key)
+        if output is not None:
+            sys.stderr.write(f'Using cached output {key}\n')
+            with BackgroundWriter(options.output) as writer:
+                for line in output.splitlines():
+                    writer.write(line)
+            if options.store is not None:
+                store_output(options, p, output)
+            if stopping is not None:
+                replay(output, stopping)
+                if options.repeats_report is not None:
+                    write_report(options.repeats_report, stopping)
+            sys.exit(0)
+
+    if options.seed is not None:
+        set_seed(options.seed, common=options.common_random_numbers)
+
+    # the output is also kept for the cache and the results store
+    with BackgroundWriter(options.output,
+                          keep=(cache is not None or
+                                options.store is not None)) as writer:
+        run(p, writer, options.batch, stopping, observables, times)
+    if cache is not None:
+        cache.put(key, writer.getvalue())
+    if options.store is not None:
+        store_output(options, p, writer.getvalue())
+
+    if stopping is not None:
+        sys.stderr.write(f'Used {stopping.repeats} repetitions\n')
+        if options.repeats_report is not None:
+            write_report(options.repeats_report, stopping)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+
+import sys
+import argparse
+
+from large_cage.parameters import load_parameters
+from large_cage.parameters import check_parameters
+from large_cage.agent import get_observables
+from large_cage.splitting import Score
+from large_cage.splitting import estimate
+
+
+def get_options():
+    description = 'Probability of rare events (multilevel splitting)'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('--parameters',
+                        default=None,
+                        help='Parameters (YAML file) '
+                             '(default: use the default ones)')
+    parser.add_argument('--score',
+                        required=True,
+                        help='Output column measuring the progress towards '
+                             'the rare event (e.g. drives)')
+    parser.add_argument('--levels',
+                        type=float,
+                        nargs='+',
+                        required=True,
+                        help='Levels of the score, in the order they are '
+                             'crossed; the last one defines the rare event')
+    parser.add_argument('--direction',
+                        choices=['down', 'up'],
+                        default='down',
+                        help='Whether levels are crossed when the score falls '
+                             'below them or rises above them '
+                             '(default: %(default)s)')
+    parser.add_argument('--after',
+                        type=float,
+                        default=0,
+                        help='Only consider the score from this day on '
+                             '(default: %(default).0f)')
+    parser.add_argument('--splits',
+                        type=int,
+                        default=4,
+                        help='Branches at each level (default: %(default)d)')
+    parser.add_argument('--repeats',
+                        type=int,
+                        default=100,
+                        help='Independent starts (default: %(default)d)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of parallel processes '
+                             '(default: %(default)d)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=None,
+                        help='Random seed (default: random)')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    p = load_parameters(options.parameters)
+    try:
+        check_parameters(p)
+        get_observables([options.score], p)
+        score = Score(options.score, options.levels,
+                      direction=options.direction, after=options.after)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+    if options.splits < 1 or options.repeats < 1:
+        sys.stderr.write('--splits and --repeats should be positive\n')
+        sys.exit(1)
+
+    probability, sem, levels, days, _ = estimate(p, score,
+                                                 repeats=options.repeats,
+                                                 splits=options.splits,
+                                                 seed=options.seed,
+                                                 jobs=options.jobs)
+
+    print('\t'.join(['level', 'probability', 'branches']))
+    for level, prob, branches in levels:
+        print(f'{level}\t{prob}\t{branches}')
+
+    sys.stderr.write(f'P = {probability:.3g} +/- {sem:.2g} (SEM), '
+                     f'{days:.0f} days simulated\n')
+    if 0 < probability < 1 and sem > 0:
+        # plain Monte Carlo, for the same standard error
+        plain = probability * (1 - probability) / sem ** 2 * p['END_TIME']
+        sys.stderr.write(f'Plain Monte Carlo: about {plain:.0f} days '
+                         'for the same precision\n')
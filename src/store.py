@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+
+import sys
+import argparse
+
+from large_cage.store import get_labels
+from large_cage.store import ResultStore
+
+
+def get_options():
+    description = 'Add simulation outputs to a results store and query it'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('store',
+                        help='Results store (SQLite database)')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add = subparsers.add_parser('add',
+                                help='Add outputs, labelled from their path '
+                                     '(e.g. out/SIZE/SCENARIO/CAGE.tsv, '
+                                     'raw/SIZE/SCENARIO/CAGE_REPEAT.tsv or '
+                                     'sweeps/out/SWEEP/POINT.tsv)')
+    add.add_argument('outputs',
+                     nargs='+',
+                     help='Output files (tsv format)')
+
+    for name, help in [('list', 'List the stored scenarios'),
+                       ('query', 'Print the matching records (tsv format)'),
+                       ('remove', 'Remove the matching scenarios')]:
+        sub = subparsers.add_parser(name, help=help)
+        sub.add_argument('--size',
+                         nargs='+',
+                         default=None,
+                         help='Cage sizes (shell-like patterns, '
+                              'default: all)')
+        sub.add_argument('--scenario',
+                         nargs='+',
+                         default=None,
+                         help='Scenarios (shell-like patterns, '
+                              'e.g. "release_*_*", default: all)')
+        sub.add_argument('--cage',
+                         nargs='+',
+                         default=None,
+                         help='Cages (shell-like patterns, default: all)')
+        if name == 'query':
+            sub.add_argument('--columns',
+                             nargs='+',
+                             default=None,
+                             help='Output columns (default: all)')
+            sub.add_argument('--round',
+                             nargs='+',
+                             type=int,
+                             default=None,
+                             help='Rounds (default: all)')
+            sub.add_argument('--time',
+                             type=float,
+                             default=None,
+                             help='Time point (default: all)')
+            sub.add_argument('--start',
+                             type=float,
+                             default=None,
+                             help='First time point (default: all)')
+            sub.add_argument('--end',
+                             type=float,
+                             default=None,
+                             help='Last time point (default: all)')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    with ResultStore(options.store) as store:
+        if options.command == 'add':
+            for fname in options.outputs:
+                try:
+                    size, scenario, cage, repeat = get_labels(fname)
+                except ValueError as e:
+                    sys.stderr.write(f'{e}\n')
+                    sys.exit(1)
+                n = store.put_table(size, scenario, cage, fname,
+                                    round=repeat)
+                sys.stderr.write(f'{fname}: {n} records '
+                                 f'({size}, {scenario}, {cage})\n')
+        elif options.command == 'list':
+            store.scenarios(options.size, options.scenario,
+                            options.cage).to_csv(sys.stdout, sep='\t',
+                                                 index=False)
+        elif options.command == 'query':
+            time = options.time
+            if time is None and (options.start is not None or
+                                 options.end is not None):
+                time = (options.start, options.end)
+            try:
+                df = store.query(options.columns,
+                                 size=options.size,
+                                 scenario=options.scenario,
+                                 cage=options.cage,
+                                 round=options.round,
+                                 time=time)
+            except ValueError as e:
+                sys.stderr.write(f'{e}\n')
+                sys.exit(1)
+            df.to_csv(sys.stdout, sep='\t', index=False)
+        else:
+            removed = store.remove(options.size, options.scenario,
+                                   options.cage)
+            sys.stderr.write(f'Removed {removed} scenarios\n')
@@ -1,27 +1,146 @@
 #!/usr/bin/env python
 
 
+import os
 import sys
 import argparse
-import pandas as pd
+import itertools
+import numpy as np
+from multiprocessing import Pool
+
+# the large_cage package is one level up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from large_cage.summary import read_runs
+from large_cage.summary import save_runs
+from large_cage.summary import summarise
+from large_cage.summary import bootstrap_weights
 
 
 def get_options():
-    description = 'Give average and MAD for multiple simulations'
+    description = 'Give summary statistics for multiple simulations'
     parser = argparse.ArgumentParser(description=description)
 
     parser.add_argument('table',
-                        help='Model\'s output (tsv format)')
+                        nargs='+',
+                        help='Model\'s output (tsv format, or an array '
+                             'saved with --save-arrays); if more than one '
+                             'is given, a "scenario" column is added')
+    parser.add_argument('--quantiles',
+                        type=float,
+                        nargs='*',
+                        default=[0.05, 0.25, 0.75, 0.95],
+                        help='Quantiles to report (default: %(default)s)')
+    parser.add_argument('--bootstrap',
+                        type=int,
+                        default=1000,
+                        help='Bootstrap samples for the confidence interval '
+                             'of the mean, 0 to disable (default: %(default)d)')
+    parser.add_argument('--confidence',
+                        type=float,
+                        default=0.95,
+                        help='Confidence level (default: %(default).2f)')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='Random seed for the bootstrap '
+                             '(default: %(default)d)')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Parallel jobs, across scenarios and columns '
+                             '(default: %(default)d)')
+    parser.add_argument('--chunk',
+                        type=int,
+                        default=16,
+                        help='Columns summarised by each job '
+                             '(default: %(default)d)')
+    parser.add_argument('--save-arrays',
+                        action='store_true',
+                        default=False,
+                        help='Save each table as an array next to it '
+                             '(.npy), to be memory-mapped in later runs')
 
     return parser.parse_args()
 
 
+def _summarise(values, quantiles, weights, confidence):
+    return summarise(values, quantiles=quantiles, weights=weights,
+                     confidence=confidence)
+
+
+def _format(x):
+    return '' if np.isnan(x) else f'{x:.8g}'
+
+
 if __name__ == "__main__":
     options = get_options()
 
-    m = pd.read_csv(options.table, sep='\t')
-    avg = m.groupby(['time']).mean().drop(columns=['round'])
-    mad = m.groupby(['time']).mean().drop(columns=['round', 'initial_release'])
-    mad.columns = [f'{x}.MAD' for x in mad.columns]
-    m = avg.join(mad, how='outer').reset_index()
-    m.to_csv(sys.stdout, sep='\t', index=False)
+    if options.jobs > 1:
+        pool = Pool(options.jobs)
+        _map, _starmap = pool.map, pool.starmap
+    else:
+        pool = None
+        _map, _starmap = map, itertools.starmap
+
+    try:
+        runs = list(_map(read_runs, options.table))
+
+        # all scenarios are written under a single header
+        for table, r in zip(options.table[1:], runs[1:]):
+            if list(r.columns) != list(runs[0].columns):
+                sys.stderr.write(f'The columns of {table} differ from '
+                                 f'those of {options.table[0]}\n')
+                sys.exit(1)
+
+        if options.save_arrays:
+            for table, r in zip(options.table, runs):
+                if not table.endswith('.npy'):
+                    save_runs(r, os.path.splitext(table)[0] + '.npy')
+
+        tasks = []
+        for r in runs:
+            if options.bootstrap:
+                weights = bootstrap_weights(r.values.shape[0],
+                                            options.bootstrap,
+                                            options.seed)
+            else:
+                weights = None
+            for start in range(0, len(r.columns), options.chunk):
+                tasks.append((r.values[:, :, start:start + options.chunk],
+                              options.quantiles, weights,
+                              options.confidence))
+        results = iter(list(_starmap(_summarise, tasks)))
+    finally:
+        if pool is not None:
+            pool.close()
+
+    header = None
+    scenarios = len(options.table) > 1
+    for table, r in zip(options.table, runs):
+        chunks = [next(results)
+                  for _ in range(0, len(r.columns), options.chunk)]
+        stats = {k: np.concatenate([x[k] for x in chunks], axis=1)
+                 for k in chunks[0]}
+
+        # the mean is reported under the column's name,
+        # followed by each statistic for all columns
+        names = list(r.columns)
+        blocks = [stats['mean']]
+        spread = [i for i, x in enumerate(r.columns)
+                  if x != 'initial_release']
+        for k, v in stats.items():
+            if k == 'mean':
+                continue
+            names.extend(f'{r.columns[i]}.{k}' for i in spread)
+            blocks.append(v[:, spread])
+        m = np.concatenate(blocks, axis=1)
+
+        if header is None:
+            header = (['scenario'] if scenarios else []) + ['time'] + names
+            sys.stdout.write('\t'.join(header) + '\n')
+        scenario = os.path.splitext(os.path.basename(table))[0]
+        for time, row in zip(r.times, m):
+            sys.stdout.write('\t'.join(([scenario] if scenarios else []) +
+                                       [f'{time:g}'] +
+                                       [_format(x) for x in row]) + '\n')
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+
+import os
+import sys
+import time
+import yaml
+import argparse
+import tempfile
+import subprocess
+
+
+# modules that should not be loaded to run a simulation
+HEAVY = ('scipy', 'pandas', 'sklearn', 'matplotlib')
+
+
+def get_options():
+    description = 'Measure the start-up time of the simulator'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('--parameters',
+                        default='parameters/bugdorm/base/antidote.yaml',
+                        help='Parameters for the short run '
+                             '(default: %(default)s)')
+    parser.add_argument('--days',
+                        type=int,
+                        default=3,
+                        help='Length of the short run, in days '
+                             '(default: %(default)d)')
+    parser.add_argument('--repeats',
+                        type=int,
+                        default=5,
+                        help='Measurements for each command, the median '
+                             'is reported (default: %(default)d)')
+    parser.add_argument('--max-import',
+                        type=float,
+                        default=None,
+                        help='Exit with an error if importing the simulator '
+                             'takes longer than this (seconds) or loads '
+                             'any of: ' + ', '.join(HEAVY) +
+                             ' (default: only report)')
+
+    return parser.parse_args()
+
+
+def measure(cmd, repeats, env):
+    '''Median wall time of a command
+
+    Args:
+        cmd (list)
+            Command to run
+        repeats (int)
+            Number of measurements
+        env (dict)
+            Environment
+
+    Returns:
+        seconds (float)
+            Median wall time
+    '''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+    src = os.path.normpath(src)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([src] +
+                                        [x for x in
+                                         [os.environ.get('PYTHONPATH')] if x])
+    python = sys.executable
+    simulation = os.path.join(src, 'simulation.py')
+
+    heavy = subprocess.run([python, '-c',
+                            'import sys, large_cage.agent, large_cage.batch; '
+                            f'print(",".join(m for m in {HEAVY!r} '
+                            'if m in sys.modules))'],
+                           env=env, check=True, capture_output=True,
+                           text=True).stdout.strip()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # the short run inherits all other parameters
+        with open(options.parameters) as f:
+            p = yaml.load(f, Loader=yaml.SafeLoader)
+        p['END_TIME'] = options.days
+        p['REPETITIONS'] = 1
+        short = os.path.join(tmp, 'short.yaml')
+        with open(short, 'w') as f:
+            yaml.dump(p, f)
+
+        results = [('interpreter', measure([python, '-c', 'pass'],
+                                           options.repeats, env)),
+                   ('import', measure([python, '-c', 'import large_cage.agent'],
+                                      options.repeats, env)),
+                   ('help', measure([python, simulation, '--help'],
+                                    options.repeats, env)),
+                   (f'run_{options.days}_days',
+                    measure([python, simulation, '--parameters', short,
+                             '--seed', '0'],
+                            options.repeats, env))]
+
+    print('\t'.join(['step', 'seconds']))
+    for name, seconds in results:
+        print(f'{name}\t{seconds:.3f}')
+    print(f'heavy_modules\t{heavy if heavy else "none"}')
+
+    if options.max_import is not None:
+        import_time = results[1][1] - results[0][1]
+        if import_time > options.max_import or heavy:
+            sys.stderr.write(f'Start-up too slow: import {import_time:.3f}s, '
+                             f'heavy modules: {heavy if heavy else "none"}\n')
+            sys.exit(1)
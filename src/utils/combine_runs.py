@@ -1,8 +1,15 @@
 #!/usr/bin/env python
 
 
+import os
+import sys
 import argparse
-import pandas as pd
+
+# the large_cage package is one level up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from large_cage.store import get_labels
+from large_cage.store import ResultStore
 
 
 def get_options():
@@ -14,6 +21,12 @@ def get_options():
                         help='Input file')
     parser.add_argument('output',
                         help='Output file')
+    parser.add_argument('--store',
+                        default=None,
+                        help='Also add the merged runs to this results '
+                             'store (SQLite database, see src/store.py), '
+                             'labelled from the output path '
+                             '(default: do not store)')
 
     return parser.parse_args()
 
@@ -21,6 +34,9 @@ def get_options():
 if __name__ == "__main__":
     options = get_options()
 
+    # imported here to keep the start-up fast
+    import pandas as pd
+
     res = []
     for i, f in enumerate(options.input):
         m = pd.read_csv(f, sep='\t')
@@ -28,3 +44,8 @@ if __name__ == "__main__":
         res.append(m)
 
     pd.concat(res).to_csv(options.output, sep='\t', index=False)
+
+    if options.store is not None:
+        size, scenario, cage, _ = get_labels(options.output)
+        with ResultStore(options.store) as store:
+            store.put_table(size, scenario, cage, options.output)
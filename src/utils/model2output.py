@@ -3,7 +3,6 @@
 
 import sys
 import argparse
-import pandas as pd
 
 
 def get_options():
@@ -19,6 +18,9 @@ def get_options():
 if __name__ == "__main__":
     options = get_options()
 
+    # imported here to keep the start-up fast
+    import pandas as pd
+
     m = pd.read_csv(options.table, sep='\t')
     m = m[['round', 'time', 'initial_release', 'pop', 'fpop', 'eggs',
            'feggs', 'output', 'foutput', 
@@ -1,37 +1,110 @@
 #!/usr/bin/env python
 
 
+import sys
 import argparse
-import pandas as pd
+
+
+cols = ['round', 'time', 'fitness', 'pop', 'fpop', 'eggs', 'feggs', 'output',
+        'WT.output', 'transgenes.output', 'drives.output',
+        'anti.output', 'resistance.output']
 
 
 def get_options():
     description = 'Convert tsv output to an excel multisheet file'
     parser = argparse.ArgumentParser(description=description)
 
-    parser.add_argument('input',
-                        help='Input file')
-    parser.add_argument('output',
-                        help='Output file')
+    parser.add_argument('files',
+                        nargs='+',
+                        metavar='INPUT OUTPUT',
+                        help='Input file and output file; '
+                             'multiple pairs can be provided')
+    parser.add_argument('--chunksize',
+                        type=int,
+                        default=100000,
+                        help='Rows of the input read at a time '
+                             '(default: %(default)d)')
 
     return parser.parse_args()
 
 
-if __name__ == "__main__":
-    options = get_options()
+def collect(fname, chunksize=100000):
+    '''Average the release days values of each column
+
+    The input is read in chunks, keeping only the needed columns
+    and the release days; each chunk is reduced to the sum and count
+    of the values of each (time, round) pair, so that memory grows with
+    the size of the sheets rather than with the size of the input.
+    Repeated (time, round) pairs are averaged, as in a pivot table
+
+    Args:
+        fname (str)
+            Collated output (tsv format)
+        chunksize (int)
+            Rows read at a time
+
+    Returns:
+        values (pandas.DataFrame)
+            Mean of each column, indexed by time and round
+    '''
+    import pandas as pd
+
+    sums = []
+    counts = []
+    for chunk in pd.read_csv(fname, sep='\t',
+                             usecols=cols + ['initial_release'],
+                             chunksize=chunksize):
+        chunk = chunk[chunk['initial_release'].astype(str) == 'True']
+        groups = chunk[cols].groupby(['time', 'round'])
+        sums.append(groups.sum(min_count=1))
+        counts.append(groups.count())
+    if not sums:
+        return pd.DataFrame(columns=cols[2:],
+                            index=pd.MultiIndex.from_tuples(
+                                [], names=['time', 'round']))
+    # pairs split across chunks
+    sums = pd.concat(sums).groupby(level=['time', 'round']).sum(min_count=1)
+    counts = pd.concat(counts).groupby(level=['time', 'round']).sum()
+    return sums / counts
 
-    m = pd.read_csv(options.input, sep='\t')
-    ex = pd.ExcelWriter(options.output)
 
-    cols = ['round', 'time', 'fitness', 'pop', 'fpop', 'eggs', 'feggs', 'output',
-            'WT.output', 'transgenes.output', 'drives.output',
-            'anti.output', 'resistance.output']
+def write(values, fname):
+    '''Write one sheet per column, streaming the rows
 
-    t = m[m['initial_release']][cols].pivot_table(index='time', columns='round')
+    Each sheet has the layout of the pivot table exported by pandas:
+    one row per time, one column per round
+
+    Args:
+        values (pandas.DataFrame)
+            Mean of each column, indexed by time and round
+            (see `collect`)
+        fname (str)
+            Output file (xlsx format)
+    '''
+    from openpyxl import Workbook
+
+    # as in a pivot table, times without values in any sheet are dropped,
+    # and so are the rounds without values in each sheet
+    times = values.dropna(how='all').index.unique('time').sort_values()
+
+    wb = Workbook(write_only=True)
+    for c in cols[2:]:
+        ws = wb.create_sheet(title=c)
+        t = values[c].unstack('round').reindex(times)
+        t = t.dropna(axis=1, how='all')
+        ws.append(['time'] + t.columns.tolist())
+        for time, row in zip(t.index.tolist(), t.values.tolist()):
+            ws.append([time] + [None if v != v else v for v in row])
+    wb.save(fname)
+
+
+if __name__ == "__main__":
+    options = get_options()
 
-    for c in cols:
-        if c in ['round', 'time']:
-            continue
-        t[c].to_excel(ex, sheet_name=c)
+    if len(options.files) % 2:
+        sys.stderr.write('Please provide pairs of input and output files\n')
+        sys.exit(1)
 
-    ex.close()
+    for fin, fout in zip(options.files[::2], options.files[1::2]):
+        values = collect(fin, chunksize=options.chunksize)
+        write(values, fout)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+
+import os
+import sys
+import shlex
+import argparse
+from multiprocessing import Process
+
+from large_cage.sweep import load_sweep
+from large_cage.parameters import load_parameters
+from large_cage.cost import load_cost_model
+from large_cage.workqueue import get_unit
+from large_cage.workqueue import WorkQueue
+
+
+def get_options():
+    description = 'Run simulations from a queue on a shared file system'
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('queue',
+                        help='Queue directory (on the shared file system)')
+    parser.add_argument('--lease',
+                        type=float,
+                        default=600,
+                        help='Lease duration in seconds; units whose lease '
+                             'is not renewed are run again '
+                             '(default: %(default).0f)')
+    parser.add_argument('--max-attempts',
+                        type=int,
+                        default=3,
+                        help='Failed units are retried up to this number of '
+                             'times (default: %(default)d)')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit = subparsers.add_parser('submit',
+                                   help='Add simulations to the queue')
+    submit.add_argument('parameters',
+                        nargs='*',
+                        help='Parameters of each scenario, '
+                             'as parameters/SIZE/SCENARIO/CAGE.yaml '
+                             '(outputs are raw/SIZE/SCENARIO/CAGE_REPEAT.tsv)')
+    submit.add_argument('--sweep',
+                        action='append',
+                        default=[],
+                        help='Also add all points of this sweep '
+                             '(outputs are sweeps/raw/SWEEP/POINT_REPEAT.tsv); '
+                             'can be used multiple times')
+    submit.add_argument('--repeats',
+                        type=int,
+                        default=50,
+                        help='Repeats of each scenario, seeded with their '
+                             'index (default: %(default)d)')
+    submit.add_argument('--options',
+                        default='',
+                        help='Further options for src/simulation.py '
+                             '(e.g. "--cache .cache/simulations --batch")')
+    submit.add_argument('--model',
+                        default=None,
+                        help='Cost model, to run the longest simulations '
+                             'first (default: prior model)')
+
+    work = subparsers.add_parser('work',
+                                 help='Run simulations until none are left')
+    work.add_argument('--jobs',
+                      type=int,
+                      default=1,
+                      help='Workers on this machine (default: %(default)d)')
+    work.add_argument('--poll',
+                      type=float,
+                      default=30,
+                      help='Seconds to wait for simulations running '
+                           'elsewhere (default: %(default).0f)')
+    work.add_argument('--max-units',
+                      type=int,
+                      default=None,
+                      help='Stop each worker after this many simulations '
+                           '(default: no limit)')
+
+    subparsers.add_parser('status',
+                          help='Report the progress of the queue')
+
+    return parser.parse_args()
+
+
+def get_units(options):
+    model = load_cost_model(options.model)
+    extra = shlex.split(options.options)
+    for fname in options.parameters:
+        parts = os.path.normpath(fname).split(os.sep)
+        if len(parts) < 4 or parts[-4] != 'parameters':
+            raise ValueError(f'{fname} does not follow the '
+                             'parameters/SIZE/SCENARIO/CAGE.yaml layout')
+        size, scenario = parts[-3], parts[-2]
+        cage = os.path.splitext(parts[-1])[0]
+        seconds, _ = model.predict(load_parameters(fname))
+        for repeat in range(options.repeats):
+            yield get_unit(os.path.join('raw', size, scenario,
+                                        f'{cage}_{repeat}.tsv'),
+                           ['--parameters', fname,
+                            '--seed', str(repeat)] + extra,
+                           priority=seconds)
+    for fname in options.sweep:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        for point_id, p in load_sweep(fname):
+            seconds, _ = model.predict(p)
+            for repeat in range(options.repeats):
+                yield get_unit(os.path.join('sweeps', 'raw', name,
+                                            f'{point_id}_{repeat}.tsv'),
+                               ['--sweep', fname, '--point', point_id,
+                                '--seed', str(repeat)] + extra,
+                               priority=seconds)
+
+
+def work(options):
+    queue = WorkQueue(options.queue, lease=options.lease,
+                      max_attempts=options.max_attempts)
+    simulation = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'simulation.py')
+    ran = queue.work(simulation=simulation, poll=options.poll,
+                     max_units=options.max_units)
+    sys.stderr.write(f'{queue.owner} ran {ran} simulations\n')
+
+
+if __name__ == "__main__":
+    options = get_options()
+
+    if options.command == 'submit':
+        queue = WorkQueue(options.queue, lease=options.lease,
+                          max_attempts=options.max_attempts)
+        try:
+            units = list(get_units(options))
+        except ValueError as e:
+            sys.stderr.write(f'{e}\n')
+            sys.exit(1)
+        n = queue.submit(units)
+        sys.stderr.write(f'Submitted {n} simulations\n')
+    elif options.command == 'work':
+        # one process per worker, each with its own leases
+        workers = [Process(target=work, args=(options,))
+                   for _ in range(options.jobs)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    else:
+        queue = WorkQueue(options.queue, lease=options.lease,
+                          max_attempts=options.max_attempts)
+        print('\t'.join(['status', 'units']))
+        for status, n in queue.status().items():
+            print(f'{status}\t{n}')
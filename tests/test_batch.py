@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from large_cage.agent import set_seed
+from large_cage.agent import get_values
+from large_cage.agent import get_observables
+from large_cage.batch import BatchSimulation
+from large_cage.parameters import load_parameters
+from large_cage.parameters import resolve_parameters
+
+PARAMETERS = os.path.join(os.path.dirname(__file__), '..', 'parameters',
+                          'bugdorm', 'base', 'antidote.yaml')
+
+
+def _parameters(eggs, **overrides):
+    # a small cage, with the given eggs distribution for all genotypes
+    p = load_parameters(PARAMETERS)
+    overrides = dict({'RELEASE': 40,
+                      'RELEASE_WT': [100, 0, 0, 0, 0, 0],
+                      'RELEASE_DRIVE': [0, 0, 0, 20, 20, 20]},
+                     **overrides)
+    for name in ('EGGS_WT', 'EGGS_NUCL_FROM_MOTHER',
+                 'EGGS_NUCL_FROM_FATHER', 'EGGS_NUCL_FROM_BOTH'):
+        overrides[name] = eggs
+    return resolve_parameters(overrides, p=p)
+
+
+def _run(p, repetitions):
+    observables = get_observables(['round', 'time', 'pop', 'eggs'], p)
+    sim = BatchSimulation(p, repetitions=repetitions, observables=observables)
+    rows = []
+    for records in sim:
+        rows.append([get_values(record, observables) for record in records])
+    return sim, rows
+
+
+def test_negative_eggs():
+    # many females draw a negative number of eggs, i.e. none
+    set_seed(1)
+    p = _parameters({'loc': 20, 'scale': 30}, END_TIME=40)
+    sim, rows = _run(p, 4)
+    assert sim.total_time == 40
+    assert all(len(records) == 4 for records in rows)
+    eggs = np.array([values[3] for records in rows for values in records])
+    assert (eggs >= 0).all()
+    assert eggs.sum() > 0
+
+
+def test_extinct_repetitions():
+    # no eggs and no further releases: all cages die out,
+    # each at its own time
+    set_seed(1)
+    p = _parameters({'loc': -100, 'scale': 30},
+                    END_TIME=200,
+                    RELEASE_DRIVE=[0, 0, 0, 0, 0, 0],
+                    LATE_RELEASES=None)
+    sim, rows = _run(p, 3)
+    assert not sim.running()
+    assert not sim.active.any()
+    assert sim.total_time < p['END_TIME']
+    # extinct repetitions are no longer reported
+    rounds = [{int(values[0]) for values in records} for records in rows]
+    assert rounds[0] == {0, 1, 2}
+    for previous, current in zip(rounds, rounds[1:]):
+        assert current <= previous
+    assert len({len(x) for x in rounds}) > 2
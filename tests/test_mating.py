@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from large_cage.agent import mate
+from large_cage.agent import recycle
+from large_cage.agent import set_seed
+from large_cage.agent import Individual
+from large_cage.agent import mate_classes
+from large_cage.agent import get_offspring
+from large_cage.parameters import load_parameters
+
+PARAMETERS = os.path.join(os.path.dirname(__file__), '..', 'parameters',
+                          'bugdorm', 'base', 'antidote.yaml')
+
+# (sex, genotype1, genotype2, nucl_from_father, nucl_from_mother)
+MALES = [('m', ('W', 'W'), ('W', 'W'), False, False),
+         ('m', ('D', 'W'), ('W', 'W'), True, False),
+         ('m', ('D', 'W'), ('A', 'W'), False, True),
+         ('m', ('D', 'D'), ('A', 'A'), True, True),
+         ('m', ('R', 'W'), ('W', 'W'), False, False),
+         ('m', ('D', 'R'), ('A', 'W'), True, False)]
+FEMALES = [('f', ('W', 'W'), ('W', 'W'), False, False),
+           ('f', ('D', 'W'), ('W', 'W'), False, True),
+           ('f', ('W', 'W'), ('A', 'W'), False, False),
+           ('f', ('D', 'W'), ('A', 'W'), True, True),
+           ('f', ('R', 'W'), ('A', 'A'), False, False),
+           ('f', ('D', 'R'), ('W', 'W'), True, False)]
+
+
+@pytest.fixture(scope='module')
+def p():
+    return load_parameters(PARAMETERS)
+
+
+def _individual(spec, p):
+    sex, genotype1, genotype2, nucl_from_father, nucl_from_mother = spec
+    return Individual(sex, genotype1, genotype2,
+                      nucl_from_father, nucl_from_mother, parameters=p)
+
+
+def _close(observed, expected, n, m=None):
+    # proportions within 5 standard errors
+    # (of a single sample, or of the difference of two)
+    scale = 1 / n if m is None else 1 / n + 1 / m
+    for key in set(observed) | set(expected):
+        q = expected.get(key, 0.)
+        se = np.sqrt(max(q * (1 - q), 1e-4) * scale)
+        assert abs(observed.get(key, 0.) - q) <= 5 * se, key
+
+
+@pytest.mark.parametrize('pair', range(len(MALES)))
+def test_offspring(p, pair):
+    set_seed(42)
+    m = _individual(MALES[pair], p)
+    f = _individual(FEMALES[pair], p)
+    classes, probabilities = get_offspring(m.phenotype, f.phenotype)
+    assert probabilities.sum() == pytest.approx(1)
+    expected = dict(zip(classes, probabilities))
+
+    n = 20000
+    sampled = Counter()
+    for _ in range(n):
+        genotype1 = tuple(sorted((f.form_gamete1(), m.form_gamete1())))
+        genotype2 = tuple(sorted((f.form_gamete2(), m.form_gamete2())))
+        sex = 'm' if np.random.random() < 0.5 else 'f'
+        sampled[(sex, genotype1, genotype2)] += 1
+    _close({k: v / n for k, v in sampled.items()}, expected, n)
+
+
+def _mate(p, aggregate, repeats=300):
+    # eggs of a fixed population, counted by their phenotype class
+    set_seed(1 if aggregate else 2)
+    males = [_individual(x, p) for x in MALES]
+    females = [_individual(x, p) for x in FEMALES]
+    for x in males + females:
+        x.stage = 'adult'
+        x.mating = True
+    for i, f in enumerate(females):
+        # also a negative draw, which gives no eggs
+        f.eggs = 10 * i - 5
+    totals = []
+    classes = Counter()
+    for _ in range(repeats):
+        if aggregate:
+            eggs = mate_classes(males, females, p=p)
+        else:
+            eggs = []
+            for m, f in zip(males, females):
+                eggs.extend(mate(m, f, p=p))
+        totals.append(len(eggs))
+        classes.update(x.phenotype for x in eggs)
+        recycle(eggs)
+    return np.array(totals), classes
+
+
+def test_mate_classes(p):
+    totals, classes = _mate(p, aggregate=True)
+    pair_totals, pair_classes = _mate(p, aggregate=False)
+
+    se = np.sqrt(totals.var() / totals.shape[0] +
+                 pair_totals.var() / pair_totals.shape[0])
+    assert abs(totals.mean() - pair_totals.mean()) <= 5 * se
+
+    n = sum(classes.values())
+    m = sum(pair_classes.values())
+    _close({k: v / n for k, v in classes.items()},
+           {k: v / m for k, v in pair_classes.items()},
+           n, m)
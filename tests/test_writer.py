@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gzip
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from large_cage.writer import BackgroundWriter
+
+
+def _close(writer, lines):
+    # write and close from a thread, so that a hang fails the test
+    errors = []
+
+    def target():
+        try:
+            for line in lines:
+                writer.write(line)
+            writer.close()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), 'the writer did not close'
+    return errors
+
+
+def test_roundtrip(tmp_path):
+    fname = str(tmp_path / 'output.tsv.gz')
+    with BackgroundWriter(fname, block_size=16, keep=True) as writer:
+        for i in range(100):
+            writer.write(f'{i}\tline')
+    with gzip.open(fname, 'rt') as f:
+        assert f.read() == writer.getvalue()
+    assert writer.getvalue().splitlines()[-1] == '99\tline'
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/full'),
+                    reason='requires /dev/full')
+@pytest.mark.parametrize('lines', [1, 10000])
+def test_full_device(lines):
+    # errors on the last flush, or while records are still queued
+    writer = BackgroundWriter('/dev/full', block_size=1024, max_queued=16)
+    errors = _close(writer, ['line'] * lines)
+    assert len(errors) == 1
+    assert isinstance(errors[0], OSError)
+
+
+@pytest.mark.skipif(not os.path.exists('/dev/fd'),
+                    reason='requires /dev/fd')
+def test_broken_pipe():
+    read, write = os.pipe()
+    os.close(read)
+    writer = BackgroundWriter(f'/dev/fd/{write}', block_size=1024,
+                              max_queued=16)
+    os.close(write)
+    errors = _close(writer, ['line'] * 10000)
+    assert len(errors) == 1
+    assert isinstance(errors[0], BrokenPipeError)